@@ -0,0 +1,116 @@
+# aleatorio.py
+
+from typing import Tuple
+import random
+
+try:
+    import numpy as np  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - NumPy es opcional
+    np = None
+
+# Motores para los dígitos de AleatorioPorLotes: "python" (el mismo Mersenne
+# Twister) o "numpy" (un numpy.random.Generator, vectorizado)
+MOTORES = ("python", "numpy")
+# Dígitos por recarga del buffer
+TAMANO_LOTE = 4096
+# Dígitos por cada randrange del motor "python": convertir un entero a
+# decimal es cuadrático en su largo y CPython limita la conversión a
+# sys.get_int_max_str_digits() dígitos (4300 por defecto), así que los lotes
+# se llenan por tramos de este largo
+DIGITOS_POR_ENTERO = 1000
+
+
+class AleatorioPorLotes(random.Random):
+    """
+    random.Random que además entrega muchos dígitos decimales de una vez
+    (digitos), sacados de un buffer que se llena en bloque.
+
+    Convertir cada 'num' en un dígito con randint(0, 9) cuesta varias
+    llamadas del intérprete por dígito; con este generador, las rutinas de
+    derivación piden todos los dígitos de una cadena en una sola llamada.
+    El resto de los sorteos (random, randrange, choice, randint) son los
+    de random.Random, ya implementados en C, así que la distribución de
+    todo lo generado es la misma de siempre. La secuencia depende solo de
+    la semilla y del motor, así que sirve igual para corridas
+    reproducibles, pero no es la de random.Random(semilla).
+
+    Con motor="python" cada lote sale de randrange(10^m) del mismo generador,
+    por tramos de m = DIGITOS_POR_ENTERO dígitos; con motor="numpy", de una llamada vectorizada a un
+    numpy.random.Generator derivado de la semilla.
+    """
+
+    def __init__(
+        self, semilla: object = None, motor: str = "python", tamano_lote: int = TAMANO_LOTE
+    ) -> None:
+        if motor not in MOTORES:
+            raise ValueError(f"Motor aleatorio desconocido: {motor} (se admite {', '.join(MOTORES)}).")
+        if motor == "numpy" and np is None:
+            raise ValueError("El motor aleatorio 'numpy' requiere tener NumPy instalado.")
+        if tamano_lote <= 0:
+            raise ValueError("El tamaño de lote debe ser positivo.")
+        self.motor = motor
+        self.tamano_lote = tamano_lote
+        super().__init__(semilla)
+
+    def seed(self, a: object = None, version: int = 2) -> None:
+        super().seed(a, version)
+        self._numpy = np.random.default_rng(self.getrandbits(128)) if self.motor == "numpy" else None
+        self._digitos = ""
+        self._j = 0
+
+    def _lote_digitos(self) -> str:
+        n = self.tamano_lote
+        if self._numpy is not None:
+            digitos = self._numpy.integers(0, 10, n, dtype=np.uint8) + ord("0")
+            return digitos.tobytes().decode("ascii")
+        # Los dígitos de un entero uniforme en [0, 10^m) son m dígitos uniformes independientes
+        tramos = []
+        for inicio in range(0, n, DIGITOS_POR_ENTERO):
+            m = min(DIGITOS_POR_ENTERO, n - inicio)
+            tramos.append(format(self.randrange(10**m), f"0{m}d"))
+        return "".join(tramos)
+
+    def digitos(self, k: int) -> str:
+        """k dígitos decimales uniformes e independientes, en una sola cadena."""
+        j = self._j
+        fin = j + k
+        if fin <= len(self._digitos):
+            self._j = fin
+            return self._digitos[j:fin]
+        partes = [self._digitos[j:]]
+        faltan = k - len(partes[0])
+        while True:
+            self._digitos = self._lote_digitos()
+            if faltan <= len(self._digitos):
+                partes.append(self._digitos[:faltan])
+                self._j = faltan
+                return "".join(partes)
+            partes.append(self._digitos)
+            faltan -= len(self._digitos)
+
+    # El estado incluye el buffer, para retomar una corrida exactamente donde quedó
+
+    def getstate(self) -> Tuple:
+        numpy = self._numpy.bit_generator.state if self._numpy is not None else None
+        return (super().getstate(), self.motor, self.tamano_lote, self._digitos, self._j, numpy)
+
+    def setstate(self, state: Tuple) -> None:
+        base, motor, tamano_lote, digitos, j, numpy = state
+        if motor == "numpy" and np is None:
+            raise ValueError("El estado es de un generador con motor 'numpy', pero NumPy no está instalado.")
+        super().setstate(base)
+        self.motor = motor
+        self.tamano_lote = tamano_lote
+        self._digitos = digitos
+        self._j = j
+        self._numpy = None
+        if numpy is not None:
+            self._numpy = np.random.default_rng()
+            self._numpy.bit_generator.state = numpy
+
+
+def crear_aleatorio(semilla: object = None, motor: str | None = None) -> random.Random:
+    """random.Random(semilla) si motor es None; si no, AleatorioPorLotes(semilla, motor)."""
+    if motor is None:
+        return random.Random(semilla)
+    return AleatorioPorLotes(semilla, motor)
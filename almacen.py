@@ -0,0 +1,319 @@
+# almacen.py
+
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Tuple
+import json
+import mmap
+import struct
+import sys
+
+from casos import CasoVista, LoteCasos
+from estadisticas import TIPOS
+from generador_validas import guardar_json
+from salida import leer_casos
+
+try:
+    import numpy as np  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - NumPy es opcional
+    np = None
+
+# Extensión de los archivos del almacén (main_miembro1 guarda en este formato si la salida la tiene)
+EXTENSION_ALMACEN = ".casos"
+# Firma al comienzo del archivo y versión del formato
+_FIRMA = b"CASOSBIN"
+_VERSION = 1
+# Alineación de cada columna dentro del archivo
+_ALINEACION = 8
+# Tipo de NumPy de cada tipo de array (siempre little-endian en el archivo)
+_DTYPES = {"B": "<u1", "H": "<u2", "I": "<u4", "Q": "<u8"}
+
+# Rango inclusivo (mínimo, máximo) de un filtro; None deja ese lado abierto
+Rango = Tuple[int | None, int | None]
+
+
+def _relleno(n: int) -> int:
+    return -n % _ALINEACION
+
+
+def guardar_almacen(casos: LoteCasos | Iterable[Mapping], ruta: str | Path, reporte: Dict | None = None) -> None:
+    """
+    Guarda los casos (un LoteCasos o cualquier iterable de casos) en el
+    formato binario del almacén:
+
+        firma (8 bytes) | largo del encabezado (uint32) | encabezado JSON |
+        cadenas UTF-8 concatenadas | offsets | tipo | longitud |
+        profundidad | una columna por operador | una por clave de mutación
+
+    Cada columna es un arreglo de enteros sin signo de ancho fijo (el del
+    array de LoteCasos: 1, 2, 4 u 8 bytes), little-endian y alineado a 8
+    bytes; el encabezado tiene, por columna, su tipo, su posición y su
+    tamaño, además de la cantidad de casos y el 'reporte' general.
+    """
+    if isinstance(casos, LoteCasos):
+        lote = casos
+    else:
+        lote = LoteCasos()
+        lote.extender(casos)
+    columnas: List[Tuple[str, str, bytes]] = [("cadenas", "B", bytes(lote._pool))]
+    fijas = {"offsets": lote._offsets, "tipo": lote.tipos, "longitud": lote.longitudes,
+             "profundidad": lote.profundidades}
+    grupos = {"columnas": fijas, "operadores": lote.operadores, "mutaciones": lote.mutaciones}
+    encabezado: Dict = {"version": _VERSION, "casos": len(lote), "tipos": list(TIPOS), "reporte": reporte}
+    posicion = len(columnas[0][2]) + _relleno(len(columnas[0][2]))
+    encabezado["cadenas"] = [0, len(columnas[0][2])]
+    for grupo, arrays in grupos.items():
+        encabezado[grupo] = {}
+        for nombre, columna in arrays.items():
+            if sys.byteorder == "big":
+                columna = array(columna.typecode, columna)
+                columna.byteswap()
+            datos = columna.tobytes()
+            encabezado[grupo][nombre] = [columna.typecode, columna.itemsize, posicion, len(datos)]
+            columnas.append((nombre, columna.typecode, datos))
+            posicion += len(datos) + _relleno(len(datos))
+    texto = json.dumps(encabezado, ensure_ascii=False).encode("utf-8")
+    with open(ruta, "wb") as f:
+        f.write(_FIRMA)
+        f.write(struct.pack("<I", len(texto)))
+        f.write(texto)
+        f.write(bytes(_relleno(len(_FIRMA) + 4 + len(texto))))
+        for _, _, datos in columnas:
+            f.write(datos)
+            f.write(bytes(_relleno(len(datos))))
+
+
+class AlmacenCasos:
+    """
+    Almacén de casos abierto para lectura con mmap: las columnas son
+    memoryviews sobre el archivo (sin copiarlo ni parsearlo), así que abrir
+    un almacén es inmediato sin importar su tamaño y solo se leen del disco
+    las páginas que se tocan.
+
+    Tiene los mismos atributos que un LoteCasos (tipos, longitudes,
+    profundidades, operadores, mutaciones, cadena(i)) y se comporta como
+    una secuencia de CasoVista de solo lectura. cadena_bytes(i) da el texto
+    UTF-8 del caso sin copiarlo. filtrar recorre solo las columnas de las
+    condiciones (con NumPy, si está instalado, de forma vectorizada).
+    Cerrar el almacén (o salir del 'with') invalida las columnas.
+    """
+
+    def __init__(self, ruta: str | Path) -> None:
+        self.ruta = str(ruta)
+        with open(ruta, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._vistas: List[memoryview] = []
+        try:
+            self._abrir()
+        except Exception:
+            self.cerrar()
+            raise
+
+    def _abrir(self) -> None:
+        datos = memoryview(self._mmap)
+        self._vistas.append(datos)
+        if bytes(datos[: len(_FIRMA)]) != _FIRMA:
+            raise ValueError(f"{self.ruta} no es un almacén de casos.")
+        (largo,) = struct.unpack_from("<I", datos, len(_FIRMA))
+        inicio = len(_FIRMA) + 4
+        encabezado = json.loads(bytes(datos[inicio : inicio + largo]).decode("utf-8"))
+        if encabezado["version"] != _VERSION:
+            raise ValueError(f"Versión de almacén no soportada: {encabezado['version']}.")
+        if encabezado["tipos"] != list(TIPOS):
+            raise ValueError("El almacén usa otros tipos de caso.")
+        base = inicio + largo + _relleno(inicio + largo)
+        self.encabezado = encabezado
+        self.reporte: Dict | None = encabezado["reporte"]
+        self._n = encabezado["casos"]
+        posicion, tamano = encabezado["cadenas"]
+        self._cadenas = self._vista(datos[base + posicion : base + posicion + tamano])
+
+        def columna(typecode: str, itemsize: int, posicion: int, tamano: int) -> memoryview | array:
+            if array(typecode).itemsize != itemsize:
+                raise ValueError(f"Las columnas '{typecode}' del almacén tienen otro ancho en esta plataforma.")
+            crudo = datos[base + posicion : base + posicion + tamano]
+            if sys.byteorder == "big":
+                # Sin copia solo en máquinas little-endian
+                copia = array(typecode, bytes(crudo))
+                copia.byteswap()
+                return copia
+            return self._vista(crudo.cast(typecode))
+
+        fijas = {nombre: columna(*d) for nombre, d in encabezado["columnas"].items()}
+        self._offsets = fijas["offsets"]
+        self.tipos = fijas["tipo"]
+        self.longitudes = fijas["longitud"]
+        self.profundidades = fijas["profundidad"]
+        self.operadores = {op: columna(*d) for op, d in encabezado["operadores"].items()}
+        self.mutaciones = {k: columna(*d) for k, d in encabezado["mutaciones"].items()}
+
+    def _vista(self, vista: memoryview) -> memoryview:
+        self._vistas.append(vista)
+        return vista
+
+    def cadena_bytes(self, i: int) -> memoryview:
+        """Texto UTF-8 del caso i, como vista sobre el archivo (sin copia)."""
+        return self._cadenas[self._offsets[i] : self._offsets[i + 1]]
+
+    def cadena(self, i: int) -> str:
+        """Cadena del caso i."""
+        return str(self.cadena_bytes(i), "utf-8")
+
+    def cadenas(self, indices: Iterable[int] | None = None) -> Iterator[str]:
+        """Recorre las cadenas (todas, o las de 'indices') sin construir vistas de casos."""
+        cadenas = self._cadenas
+        offsets = self._offsets
+        for i in range(self._n) if indices is None else indices:
+            yield str(cadenas[offsets[i] : offsets[i + 1]], "utf-8")
+
+    def _condiciones(
+        self,
+        longitud: Rango | None,
+        profundidad: Rango | None,
+        operadores: Mapping[str, Rango] | None,
+        mutaciones: Mapping[str, Rango] | None,
+    ) -> List[Tuple[memoryview | array, int, int]]:
+        condiciones = []
+        pedidos = [(self.longitudes, longitud), (self.profundidades, profundidad)]
+        for nombre, columnas, rangos in (("operador", self.operadores, operadores), ("mutación", self.mutaciones, mutaciones)):
+            for clave, rango in (rangos or {}).items():
+                if clave not in columnas:
+                    raise ValueError(
+                        f"El almacén no tiene la columna de {nombre} '{clave}' (tiene {', '.join(columnas)})."
+                    )
+                pedidos.append((columnas[clave], rango))
+        for columna, rango in pedidos:
+            if rango is not None:
+                minimo, maximo = rango
+                condiciones.append((columna, minimo or 0, (1 << 64) if maximo is None else maximo))
+        return condiciones
+
+    def filtrar(
+        self,
+        tipo: str | Iterable[str] | None = None,
+        longitud: Rango | None = None,
+        profundidad: Rango | None = None,
+        operadores: Mapping[str, Rango] | None = None,
+        mutaciones: Mapping[str, Rango] | None = None,
+        predicado: Callable[[CasoVista], bool] | None = None,
+    ) -> List[int]:
+        """
+        Índices, en orden, de los casos que cumplen todas las condiciones:
+        'tipo' (uno o varios), rangos inclusivos (mínimo, máximo) de
+        longitud, profundidad y de las columnas de operadores o mutaciones
+        por clave, y por último 'predicado' sobre la vista de cada caso que
+        queda. P. ej. los inválidos de más de 500 caracteres:
+
+            almacen.filtrar(tipo="invalida", longitud=(501, None))
+        """
+        codigos = None
+        if tipo is not None:
+            nombres = [tipo] if isinstance(tipo, str) else list(tipo)
+            desconocidos = [nombre for nombre in nombres if nombre not in TIPOS]
+            if desconocidos:
+                raise ValueError(f"Tipos de caso desconocidos: {', '.join(desconocidos)}.")
+            codigos = {TIPOS.index(nombre) for nombre in nombres}
+        condiciones = self._condiciones(longitud, profundidad, operadores, mutaciones)
+        if np is not None and self._n:
+            indices = self._filtrar_numpy(codigos, condiciones)
+        else:
+            indices = self._filtrar_python(codigos, condiciones)
+        if predicado is not None:
+            indices = [i for i in indices if predicado(CasoVista(self, i))]  # type: ignore[arg-type]
+        return indices
+
+    def _filtrar_python(self, codigos: set | None, condiciones: List[Tuple]) -> List[int]:
+        # Cada condición recorre solo los candidatos que dejaron las anteriores
+        indices: List[int] | None = None
+        if codigos is not None:
+            tipos = self.tipos
+            indices = [i for i, codigo in enumerate(tipos) if codigo in codigos]
+        for columna, minimo, maximo in condiciones:
+            if indices is None:
+                indices = [i for i, valor in enumerate(columna) if minimo <= valor <= maximo]
+            else:
+                indices = [i for i in indices if minimo <= columna[i] <= maximo]
+        return list(range(self._n)) if indices is None else indices
+
+    def _filtrar_numpy(self, codigos: set | None, condiciones: List[Tuple]) -> List[int]:
+        mascara = np.ones(self._n, dtype=bool)
+        if codigos is not None:
+            mascara &= np.isin(self._numpy(self.tipos), sorted(codigos))
+        for columna, minimo, maximo in condiciones:
+            valores = self._numpy(columna)
+            if minimo > 0:
+                mascara &= valores >= minimo
+            if maximo < (1 << 64):
+                mascara &= valores <= maximo
+        return np.flatnonzero(mascara).tolist()
+
+    @staticmethod
+    def _numpy(columna: memoryview | array):
+        if isinstance(columna, memoryview):
+            return np.frombuffer(columna, dtype=_DTYPES[columna.format])
+        return np.asarray(columna, dtype=_DTYPES[columna.typecode].replace("<", "="))
+
+    def casos(self, indices: Iterable[int]) -> Iterator[CasoVista]:
+        """Vistas de los casos de 'indices' (p. ej. el resultado de filtrar)."""
+        for i in indices:
+            yield CasoVista(self, i)  # type: ignore[arg-type]
+
+    def tamano_bytes(self) -> int:
+        """Tamaño del archivo del almacén."""
+        return len(self._mmap)
+
+    def cerrar(self) -> None:
+        for vista in reversed(self._vistas):
+            vista.release()
+        self._vistas = []
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Quedan vistas en uso (p. ej. de cadena_bytes): se cierra al liberarlas
+            pass
+
+    def __enter__(self) -> "AlmacenCasos":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cerrar()
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i: int) -> CasoVista:
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError("índice de caso fuera de rango")
+        return CasoVista(self, i)  # type: ignore[arg-type]
+
+    def __iter__(self) -> Iterator[CasoVista]:
+        return self.casos(range(self._n))
+
+
+def json_a_almacen(origen: str | Path, destino: str | Path) -> int:
+    """
+    Convierte una salida del generador (el JSON de guardar_json, un JSONL o
+    un directorio de fragmentos) en un almacén; del JSON conserva también
+    el reporte general. Retorna la cantidad de casos.
+    """
+    reporte = None
+    if Path(origen).suffix == ".json":
+        with open(origen, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        casos: Iterable[Mapping] = datos["casos"]
+        reporte = datos.get("reporte_general")
+    else:
+        casos = leer_casos(origen)
+    lote = LoteCasos()
+    lote.extender(casos)
+    guardar_almacen(lote, destino, reporte)
+    return len(lote)
+
+
+def almacen_a_json(origen: str | Path, destino: str | Path) -> int:
+    """Escribe un almacén en el formato JSON de guardar_json. Retorna la cantidad de casos."""
+    with AlmacenCasos(origen) as almacen:
+        guardar_json(list(almacen), almacen.reporte or {}, str(destino))
+        return len(almacen)
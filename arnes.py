@@ -0,0 +1,558 @@
+# arnes.py
+
+from abc import ABC, abstractmethod
+from collections import Counter, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from fractions import Fraction
+from typing import Callable, Dict, Iterable, List, Mapping, Sequence, Tuple
+import argparse
+import importlib
+import json
+import operator
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from cache_gramatica import cargar_gramatica
+from cfg_parser import Grammar
+from estadisticas import PERCENTILES, percentil
+from reconocedor import ACEPTAR, obtener_reconocedor
+from salida import EscritorJSONL, leer_casos
+
+# Estados del resultado de un objetivo para un caso
+ACEPTA = "acepta"  # la cadena es una expresión; el valor es su resultado
+RECHAZA = "rechaza"  # la cadena no es una expresión
+INDEFINIDO = "indefinido"  # es una expresión, pero sin valor (p. ej. división por cero)
+FALLA = "falla"  # el objetivo terminó mal o respondió algo ilegible
+TIEMPO = "tiempo"  # el objetivo superó el tiempo límite del caso
+ESTADOS = (ACEPTA, RECHAZA, INDEFINIDO, FALLA, TIEMPO)
+
+# Resultado de un objetivo para un caso: (estado, valor o detalle en texto)
+Resultado = Tuple[str, str | None]
+
+# Operaciones del evaluador de referencia, por texto del terminal
+OPERACIONES_BINARIAS: Dict[str, Callable] = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "%": operator.mod,
+}
+OPERACIONES_UNARIAS: Dict[str, Callable] = {"+": operator.pos, "-": operator.neg}
+
+# Casos por lote enviado a cada objetivo
+TAM_LOTE = 256
+# Segundos por caso antes de darlo por colgado
+TIEMPO_LIMITE = 1.0
+# Diferencia relativa tolerada entre dos resultados numéricos
+TOLERANCIA = 1e-9
+
+# Acciones semánticas de las producciones
+_COPIAR, _BINARIA, _UNARIA = range(3)
+
+
+class EvaluadorReferencia:
+    """
+    Evaluador exacto de las expresiones de una Grammar, construido sobre
+    las tablas LALR(1) del reconocedor: cada reducción aplica la acción
+    semántica de su producción sobre valores Fraction (sin errores de
+    redondeo).
+
+    Las acciones se deducen de la forma de cada producción: 'A op B' con
+    'op' en 'binarias' aplica la operación, 'op A' con 'op' en 'unarias'
+    también, y una producción con un solo operando (no terminal o número)
+    entre delimitadores, como 'F -> ( E )' o 'E -> T', pasa su valor. Una
+    división (o módulo) por cero deja la expresión INDEFINIDA. Si la
+    gramática no es LALR(1) o alguna producción no tiene una de esas
+    formas, ValueError.
+    """
+
+    def __init__(
+        self,
+        grammar: Grammar,
+        binarias: Mapping[str, Callable] | None = None,
+        unarias: Mapping[str, Callable] | None = None,
+    ) -> None:
+        reconocedor = obtener_reconocedor(grammar)
+        if not reconocedor.es_lalr:
+            raise ValueError("El evaluador de referencia requiere una gramática LALR(1).")
+        binarias = OPERACIONES_BINARIAS if binarias is None else binarias
+        unarias = OPERACIONES_UNARIAS if unarias is None else unarias
+        cg = reconocedor.cg
+        self.reconocedor = reconocedor
+        self.es_numero = cg.is_number
+
+        def es_operando(sid: int) -> bool:
+            return sid < cg.num_nonterminals or cg.is_number[sid]
+
+        self._acciones: List[Tuple[int, object]] = []
+        for lhs, rhs in zip(reconocedor.prod_lhs, reconocedor.prod_rhs):
+            operandos = [k for k, sid in enumerate(rhs) if es_operando(sid)]
+            textos = [cg.symbols[sid] for sid in rhs]
+            if len(rhs) == 2 and operandos == [1] and textos[0] in unarias:
+                self._acciones.append((_UNARIA, unarias[textos[0]]))
+            elif len(rhs) == 3 and operandos == [0, 2] and textos[1] in binarias:
+                self._acciones.append((_BINARIA, binarias[textos[1]]))
+            elif len(operandos) == 1 and not any(
+                texto in binarias for k, texto in enumerate(textos) if k != operandos[0]
+            ):
+                self._acciones.append((_COPIAR, operandos[0]))
+            else:
+                produccion = f"{cg.symbols[lhs]} -> {' '.join(textos) or 'ε'}"
+                raise ValueError(f"La producción {produccion} no tiene una semántica aritmética conocida.")
+
+    def evaluar(self, cadena: str) -> Resultado:
+        """Resultado de la cadena: (ACEPTA, valor como 'n' o 'n/d'), (RECHAZA, None) o (INDEFINIDO, None)."""
+        r = self.reconocedor
+        lexemas = r.tokenizar_lexemas(cadena)
+        if lexemas is None:
+            return RECHAZA, None
+        tokens, textos, _ = lexemas
+        tokens.append(r.eof)
+        accion = r.accion
+        ir_a = r.ir_a
+        reducciones = r._reducciones
+        acciones = self._acciones
+        es_numero = self.es_numero
+        pila = [0]
+        valores: List[object] = [None]
+        i = 0
+        tok = tokens[0]
+        while True:
+            a = accion[pila[-1]].get(tok)
+            if a is None:
+                return RECHAZA, None
+            if a >= 0:
+                pila.append(a)
+                valores.append(Fraction(int(textos[i])) if es_numero[tok] else None)
+                i += 1
+                tok = tokens[i]
+            elif a == ACEPTAR:
+                return ACEPTA, str(valores[-1])
+            else:
+                p = -a - 2
+                n, lhs = reducciones[p]
+                argumentos = valores[-n:]
+                del pila[-n:]
+                del valores[-n:]
+                clase, dato = acciones[p]
+                try:
+                    if clase == _BINARIA:
+                        valor = dato(argumentos[0], argumentos[2])
+                    elif clase == _UNARIA:
+                        valor = dato(argumentos[1])
+                    else:
+                        valor = argumentos[dato]
+                except ZeroDivisionError:
+                    return INDEFINIDO, None
+                pila.append(ir_a[pila[-1]][lhs])
+                valores.append(valor)
+
+
+def _a_fraccion(texto: str | None) -> Fraction | None:
+    try:
+        return Fraction(texto.strip())  # type: ignore[union-attr]
+    except (AttributeError, ValueError, ZeroDivisionError):
+        return None
+
+
+def coinciden(a: Resultado, b: Resultado, tolerancia: float = TOLERANCIA) -> bool:
+    """
+    True si dos resultados son equivalentes: el mismo estado y, si ambos
+    aceptan, valores iguales salvo una diferencia relativa de 'tolerancia'
+    (así un evaluador con punto flotante coincide con el exacto).
+    """
+    if a[0] != b[0]:
+        return False
+    if a[0] != ACEPTA:
+        return True
+    x = _a_fraccion(a[1])
+    y = _a_fraccion(b[1])
+    if x is None or y is None:
+        return a[1] == b[1]
+    return abs(x - y) <= tolerancia * max(1, abs(x))
+
+
+class Objetivo(ABC):
+    """
+    Un evaluador a probar. ejecutar_lote recibe un lote de cadenas y
+    retorna, por caso, su Resultado y su latencia en ns. Los objetivos
+    viajan (serializados con pickle) a los procesos del pool.
+    """
+
+    nombre = ""
+
+    @abstractmethod
+    def ejecutar_lote(self, cadenas: Sequence[str], tiempo_limite: float) -> Tuple[List[Resultado], List[int]]:
+        """Resultados y latencias (ns) de las cadenas, cada caso con a lo sumo tiempo_limite segundos."""
+
+
+class ObjetivoReferencia(Objetivo):
+    """El EvaluadorReferencia de una gramática, como objetivo."""
+
+    def __init__(self, grammar: Grammar, nombre: str = "referencia") -> None:
+        self.nombre = nombre
+        self.evaluador = EvaluadorReferencia(grammar)
+
+    def ejecutar_lote(self, cadenas: Sequence[str], tiempo_limite: float) -> Tuple[List[Resultado], List[int]]:
+        evaluar = self.evaluador.evaluar
+        resultados: List[Resultado] = []
+        latencias: List[int] = []
+        for cadena in cadenas:
+            t0 = time.perf_counter_ns()
+            resultados.append(evaluar(cadena))
+            latencias.append(time.perf_counter_ns() - t0)
+        return resultados, latencias
+
+
+class _TiempoAgotado(Exception):
+    pass
+
+
+def _alarma(signum, frame) -> None:
+    raise _TiempoAgotado
+
+
+class ObjetivoFuncion(Objetivo):
+    """
+    Una función de Python f(cadena) -> valor. Retornar None es rechazar la
+    cadena; ZeroDivisionError la deja INDEFINIDA y cualquier otra excepción
+    la rechaza (con el nombre de la excepción como detalle).
+
+    Con más de un proceso la función tiene que poder serializarse (definida
+    a nivel de módulo). En el hilo principal de sistemas con SIGALRM, un
+    caso que supera el tiempo límite se interrumpe; si no, se marca como
+    TIEMPO al terminar.
+    """
+
+    def __init__(self, funcion: Callable[[str], object], nombre: str | None = None) -> None:
+        self.funcion = funcion
+        self.nombre = nombre or getattr(funcion, "__qualname__", repr(funcion))
+
+    def ejecutar_lote(self, cadenas: Sequence[str], tiempo_limite: float) -> Tuple[List[Resultado], List[int]]:
+        funcion = self.funcion
+        interrumpir = hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+        if interrumpir:
+            anterior = signal.signal(signal.SIGALRM, _alarma)
+        resultados: List[Resultado] = []
+        latencias: List[int] = []
+        try:
+            for cadena in cadenas:
+                t0 = time.perf_counter_ns()
+                try:
+                    if interrumpir:
+                        signal.setitimer(signal.ITIMER_REAL, tiempo_limite)
+                    try:
+                        valor = funcion(cadena)
+                    finally:
+                        if interrumpir:
+                            signal.setitimer(signal.ITIMER_REAL, 0)
+                    resultado: Resultado = (RECHAZA, None) if valor is None else (ACEPTA, str(valor))
+                except _TiempoAgotado:
+                    resultado = (TIEMPO, None)
+                except ZeroDivisionError:
+                    resultado = (INDEFINIDO, None)
+                except Exception as e:
+                    resultado = (RECHAZA, type(e).__name__)
+                ns = time.perf_counter_ns() - t0
+                if ns > tiempo_limite * 1e9:
+                    resultado = (TIEMPO, None)
+                resultados.append(resultado)
+                latencias.append(ns)
+        finally:
+            if interrumpir:
+                signal.signal(signal.SIGALRM, anterior)
+        return resultados, latencias
+
+
+def _leer_respuesta(linea: str) -> Resultado:
+    texto = linea.strip()
+    if texto.lower() in (RECHAZA, INDEFINIDO):
+        return texto.lower(), None
+    if _a_fraccion(texto) is None:
+        return FALLA, texto[:80]
+    return ACEPTA, texto
+
+
+class ObjetivoComando(Objetivo):
+    """
+    Un programa externo. Por lotes (el modo por defecto) recibe por stdin
+    un caso por línea y responde por stdout una línea por caso: el valor
+    (p. ej. '7', '3.5' o '7/2'), 'rechaza' o 'indefinido'. Así se lanza un
+    proceso por lote y no uno por caso. El lote tiene tiempo_limite por
+    caso; si se pasa, termina con error o no da una línea por caso, sus
+    casos se repiten de a uno para aislar el que falla.
+
+    Con por_lote=False (o al repetir de a uno) el programa recibe un solo
+    caso; si sale con código distinto de 0 sin escribir nada, el caso se
+    toma como rechazado, y otras respuestas ilegibles como FALLA.
+    """
+
+    def __init__(self, comando: str | Sequence[str], nombre: str | None = None, por_lote: bool = True) -> None:
+        self.comando = shlex.split(comando) if isinstance(comando, str) else list(comando)
+        self.nombre = nombre or " ".join(self.comando)
+        self.por_lote = por_lote
+        # Lotes que hubo que repetir de a un caso (se cuentan en el proceso que los ejecuta)
+        self.lotes_repetidos = 0
+
+    def _correr(self, entrada: str, tiempo_limite: float) -> subprocess.CompletedProcess | None:
+        try:
+            return subprocess.run(
+                self.comando, input=entrada, capture_output=True, text=True, timeout=tiempo_limite
+            )
+        except subprocess.TimeoutExpired:
+            return None
+
+    def _caso(self, cadena: str, tiempo_limite: float) -> Resultado:
+        proceso = self._correr(cadena + "\n", tiempo_limite)
+        if proceso is None:
+            return TIEMPO, None
+        lineas = proceso.stdout.splitlines()
+        if proceso.returncode != 0:
+            if not proceso.stdout.strip():
+                return RECHAZA, None
+            return FALLA, f"código {proceso.returncode}"
+        if len(lineas) != 1:
+            return FALLA, f"{len(lineas)} líneas de respuesta"
+        return _leer_respuesta(lineas[0])
+
+    def ejecutar_lote(self, cadenas: Sequence[str], tiempo_limite: float) -> Tuple[List[Resultado], List[int]]:
+        if self.por_lote:
+            t0 = time.perf_counter_ns()
+            proceso = self._correr("".join(cadena + "\n" for cadena in cadenas), tiempo_limite * len(cadenas))
+            ns = time.perf_counter_ns() - t0
+            if proceso is not None and proceso.returncode == 0:
+                lineas = proceso.stdout.splitlines()
+                if len(lineas) == len(cadenas):
+                    por_caso = ns // max(len(cadenas), 1)
+                    return [_leer_respuesta(linea) for linea in lineas], [por_caso] * len(cadenas)
+            self.lotes_repetidos += 1
+        resultados: List[Resultado] = []
+        latencias: List[int] = []
+        for cadena in cadenas:
+            t0 = time.perf_counter_ns()
+            resultados.append(self._caso(cadena, tiempo_limite))
+            latencias.append(time.perf_counter_ns() - t0)
+        return resultados, latencias
+
+
+def _tarea_lote(
+    objetivo: Objetivo, cadenas: List[str], tiempo_limite: float
+) -> Tuple[List[Resultado], List[int], int]:
+    """Ejecuta un lote (en un proceso del pool o en este); el último valor son los lotes repetidos de a uno."""
+    antes = getattr(objetivo, "lotes_repetidos", 0)
+    resultados, latencias = objetivo.ejecutar_lote(cadenas, tiempo_limite)
+    return resultados, latencias, getattr(objetivo, "lotes_repetidos", 0) - antes
+
+
+class _Resumen:
+    """Conteos por estado, divergencias e histograma de latencias (µs) de un objetivo."""
+
+    def __init__(self) -> None:
+        self.estados: Counter = Counter()
+        self.divergencias = 0
+        self.lotes_repetidos = 0
+        self.latencias: Counter = Counter()
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def agregar(self, resultados: List[Resultado], latencias: List[int], repetidos: int) -> None:
+        self.estados.update(estado for estado, _ in resultados)
+        self.latencias.update(ns // 1000 for ns in latencias)
+        self.total_ns += sum(latencias)
+        self.max_ns = max(self.max_ns, max(latencias, default=0))
+        self.lotes_repetidos += repetidos
+
+    def reporte(self) -> Dict:
+        casos = sum(self.estados.values())
+        latencia = {"promedio": round(self.total_ns / 1e3 / max(casos, 1), 3)}
+        latencia.update({f"p{p}": percentil(self.latencias, casos, p) for p in PERCENTILES})
+        latencia["max"] = round(self.max_ns / 1e3, 3)
+        reporte = {
+            "resultados": {estado: self.estados.get(estado, 0) for estado in ESTADOS},
+            "divergencias": self.divergencias,
+            "latencia_us": latencia,
+        }
+        if self.lotes_repetidos:
+            reporte["lotes_repetidos"] = self.lotes_repetidos
+        return reporte
+
+
+def _lotes(casos: Iterable[Mapping | str], tam_lote: int) -> Iterable[Tuple[List[str], List[str | None]]]:
+    cadenas: List[str] = []
+    tipos: List[str | None] = []
+    for caso in casos:
+        if isinstance(caso, str):
+            cadenas.append(caso)
+            tipos.append(None)
+        else:
+            cadenas.append(caso["cadena"])
+            tipos.append(caso.get("tipo"))
+        if len(cadenas) == tam_lote:
+            yield cadenas, tipos
+            cadenas, tipos = [], []
+    if cadenas:
+        yield cadenas, tipos
+
+
+def ejecutar_arnes(
+    grammar: Grammar,
+    casos: Iterable[Mapping | str],
+    objetivos: Sequence[Objetivo],
+    nombre: str = "divergencias.jsonl",
+    referencia: Objetivo | None = None,
+    tam_lote: int = TAM_LOTE,
+    tiempo_limite: float = TIEMPO_LIMITE,
+    tolerancia: float = TOLERANCIA,
+    procesos: int | None = None,
+    ejecutor: Executor | None = None,
+    max_divergencias: int | None = None,
+) -> Dict:
+    """
+    Ejecución diferencial: pasa los casos (dicts del generador o cadenas)
+    por la referencia (por defecto, ObjetivoReferencia de la gramática) y
+    por cada objetivo, en lotes de tam_lote casos repartidos en un pool de
+    procesos (procesos=1: todo en este proceso; 'ejecutor' permite
+    compartir uno), y compara cada resultado con el de la referencia (ver
+    coinciden).
+
+    Cada caso con algún objetivo en desacuerdo se escribe en 'nombre'
+    (JSONL: índice, cadena, tipo y resultado de cada objetivo, hasta
+    max_divergencias líneas) y el reporte queda en su archivo lateral.
+    Retorna el reporte: casos, divergencias (total y por tipo de caso) y,
+    por objetivo, conteos por estado, divergencias y latencia por caso en
+    µs (promedio, percentiles y máximo; en los lotes de un comando, el
+    tiempo del lote repartido entre sus casos). Los lotes se procesan en
+    orden y con pocos en vuelo, así que la memoria no crece con la
+    cantidad de casos.
+    """
+    if tam_lote <= 0:
+        raise ValueError("El tamaño de lote debe ser positivo.")
+    if referencia is None:
+        referencia = ObjetivoReferencia(grammar)
+    todos = [referencia, *objetivos]
+    nombres = [objetivo.nombre for objetivo in todos]
+    if len(set(nombres)) != len(nombres):
+        raise ValueError(f"Hay objetivos con el mismo nombre: {', '.join(nombres)}.")
+    resumenes = [_Resumen() for _ in todos]
+    divergencias_por_tipo: Counter = Counter()
+    casos_totales = 0
+    lotes = 0
+    divergencias = 0
+
+    propio = None
+    if ejecutor is None and procesos != 1:
+        ejecutor = propio = ProcessPoolExecutor(max_workers=procesos)
+    # Lotes enviados y todavía sin procesar: pocos, para acotar la memoria
+    en_vuelo = 1 if ejecutor is None else 2 * (procesos or os.cpu_count() or 1)
+
+    def enviar(cadenas: List[str]) -> List:
+        if ejecutor is None:
+            return [_tarea_lote(objetivo, cadenas, tiempo_limite) for objetivo in todos]
+        return [ejecutor.submit(_tarea_lote, objetivo, cadenas, tiempo_limite) for objetivo in todos]
+
+    try:
+        with EscritorJSONL(nombre) as escritor:
+            pendientes: deque = deque()
+            fuente = iter(_lotes(casos, tam_lote))
+            enviados = 0
+            while True:
+                while len(pendientes) < en_vuelo:
+                    lote = next(fuente, None)
+                    if lote is None:
+                        break
+                    pendientes.append((enviados, lote, enviar(lote[0])))
+                    enviados += len(lote[0])
+                if not pendientes:
+                    break
+                inicio, (cadenas, tipos), tareas = pendientes.popleft()
+                por_objetivo = [t if ejecutor is None else t.result() for t in tareas]
+                for resumen, (resultados, latencias, repetidos) in zip(resumenes, por_objetivo):
+                    resumen.agregar(resultados, latencias, repetidos)
+                for k, cadena in enumerate(cadenas):
+                    esperado = por_objetivo[0][0][k]
+                    distintos = [
+                        j for j in range(1, len(todos)) if not coinciden(esperado, por_objetivo[j][0][k], tolerancia)
+                    ]
+                    if not distintos:
+                        continue
+                    divergencias += 1
+                    divergencias_por_tipo[tipos[k] or "sin_tipo"] += 1
+                    for j in distintos:
+                        resumenes[j].divergencias += 1
+                    if max_divergencias is None or divergencias <= max_divergencias:
+                        escritor.escribir({
+                            "indice": inicio + k,
+                            "cadena": cadena,
+                            "tipo": tipos[k],
+                            "resultados": {nombres[j]: list(por_objetivo[j][0][k]) for j in range(len(todos))},
+                        })
+                casos_totales += len(cadenas)
+                lotes += 1
+            reporte = {
+                "casos": casos_totales,
+                "lotes": lotes,
+                "referencia": referencia.nombre,
+                "divergencias": divergencias,
+                "divergencias_por_tipo": dict(divergencias_por_tipo),
+                "objetivos": {nombre_: resumen.reporte() for nombre_, resumen in zip(nombres, resumenes)},
+            }
+            escritor.cerrar(reporte)
+    finally:
+        if propio is not None:
+            propio.shutdown()
+    return reporte
+
+
+def cargar_funcion(ruta: str) -> Callable[[str], object]:
+    """La función 'modulo:nombre' (p. ej. 'mi_parser:evaluar')."""
+    modulo, _, nombre = ruta.partition(":")
+    if not modulo or not nombre:
+        raise ValueError(f"Función inválida: '{ruta}' (se espera 'modulo:funcion').")
+    return getattr(importlib.import_module(modulo), nombre)
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Ejecución diferencial de los casos generados: compara cada objetivo "
+        "(comandos o funciones de Python) con el evaluador de referencia de la gramática."
+    )
+    parser.add_argument("casos", help="salida del generador (.json, .jsonl o directorio de fragmentos)")
+    parser.add_argument("-g", "--gramatica", default="gramatica.txt", help="gramática de los casos")
+    parser.add_argument("-c", "--comando", action="append", default=[],
+                        help="programa a probar (un caso por línea en stdin, un resultado por línea en stdout)")
+    parser.add_argument("-f", "--funcion", action="append", default=[],
+                        help="función de Python a probar, como 'modulo:funcion'")
+    parser.add_argument("--por-caso", action="store_true", help="lanzar los comandos una vez por caso")
+    parser.add_argument("--lote", type=int, default=TAM_LOTE, help=f"casos por lote [{TAM_LOTE}]")
+    parser.add_argument("--tiempo", type=float, default=TIEMPO_LIMITE,
+                        help=f"segundos por caso antes de darlo por colgado [{TIEMPO_LIMITE}]")
+    parser.add_argument("-p", "--procesos", type=int, default=None,
+                        help="procesos del pool (1 = sin pool; por defecto, uno por CPU)")
+    parser.add_argument("-o", "--salida", default="divergencias.jsonl", help="casos en los que hubo desacuerdo")
+    parser.add_argument("--max-divergencias", type=int, default=None, help="máximo de casos a escribir")
+    args = parser.parse_args(argv)
+
+    try:
+        grammar = cargar_gramatica(args.gramatica)
+        objetivos: List[Objetivo] = [ObjetivoComando(c, por_lote=not args.por_caso) for c in args.comando]
+        objetivos += [ObjetivoFuncion(cargar_funcion(f), f) for f in args.funcion]
+        if not objetivos:
+            parser.error("indique al menos un objetivo con --comando o --funcion")
+        reporte = ejecutar_arnes(
+            grammar, leer_casos(args.casos), objetivos, args.salida, tam_lote=args.lote,
+            tiempo_limite=args.tiempo, procesos=args.procesos, max_divergencias=args.max_divergencias,
+        )
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    print(json.dumps(reporte, ensure_ascii=False, indent=4))
+    return 1 if reporte["divergencias"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
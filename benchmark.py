@@ -0,0 +1,303 @@
+# benchmark.py
+
+from itertools import product
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from aleatorio import MOTORES, crear_aleatorio
+from cfg_parser import Grammar, load_grammar, parse_grammar
+from derivador import OPERADORES_ORDENADOS, derive_extreme_string, derive_valid_string
+from generador_validas import _crear_caso, _mutar_cadena, calcular_estadisticas
+from mutador import MotorMutaciones
+from reconocedor import obtener_reconocedor
+
+RUTA_GRAMATICA = Path(__file__).resolve().parent / "gramatica.txt"
+# Formato del archivo de resultados (y de la línea base)
+VERSION = 1
+# Caída relativa de casos/s a partir de la cual se informa una regresión
+UMBRAL = 0.10
+# Operadores de las gramáticas sintéticas (uno distinto por posición, para que sean LALR(1))
+_OPERADORES_SINTETICOS = OPERADORES_ORDENADOS + tuple("^&<>=~@!?$")
+
+# Barrido por defecto y barrido reducido (--rapido)
+BARRIDO = {
+    "gramaticas": ("ejemplo", "sintetica-4x2", "sintetica-6x2"),
+    "profundidades": (6, 12),
+    "longitudes": (40, 200),
+    "casos": (1000,),
+}
+BARRIDO_RAPIDO = {
+    "gramaticas": ("ejemplo", "sintetica-4x2"),
+    "profundidades": (8,),
+    "longitudes": (60,),
+    "casos": (200,),
+}
+
+
+def gramatica_sintetica(niveles: int, operadores: int = 2) -> Grammar:
+    """
+    Gramática de expresiones con 'niveles' de precedencia y 'operadores'
+    binarios por nivel (asociativos por la izquierda), más paréntesis y
+    'num' en el último nivel. Sirve para medir cómo escala el motor con
+    gramáticas más grandes que la de ejemplo.
+    """
+    if niveles < 1 or operadores < 1 or niveles * operadores > len(_OPERADORES_SINTETICOS):
+        raise ValueError(
+            f"Se admiten a lo más {len(_OPERADORES_SINTETICOS)} operadores en total "
+            "(niveles x operadores)."
+        )
+    nombres = [f"N{i}" for i in range(niveles)] + ["P"]
+    ops = iter(_OPERADORES_SINTETICOS)
+    lineas = [f"START: {nombres[0]}"]
+    for i in range(niveles):
+        actual, siguiente = nombres[i], nombres[i + 1]
+        alternativas = [f"{actual} {next(ops)} {siguiente}" for _ in range(operadores)]
+        lineas.append(f"{actual} -> {' | '.join(alternativas + [siguiente])}")
+    lineas.append(f"P -> ( {nombres[0]} ) | num")
+    return parse_grammar("\n".join(lineas))
+
+
+def obtener_gramatica(nombre: str) -> Grammar:
+    """'ejemplo' (gramatica.txt), 'sintetica-NxM' o la ruta de un archivo de gramática."""
+    if nombre == "ejemplo":
+        return load_grammar(str(RUTA_GRAMATICA))
+    if nombre.startswith("sintetica-"):
+        niveles, operadores = nombre[len("sintetica-"):].split("x")
+        return gramatica_sintetica(int(niveles), int(operadores))
+    return load_grammar(nombre)
+
+
+# ----------------------------------------------------------------------
+# Cargas de trabajo: cada una prepara sus entradas fuera de la medición y
+# retorna una función sin argumentos que procesa 'n' casos con 'rng'
+
+
+def _carga_valida(grammar: Grammar, d: int, l: int, n: int, rng: random.Random) -> Callable:
+    return lambda: [derive_valid_string(grammar, d, l, rng=rng)[0] for _ in range(n)]
+
+
+def _carga_extrema(grammar: Grammar, d: int, l: int, n: int, rng: random.Random) -> Callable:
+    derive_extreme_string(grammar, d, l, rng=random.Random(0))  # construye las tablas
+    return lambda: [derive_extreme_string(grammar, d, l, rng=rng)[0] for _ in range(n)]
+
+
+def _carga_mutacion(grammar: Grammar, d: int, l: int, n: int, rng: random.Random) -> Callable:
+    origen = random.Random(1)
+    bases = [derive_valid_string(grammar, d, l, rng=origen)[0] for _ in range(min(n, 500))]
+    return lambda: [_mutar_cadena(rng.choice(bases), 2, rng)[0] for _ in range(n)]
+
+
+def _carga_mutacion_tokens(grammar: Grammar, d: int, l: int, n: int, rng: random.Random) -> Callable:
+    origen = random.Random(1)
+    bases = [derive_valid_string(grammar, d, l, rng=origen)[0] for _ in range(min(n, 500))]
+    mutador = MotorMutaciones(grammar)
+    return lambda: [c for c, _ in mutador.mutar_lote([rng.choice(bases) for _ in range(n)], 2, rng)]
+
+
+def _carga_estadisticas(grammar: Grammar, d: int, l: int, n: int, rng: random.Random) -> Callable:
+    origen = random.Random(1)
+    casos = [_crear_caso(derive_valid_string(grammar, d, l, rng=origen)[0], "valida") for _ in range(n)]
+    tiempos = {"validas": 0.0, "invalidas": 0.0, "extremas": 0.0}
+    return lambda: calcular_estadisticas(casos, tiempos)
+
+
+CARGAS: Dict[str, Tuple[Callable, bool]] = {
+    # nombre -> (preparación, produce cadenas cuyas expansiones se pueden contar)
+    "derivar_valida": (_carga_valida, True),
+    "derivar_extrema": (_carga_extrema, True),
+    "mutar": (_carga_mutacion, False),
+    "mutar_tokens": (_carga_mutacion_tokens, False),
+    "estadisticas": (_carga_estadisticas, False),
+}
+
+
+def _expansiones_promedio(grammar: Grammar, cadenas: List[str]) -> float | None:
+    """
+    Expansiones promedio por cadena, contadas como las reducciones de su
+    análisis LR (las cadenas truncadas, fuera del lenguaje, no cuentan).
+    """
+    reconocedor = obtener_reconocedor(grammar)
+    cuentas = [c for c in map(reconocedor.reducciones, cadenas) if c is not None]
+    return sum(cuentas) / len(cuentas) if cuentas else None
+
+
+def medir(
+    carga: str,
+    grammar: Grammar,
+    profundidad: int,
+    longitud: int,
+    casos: int,
+    repeticiones: int = 3,
+    semilla: int = 0,
+    aleatorio: str | None = None,
+) -> Dict:
+    """
+    Mide una carga: el mejor tiempo de 'repeticiones' corridas (cada una
+    con la misma semilla), el pico de memoria de una corrida aparte con
+    tracemalloc y, para las derivaciones, las expansiones por cadena.
+    'aleatorio' elige el generador (ver aleatorio.crear_aleatorio).
+    """
+    preparar, cuenta_expansiones = CARGAS[carga]
+    rng = crear_aleatorio(semilla, aleatorio)
+    ejecutar = preparar(grammar, profundidad, longitud, casos, rng)
+
+    mejor_ns = None
+    for _ in range(max(1, repeticiones)):
+        rng.seed(semilla)
+        t0 = time.perf_counter_ns()
+        salida = ejecutar()
+        ns = time.perf_counter_ns() - t0
+        if mejor_ns is None or ns < mejor_ns:
+            mejor_ns = ns
+
+    rng.seed(semilla)
+    tracemalloc.start()
+    try:
+        ejecutar()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    ns_por_caso = mejor_ns / casos
+    resultado = {
+        "carga": carga,
+        "casos": casos,
+        "casos_por_s": round(casos * 1e9 / mejor_ns, 1),
+        "ns_por_caso": round(ns_por_caso, 1),
+        "ns_por_expansion": None,
+        "memoria_pico_bytes": pico,
+    }
+    if cuenta_expansiones:
+        promedio = _expansiones_promedio(grammar, salida)
+        if promedio:
+            resultado["expansiones_por_caso"] = round(promedio, 2)
+            resultado["ns_por_expansion"] = round(ns_por_caso / promedio, 1)
+    return resultado
+
+
+def clave_resultado(carga: str, gramatica: str, profundidad: int, longitud: int, casos: int) -> str:
+    return f"{carga}|{gramatica}|d{profundidad}|l{longitud}|n{casos}"
+
+
+def ejecutar_barrido(
+    barrido: Dict = BARRIDO,
+    cargas: List[str] | None = None,
+    repeticiones: int = 3,
+    semilla: int = 0,
+    progreso: Callable[[str, Dict], None] | None = None,
+    aleatorio: str | None = None,
+) -> Dict:
+    """Mide todas las combinaciones del barrido. Retorna {version, python, resultados}."""
+    cargas = cargas or list(CARGAS)
+    resultados: Dict[str, Dict] = {}
+    for nombre in barrido["gramaticas"]:
+        grammar = obtener_gramatica(nombre)
+        combinaciones = product(barrido["profundidades"], barrido["longitudes"], barrido["casos"])
+        for profundidad, longitud, casos in combinaciones:
+            for carga in cargas:
+                resultado = medir(
+                    carga, grammar, profundidad, longitud, casos, repeticiones, semilla, aleatorio
+                )
+                resultado.update(
+                    gramatica=nombre,
+                    no_terminales=len(grammar.nonterminals),
+                    producciones=sum(len(alts) for alts in grammar.productions.values()),
+                    profundidad=profundidad,
+                    longitud=longitud,
+                )
+                clave = clave_resultado(carga, nombre, profundidad, longitud, casos)
+                resultados[clave] = resultado
+                if progreso is not None:
+                    progreso(clave, resultado)
+    return {"version": VERSION, "python": sys.version.split()[0], "resultados": resultados}
+
+
+def comparar(actual: Dict, base: Dict, umbral: float = UMBRAL) -> List[Dict]:
+    """
+    Compara los casos/s de cada medición presente en ambos resultados.
+    Retorna una fila por medición con la razón actual/base y si es una
+    regresión (razón < 1 - umbral).
+    """
+    if base.get("version") != actual.get("version"):
+        raise ValueError("La línea base tiene otro formato; hay que volver a generarla.")
+    filas = []
+    for clave, resultado in actual["resultados"].items():
+        anterior = base["resultados"].get(clave)
+        if anterior is None or not anterior["casos_por_s"]:
+            continue
+        razon = resultado["casos_por_s"] / anterior["casos_por_s"]
+        filas.append({
+            "clave": clave,
+            "base": anterior["casos_por_s"],
+            "actual": resultado["casos_por_s"],
+            "razon": round(razon, 3),
+            "regresion": razon < 1.0 - umbral,
+        })
+    return filas
+
+
+def _imprimir(clave: str, resultado: Dict) -> None:
+    expansion = resultado["ns_por_expansion"]
+    print(
+        f"{clave:<50} {resultado['casos_por_s']:>12.1f} casos/s "
+        f"{(f'{expansion:.1f}' if expansion is not None else '-'):>9} ns/exp "
+        f"{resultado['memoria_pico_bytes'] / 1024:>9.1f} KiB",
+        flush=True,
+    )
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark de derivación, mutación y estadísticas (casos/s, ns por "
+        "expansión y memoria pico), con comparación contra una línea base."
+    )
+    parser.add_argument("--rapido", action="store_true", help="barrido reducido")
+    parser.add_argument("--cargas", help=f"cargas separadas por coma ({', '.join(CARGAS)})")
+    parser.add_argument("--gramaticas", help="gramáticas separadas por coma (ejemplo, sintetica-NxM o rutas)")
+    parser.add_argument("--repeticiones", type=int, default=5, help="corridas por medición (se toma la mejor)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--aleatorio", choices=MOTORES, default=None,
+                        help="usar aleatorio.AleatorioPorLotes con este motor")
+    parser.add_argument("-o", "--salida", help="guardar los resultados en este JSON")
+    parser.add_argument("--base", help="línea base (un JSON de --salida) contra la cual comparar")
+    parser.add_argument("--umbral", type=float, default=UMBRAL,
+                        help="caída relativa tolerada de casos/s (por defecto 0.10)")
+    args = parser.parse_args(argv)
+
+    barrido = dict(BARRIDO_RAPIDO if args.rapido else BARRIDO)
+    if args.gramaticas:
+        barrido["gramaticas"] = tuple(args.gramaticas.split(","))
+    cargas = args.cargas.split(",") if args.cargas else None
+    for carga in cargas or ():
+        if carga not in CARGAS:
+            parser.error(f"carga desconocida: {carga}")
+
+    actual = ejecutar_barrido(
+        barrido, cargas, args.repeticiones, args.semilla, _imprimir, args.aleatorio
+    )
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(actual, f, ensure_ascii=False, indent=4)
+
+    if not args.base:
+        return 0
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    filas = comparar(actual, base, args.umbral)
+    print(f"\nComparación con '{args.base}' (umbral {args.umbral:.0%}):")
+    for fila in filas:
+        marca = "REGRESIÓN" if fila["regresion"] else ""
+        print(f"{fila['clave']:<50} {fila['base']:>12.1f} -> {fila['actual']:>12.1f}  x{fila['razon']:<6} {marca}")
+    regresiones = sum(fila["regresion"] for fila in filas)
+    print(f"{regresiones} regresiones en {len(filas)} mediciones comparadas.")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# cache_gramatica.py
+
+from pathlib import Path
+from typing import Dict, Tuple
+import hashlib
+import os
+import pickle
+import sys
+
+from cfg_parser import Grammar, parse_grammar
+from salida import guardar_atomico
+
+# Módulos que definen los artefactos guardados (grammar.cache): la clave
+# incluye el sha256 de su código, así que cualquier cambio en ellos invalida
+# todo el cache sin tener que acordarse de cambiar una versión a mano
+MODULOS_ARTEFACTOS = ("cfg_parser", "derivador", "enumerador", "reconocedor")
+# Variable de entorno con el directorio del cache (si no está, se usa ~/.cache)
+VARIABLE_DIRECTORIO = "GENERADOR_CACHE_DIR"
+# Entrada de grammar.cache con la ruta en disco y la firma de lo ya guardado (no se guarda)
+_CLAVE_DISCO = "disco"
+
+
+def directorio_cache() -> Path:
+    """Directorio del cache en disco: $GENERADOR_CACHE_DIR o ~/.cache/generador_casos."""
+    directorio = os.environ.get(VARIABLE_DIRECTORIO)
+    if directorio:
+        return Path(directorio)
+    return Path.home() / ".cache" / "generador_casos"
+
+
+def _firma(cache: Dict) -> Dict[object, Tuple]:
+    """Artefactos presentes y el tamaño de las tablas que crecen en el lugar."""
+    return {
+        clave: (getattr(valor, "max_len", None), getattr(valor, "max_height", None))
+        for clave, valor in cache.items()
+        if clave != _CLAVE_DISCO
+    }
+
+
+def _calcular_version_codigo() -> str:
+    """sha256 del código fuente de MODULOS_ARTEFACTOS."""
+    h = hashlib.sha256()
+    for nombre in MODULOS_ARTEFACTOS:
+        h.update(nombre.encode("utf-8") + b"\0")
+        h.update(Path(__file__).with_name(f"{nombre}.py").read_bytes())
+    return h.hexdigest()
+
+
+# Versión del formato de los artefactos, derivada del código que los define
+VERSION_CODIGO = _calcular_version_codigo()
+
+
+def clave_cache(contenido: bytes, opciones: Dict[str, bool]) -> str:
+    """
+    Clave de una gramática en el cache: sha256 del contenido del archivo,
+    del código de los módulos que definen los artefactos (VERSION_CODIGO),
+    de la versión de Python (por pickle) y de las opciones de carga.
+    """
+    h = hashlib.sha256()
+    h.update(f"{VERSION_CODIGO}:{sys.version_info[0]}.{sys.version_info[1]}:".encode("utf-8"))
+    h.update(repr(sorted(opciones.items())).encode("utf-8"))
+    h.update(b"\0")
+    h.update(contenido)
+    return h.hexdigest()
+
+
+def cargar_gramatica(
+    path: str,
+    directorio: str | Path | None = None,
+    precompile: bool = False,
+    normalize: bool = True,
+    remove_left_recursion: bool = False,
+) -> Grammar:
+    """
+    Igual que cfg_parser.load_grammar, pero usando un cache persistente.
+
+    Si el cache tiene la gramática con la misma clave (ver clave_cache), se
+    carga en una sola lectura con todos los artefactos que se hayan
+    guardado (forma compilada, análisis, tablas de conteo y de alturas,
+    tablas del reconocedor, etc.); si no, o si el archivo está dañado o es
+    de otra versión, se vuelve a procesar el texto. Cualquier cambio en el
+    archivo de la gramática o en las opciones cambia la clave, así que no
+    hace falta invalidar nada a mano. Para guardar lo calculado durante la
+    corrida, llamar a guardar_gramatica al final.
+    """
+    with open(path, "rb") as f:
+        contenido = f.read()
+    opciones = {
+        "precompile": precompile,
+        "normalize": normalize,
+        "remove_left_recursion": remove_left_recursion,
+    }
+    clave = clave_cache(contenido, opciones)
+    ruta = Path(directorio or directorio_cache()) / f"{clave}.pkl"
+
+    grammar = None
+    try:
+        with open(ruta, "rb") as f:
+            datos = f.read()
+        grammar = pickle.loads(datos)
+        if not isinstance(grammar, Grammar):
+            grammar = None
+    except FileNotFoundError:
+        pass
+    except Exception:
+        # Archivo truncado o de otra versión del código: se reconstruye
+        grammar = None
+    if grammar is None:
+        # Mismo decodificado que load_grammar (open en modo texto)
+        texto = contenido.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+        grammar = parse_grammar(texto, precompile, normalize, remove_left_recursion)
+    grammar.cache[_CLAVE_DISCO] = (ruta, _firma(grammar.cache))
+    return grammar
+
+
+def guardar_gramatica(grammar: Grammar, forzar: bool = False) -> bool:
+    """
+    Guarda en el cache la gramática cargada con cargar_gramatica junto con
+    los artefactos que tenga en grammar.cache (los reconocedores no guardan
+    sus resultados memoizados). Solo escribe si desde la carga apareció un
+    artefacto nuevo o creció alguna tabla, salvo con forzar=True. La
+    escritura es atómica: se escribe un archivo temporal y se renombra.
+    Retorna True si escribió.
+    """
+    ruta, guardada = grammar.cache.get(_CLAVE_DISCO, (None, None))
+    if ruta is None:
+        raise ValueError("La gramática no se cargó con cargar_gramatica; no tiene clave de cache.")
+    cache = {k: v for k, v in grammar.cache.items() if k != _CLAVE_DISCO}
+    firma = _firma(cache)
+    if not forzar and firma == guardada:
+        return False
+    copia = Grammar(
+        start_symbol=grammar.start_symbol,
+        nonterminals=grammar.nonterminals,
+        terminals=grammar.terminals,
+        productions=grammar.productions,
+    )
+    copia.cache.update(cache)
+    datos = pickle.dumps(copia, protocol=pickle.HIGHEST_PROTOCOL)
+
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    guardar_atomico(ruta, datos)
+    grammar.cache[_CLAVE_DISCO] = (ruta, firma)
+    return True
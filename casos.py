@@ -0,0 +1,226 @@
+# casos.py
+
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator
+
+from derivador import OPERADORES_ORDENADOS
+from estadisticas import TIPOS, TIPOS_MUTACION, analizar_cadena
+
+_CODIGO_TIPO = {tipo: i for i, tipo in enumerate(TIPOS)}
+CLAVES_CASO = ("cadena", "tipo", "longitud", "profundidad", "operadores", "mutaciones")
+# Tipos de array sin signo, de menor a mayor ancho
+_ANCHOS = ("B", "H", "I", "Q")
+
+
+def _anexar(columna: array, valor: int) -> array:
+    """Agrega valor a la columna; si no cabe, retorna una copia con un tipo más ancho."""
+    try:
+        columna.append(valor)
+        return columna
+    except OverflowError:
+        for codigo in _ANCHOS[_ANCHOS.index(columna.typecode) + 1 :]:
+            ancha = array(codigo, columna)
+            try:
+                ancha.append(valor)
+                return ancha
+            except OverflowError:
+                continue
+        raise
+
+
+def _concatenar(columna: array, otra: array) -> array:
+    """Agrega 'otra' al final de 'columna', igualando primero el ancho de ambas."""
+    if columna.typecode != otra.typecode:
+        codigo = max(columna.typecode, otra.typecode, key=_ANCHOS.index)
+        if columna.typecode != codigo:
+            columna = array(codigo, columna)
+        if otra.typecode != codigo:
+            otra = array(codigo, otra)
+    columna.extend(otra)
+    return columna
+
+
+def _ceros(n: int) -> array:
+    """Columna de n ceros."""
+    return array("B", bytes(n))
+
+
+class CasoVista(Mapping):
+    """
+    Vista de un caso de un LoteCasos, compatible con el dict que arma
+    generador_validas._crear_caso ('operadores' y 'mutaciones' se construyen
+    al pedirlos). El único campo modificable es el 'tipo'.
+    """
+
+    __slots__ = ("_lote", "_indice")
+
+    def __init__(self, lote: "LoteCasos", indice: int) -> None:
+        self._lote = lote
+        self._indice = indice
+
+    def __getitem__(self, clave: str):
+        lote = self._lote
+        i = self._indice
+        if clave == "cadena":
+            return lote.cadena(i)
+        if clave == "tipo":
+            return TIPOS[lote.tipos[i]]
+        if clave == "longitud":
+            return lote.longitudes[i]
+        if clave == "profundidad":
+            return lote.profundidades[i]
+        if clave == "operadores":
+            return {op: columna[i] for op, columna in lote.operadores.items()}
+        if clave == "mutaciones":
+            return {k: columna[i] for k, columna in lote.mutaciones.items()}
+        raise KeyError(clave)
+
+    def __setitem__(self, clave: str, valor) -> None:
+        if clave != "tipo":
+            raise TypeError(f"Solo se puede modificar el 'tipo' de un caso compacto, no '{clave}'.")
+        self._lote.tipos[self._indice] = _CODIGO_TIPO[valor]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(CLAVES_CASO)
+
+    def __len__(self) -> int:
+        return len(CLAVES_CASO)
+
+    def __repr__(self) -> str:
+        return f"CasoVista({dict(self)!r})"
+
+
+class LoteCasos:
+    """
+    Lote de casos en formato columnar.
+
+    Las cadenas se guardan concatenadas (UTF-8) en un único bytearray con
+    sus posiciones en un array de offsets, y el resto de los campos en
+    arrays tipados (una columna por operador y por tipo de mutación; las de
+    mutación se agregan, con ceros para los casos anteriores, cuando
+    aparece una clave nueva, como las del mutador por tokens). Las
+    columnas empiezan con 1 byte por valor y se ensanchan solo cuando un
+    valor no cabe, así que un caso típico ocupa unos 15 bytes además de su
+    cadena, en vez de tres dicts.
+
+    Se comporta como una secuencia de CasoVista: len(lote), lote[i] e
+    iteración funcionan igual que con una lista de dicts.
+    """
+
+    def __init__(self) -> None:
+        self._pool = bytearray()
+        self._offsets = array("I", [0])
+        self.tipos = array("B")
+        self.longitudes = array("B")
+        self.profundidades = array("B")
+        self.operadores = {op: array("B") for op in OPERADORES_ORDENADOS}
+        self.mutaciones = {k: array("B") for k in TIPOS_MUTACION}
+
+    def agregar(self, cadena: str, tipo: str, mutaciones: Dict[str, int] | None = None) -> None:
+        """Analiza la cadena (operadores y profundidad) y la agrega como un caso."""
+        operadores, profundidad = analizar_cadena(cadena)
+        self._agregar(cadena, tipo, len(cadena), profundidad, operadores, mutaciones or {})
+
+    def agregar_caso(self, caso: Mapping) -> None:
+        """Agrega un caso ya construido (un dict de _crear_caso o una CasoVista)."""
+        self._agregar(
+            caso["cadena"],
+            caso["tipo"],
+            caso["longitud"],
+            caso["profundidad"],
+            caso["operadores"],
+            caso["mutaciones"],
+        )
+
+    def _agregar(
+        self,
+        cadena: str,
+        tipo: str,
+        longitud: int,
+        profundidad: int,
+        operadores: Dict[str, int],
+        mutaciones: Dict[str, int],
+    ) -> None:
+        if not mutaciones.keys() <= self.mutaciones.keys():
+            for k in mutaciones:
+                if k not in self.mutaciones:
+                    self.mutaciones[k] = _ceros(len(self.tipos))
+        self._pool += cadena.encode("utf-8")
+        self._offsets = _anexar(self._offsets, len(self._pool))
+        self.tipos.append(_CODIGO_TIPO[tipo])
+        self.longitudes = _anexar(self.longitudes, longitud)
+        self.profundidades = _anexar(self.profundidades, profundidad)
+        columnas = self.operadores
+        for op, columna in columnas.items():
+            columnas[op] = _anexar(columna, operadores.get(op, 0))
+        columnas = self.mutaciones
+        for k, columna in columnas.items():
+            columnas[k] = _anexar(columna, mutaciones.get(k, 0))
+
+    def extender(self, otro: "LoteCasos | Iterable[Mapping]") -> None:
+        """Agrega al final los casos de otro lote (columna por columna) o de un iterable de casos."""
+        if not isinstance(otro, LoteCasos):
+            for caso in otro:
+                self.agregar_caso(caso)
+            return
+        base = len(self._pool)
+        self._pool += otro._pool
+        desplazados = [base + off for off in otro._offsets[1:]]
+        try:
+            offsets = array(self._offsets.typecode, desplazados)
+        except OverflowError:
+            offsets = array("Q", desplazados)
+        self._offsets = _concatenar(self._offsets, offsets)
+        self.tipos.extend(otro.tipos)
+        self.longitudes = _concatenar(self.longitudes, otro.longitudes)
+        self.profundidades = _concatenar(self.profundidades, otro.profundidades)
+        for op, columna in self.operadores.items():
+            self.operadores[op] = _concatenar(columna, otro.operadores[op])
+        for k in otro.mutaciones:
+            if k not in self.mutaciones:
+                self.mutaciones[k] = _ceros(len(self.tipos) - len(otro))
+        for k, columna in self.mutaciones.items():
+            otra = otro.mutaciones[k] if k in otro.mutaciones else _ceros(len(otro))
+            self.mutaciones[k] = _concatenar(columna, otra)
+
+    def cadena(self, i: int) -> str:
+        """Cadena del caso i."""
+        return self._pool[self._offsets[i] : self._offsets[i + 1]].decode("utf-8")
+
+    def cadenas(self) -> Iterator[str]:
+        """Recorre las cadenas en orden, sin construir vistas."""
+        pool = self._pool
+        offsets = self._offsets
+        for i in range(len(self.tipos)):
+            yield pool[offsets[i] : offsets[i + 1]].decode("utf-8")
+
+    def tamano_bytes(self) -> int:
+        """Memoria ocupada por los datos del lote (cadenas y columnas)."""
+        columnas = [self._offsets, self.tipos, self.longitudes, self.profundidades]
+        columnas += list(self.operadores.values()) + list(self.mutaciones.values())
+        return len(self._pool) + sum(len(c) * c.itemsize for c in columnas)
+
+    def __len__(self) -> int:
+        return len(self.tipos)
+
+    def __getitem__(self, i: int) -> CasoVista:
+        n = len(self.tipos)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("índice de caso fuera de rango")
+        return CasoVista(self, i)
+
+    def __iter__(self) -> Iterator[CasoVista]:
+        for i in range(len(self.tipos)):
+            yield CasoVista(self, i)
+
+
+def a_json(obj):
+    """Función 'default' para json.dump: convierte lotes y vistas en listas y dicts."""
+    if isinstance(obj, LoteCasos):
+        return list(obj)
+    if isinstance(obj, CasoVista):
+        return dict(obj)
+    raise TypeError(f"Objeto de tipo {type(obj).__name__} no serializable a JSON")
@@ -1,7 +1,10 @@
 # cfg_parser.py
 
 from dataclasses import dataclass, field
-from typing import Dict, List, Set
+from typing import Dict, List, Set, Tuple
+
+# Terminales que se reemplazan por un dígito al generar la cadena final
+NUMBER_TOKENS = {"num", "numero", "n"}
 
 
 @dataclass
@@ -10,9 +13,68 @@ class Grammar:
     nonterminals: Set[str]
     terminals: Set[str]
     productions: Dict[str, List[List[str]]] = field(default_factory=dict)
+    # Artefactos precalculados a partir de la gramática (forma compilada, tablas, etc.)
+    cache: Dict[str, object] = field(default_factory=dict, repr=False, compare=False)
+
+
+@dataclass
+class CompiledGrammar:
+    """
+    Forma compilada de una gramática para las rutinas de derivación.
+
+    Los símbolos se mapean a enteros pequeños: los ids 0..num_nonterminals-1
+    son no terminales y el resto son terminales, de modo que saber si un
+    símbolo es no terminal es una comparación de enteros.
+    """
+    symbols: List[str]
+    symbol_ids: Dict[str, int]
+    num_nonterminals: int
+    start: int
+    # productions[nt][i] = alternativa i de nt como tupla de ids
+    productions: List[List[Tuple[int, ...]]]
+    # nt_counts[nt][i] = cantidad de no terminales en la alternativa i
+    nt_counts: List[List[int]]
+    # Índices de alternativas que contienen (o no) al propio no terminal
+    recursive: List[List[int]]
+    non_recursive: List[List[int]]
+    # Alternativa de altura mínima por no terminal (-1 si el no terminal es improductivo)
+    best_terminating: List[int]
+    # Altura mínima de un árbol de derivación por no terminal (-1 si es improductivo)
+    min_height: List[int]
+    # is_number[sid] = True si el terminal se reemplaza por un dígito
+    is_number: List[bool]
+
 
+@dataclass
+class GrammarAnalysis:
+    """
+    Propiedades de una gramática calculadas por analyze_grammar.
+
+    Un no terminal es productivo si deriva alguna cadena de terminales y
+    alcanzable si aparece en alguna derivación desde el símbolo inicial
+    usando solo alternativas que terminan; los que no cumplen ambas cosas
+    son inútiles y normalize_grammar los elimina.
+    """
+    nullable: Set[str]
+    productive: Set[str]
+    reachable: Set[str]
+    useless: Set[str]
+    # Altura mínima de un árbol de derivación por no terminal productivo
+    min_height: Dict[str, int]
+    # Índices de las alternativas cuyos símbolos son todos productivos
+    terminating: Dict[str, List[int]]
+    # Alternativa que alcanza la altura mínima (-1 si el no terminal es improductivo)
+    best_alternative: Dict[str, int]
+    # No terminales con recursión por la izquierda (directa o indirecta)
+    left_recursive: Set[str]
 
-def load_grammar(path: str) -> Grammar:
+
+def load_grammar(
+    path: str,
+    precompile: bool = False,
+    normalize: bool = True,
+    remove_left_recursion: bool = False,
+) -> Grammar:
     """
     Carga una gramática libre de contexto desde un archivo de texto.
 
@@ -28,9 +90,28 @@ def load_grammar(path: str) -> Grammar:
     - Las producciones usan '->' y alternativas separadas por '|'.
     - Los símbolos en el lado derecho van separados por espacios.
     - Líneas que comienzan con '#' se ignoran.
+
+    Si el símbolo inicial no deriva ninguna cadena de terminales se lanza
+    ValueError. Con normalize=True se eliminan los símbolos inútiles y, si
+    además remove_left_recursion es True, se reescribe la recursión por la
+    izquierda (ver normalize_grammar).
+
+    Si precompile es True, también se construye la forma compilada
+    (ver compile_grammar) y queda guardada en grammar.cache.
     """
     with open(path, "r", encoding="utf-8") as f:
-        raw_lines = [line.strip() for line in f]
+        text = f.read()
+    return parse_grammar(text, precompile, normalize, remove_left_recursion)
+
+
+def parse_grammar(
+    text: str,
+    precompile: bool = False,
+    normalize: bool = True,
+    remove_left_recursion: bool = False,
+) -> Grammar:
+    """Construye la gramática a partir del texto de un archivo (ver load_grammar)."""
+    raw_lines = [line.strip() for line in text.splitlines()]
 
     production_specs = []
     nonterminals_declared: Set[str] = set()
@@ -91,12 +172,283 @@ def load_grammar(path: str) -> Grammar:
             if tok and tok != "ε" and tok not in nonterminals_declared:
                 terminals_declared.add(tok)
 
-    return Grammar(
+    grammar = Grammar(
         start_symbol=start_symbol,
         nonterminals=nonterminals_declared,
         terminals=terminals_declared,
         productions=productions,
     )
+    if normalize:
+        grammar = normalize_grammar(grammar, remove_left_recursion)
+    else:
+        _check_start(grammar, analyze_grammar(grammar))
+    if precompile:
+        compile_grammar(grammar)
+    return grammar
+
+
+def analyze_grammar(grammar: Grammar) -> GrammarAnalysis:
+    """
+    Calcula los no terminales anulables, productivos, alcanzables e inútiles,
+    la altura mínima de cada no terminal con la alternativa que la alcanza y
+    los no terminales recursivos por la izquierda.
+
+    El resultado queda memoizado en grammar.cache.
+    """
+    analysis = grammar.cache.get("analysis")
+    if analysis is not None:
+        return analysis  # type: ignore[return-value]
+
+    nonterminals = grammar.nonterminals
+    productions = grammar.productions
+
+    # Altura mínima por punto fijo: h(A) = min sobre alternativas de 1 + max h(hijos)
+    min_height: Dict[str, int] = {}
+    changed = True
+    while changed:
+        changed = False
+        for nt in nonterminals:
+            for alt in productions.get(nt, []):
+                height = _alternative_height(alt, nonterminals, min_height)
+                if height is not None and height < min_height.get(nt, height + 1):
+                    min_height[nt] = height
+                    changed = True
+    productive = set(min_height)
+
+    terminating: Dict[str, List[int]] = {}
+    best_alternative: Dict[str, int] = {}
+    for nt in nonterminals:
+        alts = productions.get(nt, [])
+        terminating[nt] = [
+            i for i, alt in enumerate(alts)
+            if all(sym not in nonterminals or sym in productive for sym in alt)
+        ]
+        # Entre las de altura mínima, la de menos no terminales (y luego la primera)
+        best_alternative[nt] = min(
+            terminating[nt],
+            key=lambda i: (
+                _alternative_height(alts[i], nonterminals, min_height),
+                sum(1 for sym in alts[i] if sym in nonterminals),
+                i,
+            ),
+            default=-1,
+        )
+
+    nullable: Set[str] = set()
+    changed = True
+    while changed:
+        changed = False
+        for nt in nonterminals:
+            if nt not in nullable and any(
+                all(sym in nullable for sym in alt) for alt in productions.get(nt, [])
+            ):
+                nullable.add(nt)
+                changed = True
+
+    reachable: Set[str] = set()
+    pending = [grammar.start_symbol] if grammar.start_symbol in productive else []
+    while pending:
+        nt = pending.pop()
+        if nt in reachable:
+            continue
+        reachable.add(nt)
+        for i in terminating[nt]:
+            pending.extend(sym for sym in productions[nt][i] if sym in nonterminals)
+
+    # Grafo de esquinas izquierdas: A -> B si B puede quedar primero en una alternativa de A
+    left_corners: Dict[str, Set[str]] = {nt: set() for nt in nonterminals}
+    for nt in nonterminals:
+        for alt in productions.get(nt, []):
+            for sym in alt:
+                if sym in nonterminals:
+                    left_corners[nt].add(sym)
+                if sym not in nullable:
+                    break
+    left_recursive = {nt for nt in nonterminals if nt in _closure(left_corners, nt)}
+
+    analysis = GrammarAnalysis(
+        nullable=nullable,
+        productive=productive,
+        reachable=reachable,
+        useless=set(nonterminals) - (productive & reachable),
+        min_height=min_height,
+        terminating=terminating,
+        best_alternative=best_alternative,
+        left_recursive=left_recursive,
+    )
+    grammar.cache["analysis"] = analysis
+    return analysis
+
+
+def _alternative_height(alt: List[str], nonterminals: Set[str], min_height: Dict[str, int]):
+    """Altura mínima de un árbol que usa la alternativa, o None si algún hijo es improductivo."""
+    height = 1
+    for sym in alt:
+        if sym in nonterminals:
+            child = min_height.get(sym)
+            if child is None:
+                return None
+            if child + 1 > height:
+                height = child + 1
+    return height
+
+
+def _closure(graph: Dict[str, Set[str]], origin: str) -> Set[str]:
+    """Nodos alcanzables desde origin con al menos un paso."""
+    seen: Set[str] = set()
+    pending = list(graph[origin])
+    while pending:
+        node = pending.pop()
+        if node not in seen:
+            seen.add(node)
+            pending.extend(graph[node])
+    return seen
+
+
+def _check_start(grammar: Grammar, analysis: GrammarAnalysis) -> None:
+    start = grammar.start_symbol
+    if start in grammar.nonterminals and start not in analysis.productive:
+        unproductive = sorted(grammar.nonterminals - analysis.productive)
+        raise ValueError(
+            f"El símbolo inicial '{start}' no deriva ninguna cadena de terminales "
+            f"(no terminales improductivos: {', '.join(unproductive)})."
+        )
+
+
+def normalize_grammar(grammar: Grammar, remove_left_recursion: bool = False) -> Grammar:
+    """
+    Retorna una gramática equivalente sin símbolos inútiles: se descartan las
+    alternativas que usan no terminales improductivos y luego los no
+    terminales inalcanzables. Lanza ValueError si el símbolo inicial es
+    improductivo.
+
+    Con remove_left_recursion=True se elimina además la recursión por la
+    izquierda (algoritmo de Paull: sustitución de esquinas izquierdas y
+    reescritura A -> β A', A' -> α A' | ε). La recursión oculta detrás de
+    no terminales anulables no se puede eliminar así y produce ValueError.
+    """
+    analysis = analyze_grammar(grammar)
+    _check_start(grammar, analysis)
+    if grammar.start_symbol not in grammar.nonterminals:
+        return grammar
+
+    normalized = _prune(grammar, analysis)
+    analysis = analyze_grammar(normalized)
+    if remove_left_recursion and analysis.left_recursive:
+        productions = _remove_left_recursion(normalized.productions, analysis.left_recursive)
+        # La sustitución puede dejar no terminales inalcanzables
+        rewritten = Grammar(normalized.start_symbol, set(productions), normalized.terminals, productions)
+        normalized = _prune(rewritten, analyze_grammar(rewritten))
+        left_recursive = analyze_grammar(normalized).left_recursive
+        if left_recursive:
+            raise ValueError(
+                "No se pudo eliminar la recursión por la izquierda de: "
+                + ", ".join(sorted(left_recursive))
+                + " (recursión oculta detrás de producciones vacías)."
+            )
+    return normalized
+
+
+def _prune(grammar: Grammar, analysis: GrammarAnalysis) -> Grammar:
+    """Copia de la gramática sin no terminales inútiles ni alternativas que no terminan."""
+    productions: Dict[str, List[List[str]]] = {
+        nt: [list(alts[i]) for i in analysis.terminating[nt]]
+        for nt, alts in grammar.productions.items()
+        if nt not in analysis.useless
+    }
+    nonterminals = set(productions)
+    terminals = {
+        sym for alts in productions.values() for alt in alts for sym in alt if sym not in nonterminals
+    }
+    return Grammar(
+        start_symbol=grammar.start_symbol,
+        nonterminals=nonterminals,
+        terminals=terminals,
+        productions=productions,
+    )
+
+
+def _remove_left_recursion(
+    productions: Dict[str, List[List[str]]], left_recursive: Set[str]
+) -> Dict[str, List[List[str]]]:
+    # Solo hace falta sustituir entre no terminales recursivos por la izquierda
+    order = sorted(nt for nt in productions if nt in left_recursive)
+    result = {nt: [list(alt) for alt in alts] for nt, alts in productions.items()}
+    for i, ai in enumerate(order):
+        for aj in order[:i]:
+            expanded: List[List[str]] = []
+            for alt in result[ai]:
+                if alt and alt[0] == aj:
+                    expanded.extend(beta + alt[1:] for beta in result[aj])
+                else:
+                    expanded.append(alt)
+            result[ai] = expanded
+
+        recursive = [alt[1:] for alt in result[ai] if alt and alt[0] == ai]
+        if not recursive:
+            continue
+        base = [alt for alt in result[ai] if not alt or alt[0] != ai]
+        tail = ai + "'"
+        while tail in result:
+            tail += "'"
+        result[ai] = [beta + [tail] for beta in base]
+        # A -> A (sin sufijo) no aporta cadenas y se descarta
+        result[tail] = [alpha + [tail] for alpha in recursive if alpha] + [[]]
+    return result
+
+
+def compile_grammar(grammar: Grammar) -> CompiledGrammar:
+    """
+    Retorna la forma compilada de la gramática, construyéndola solo la primera vez.
+
+    El resultado queda memoizado en grammar.cache; si se modifican las
+    producciones después de compilar, hay que vaciar ese cache.
+    """
+    compiled = grammar.cache.get("compiled")
+    if compiled is not None:
+        return compiled  # type: ignore[return-value]
+
+    analysis = analyze_grammar(grammar)
+    nonterminals = sorted(grammar.nonterminals)
+    others: Set[str] = set(grammar.terminals)
+    for alts in grammar.productions.values():
+        for alt in alts:
+            others.update(t for t in alt if t not in grammar.nonterminals)
+    if grammar.start_symbol not in grammar.nonterminals:
+        others.add(grammar.start_symbol)
+    symbols = nonterminals + sorted(others)
+    symbol_ids = {sym: i for i, sym in enumerate(symbols)}
+    num_nt = len(nonterminals)
+
+    productions: List[List[Tuple[int, ...]]] = []
+    nt_counts: List[List[int]] = []
+    recursive: List[List[int]] = []
+    non_recursive: List[List[int]] = []
+    best_terminating: List[int] = []
+    for nt_id, nt in enumerate(nonterminals):
+        alts = [tuple(symbol_ids[t] for t in alt) for alt in grammar.productions.get(nt, [])]
+        counts = [sum(1 for sid in alt if sid < num_nt) for alt in alts]
+        productions.append(alts)
+        nt_counts.append(counts)
+        recursive.append([i for i, alt in enumerate(alts) if nt_id in alt])
+        non_recursive.append([i for i, alt in enumerate(alts) if nt_id not in alt])
+        best_terminating.append(analysis.best_alternative.get(nt, -1))
+
+    compiled = CompiledGrammar(
+        symbols=symbols,
+        symbol_ids=symbol_ids,
+        num_nonterminals=num_nt,
+        start=symbol_ids[grammar.start_symbol],
+        productions=productions,
+        nt_counts=nt_counts,
+        recursive=recursive,
+        non_recursive=non_recursive,
+        best_terminating=best_terminating,
+        min_height=[analysis.min_height.get(nt, -1) for nt in nonterminals],
+        is_number=[i >= num_nt and sym.lower() in NUMBER_TOKENS for i, sym in enumerate(symbols)],
+    )
+    grammar.cache["compiled"] = compiled
+    return compiled
 
 
 def is_nonterminal(token: str, grammar: Grammar) -> bool:
@@ -0,0 +1,410 @@
+# cobertura.py
+
+from typing import Dict, List, Set, Tuple
+import math
+import random
+
+from cfg_parser import Grammar, compile_grammar
+from derivador import OPERADORES_ORDENADOS, DerivationTree
+
+# Profundidad de paréntesis desde la cual los contextos de un operador se consideran iguales
+PROFUNDIDAD_CONTEXTO = 2
+# Peso extra de una alternativa por cada objetivo aún no cubierto que ejercita
+SESGO = 8.0
+
+_FAMILIAS = ("producciones", "pares", "contextos")
+
+
+def _largos_minimos(cg) -> List[float]:
+    """Largo mínimo de la cadena derivable desde cada símbolo (inf si no deriva ninguna)."""
+    num_nt = cg.num_nonterminals
+    largos = [math.inf] * num_nt + [
+        1 if cg.is_number[sid] else len(sym) for sid, sym in enumerate(cg.symbols) if sid >= num_nt
+    ]
+    cambio = True
+    while cambio:
+        cambio = False
+        for a in range(num_nt):
+            for alt in cg.productions[a]:
+                largo = sum(largos[sym] for sym in alt)
+                if largo < largos[a]:
+                    largos[a] = largo
+                    cambio = True
+    return largos
+
+
+def _porcentaje(cubiertos: int, total: int) -> float:
+    return round(cubiertos * 100.0 / total, 2) if total else 100.0
+
+
+class Cobertura:
+    """
+    Cobertura de la gramática ejercitada por los casos generados.
+
+    Lleva tres familias de objetivos:
+    - producciones: (A, i), la alternativa i del no terminal A;
+    - pares: (A, i, j, k), el no terminal de la posición j de la
+      alternativa i de A expandido con su propia alternativa k;
+    - contextos: (operador, d), un operador dentro de d paréntesis
+      anidados (d se satura en 'profundidad_contexto').
+
+    derivar() elige cada alternativa con un peso que crece con la cantidad
+    de objetivos sin cubrir que ejercitaría, y registrar() marca como
+    cubiertos los objetivos de un árbol ya generado.
+
+    Con max_depth (altura del árbol) y max_len, los objetivos son solo los
+    alcanzables con esos límites; los demás quedan en 'inalcanzables' y no
+    cuentan para el porcentaje (ni, por lo tanto, para detener la
+    generación guiada).
+    """
+
+    def __init__(
+        self,
+        grammar: Grammar,
+        profundidad_contexto: int = PROFUNDIDAD_CONTEXTO,
+        max_depth: int | None = None,
+        max_len: int | None = None,
+    ) -> None:
+        self.cg = cg = compile_grammar(grammar)
+        self.profundidad_contexto = profundidad_contexto
+        num_nt = cg.num_nonterminals
+        abre = cg.symbol_ids.get("(")
+        cierra = cg.symbol_ids.get(")")
+        operadores = {cg.symbol_ids[op]: op for op in OPERADORES_ORDENADOS if op in cg.symbol_ids}
+
+        # Por alternativa: altura y largo mínimos, paréntesis abiertos antes de
+        # cada posición y operadores (con su posición) que aparecen directamente
+        self._largo_min = largo_min = _largos_minimos(cg)
+        self._largos: List[List[float]] = []
+        self._alturas: List[List[float]] = []
+        self._balances: List[List[List[int]]] = []
+        self._operadores: List[List[List[Tuple[str, int]]]] = []
+        for a in range(num_nt):
+            alturas, balances, ops = [], [], []
+            for alt in cg.productions[a]:
+                altura = 1
+                balance = 0
+                prefijo = []
+                ops_alt = []
+                for j, sym in enumerate(alt):
+                    prefijo.append(balance)
+                    if sym < num_nt:
+                        h = cg.min_height[sym]
+                        altura = max(altura, h + 1) if h >= 0 else math.inf
+                    elif sym == abre:
+                        balance += 1
+                    elif sym == cierra:
+                        balance -= 1
+                    elif sym in operadores:
+                        ops_alt.append((operadores[sym], j))
+                alturas.append(altura)
+                balances.append(prefijo)
+                ops.append(ops_alt)
+            self._largos.append([sum(largo_min[sym] for sym in alt) for alt in cg.productions[a]])
+            self._alturas.append(alturas)
+            self._balances.append(balances)
+            self._operadores.append(ops)
+        self._profundiza = self._hacia_parentesis(abre)
+        # Alternativa de cierre: la de largo mínimo (y, entre ellas, la de menor altura)
+        self._corta = [
+            min(
+                range(len(cg.productions[a])),
+                key=lambda i, a=a: (self._largos[a][i], self._alturas[a][i]),
+                default=-1,
+            )
+            for a in range(num_nt)
+        ]
+
+        objetivos: Dict[str, Set[Tuple]] = {
+            "producciones": {(a, i) for a in range(num_nt) for i in range(len(cg.productions[a]))},
+            "pares": {
+                (a, i, j, k)
+                for a in range(num_nt)
+                for i, alt in enumerate(cg.productions[a])
+                for j, sym in enumerate(alt)
+                if sym < num_nt
+                for k in range(len(cg.productions[sym]))
+            },
+            "contextos": {
+                (op, d)
+                for op in operadores.values()
+                for d in range(profundidad_contexto + 1 if abre is not None else 1)
+            },
+        }
+        self.inalcanzables: Dict[str, Set[Tuple]] = {familia: set() for familia in _FAMILIAS}
+        if max_depth is not None and max_len is not None:
+            alcanzables = self._alcanzables(max_depth, max_len)
+            for familia in _FAMILIAS:
+                self.inalcanzables[familia] = objetivos[familia] - alcanzables[familia]
+                objetivos[familia] &= alcanzables[familia]
+        self.objetivos = objetivos
+        self.cubiertos: Dict[str, Set[Tuple]] = {familia: set() for familia in _FAMILIAS}
+        self.casos = 0
+
+    def _alcanzables(self, max_depth: int, max_len: int) -> Dict[str, Set[Tuple]]:
+        """
+        Objetivos que aparecen en algún árbol de altura <= max_depth (la
+        raíz tiene profundidad 0, como en derivar) con cadena de largo <=
+        max_len.
+
+        dentro[b][A] es el largo mínimo de un árbol de A que cabe en altura
+        b, y fuera[t][A][d] el largo mínimo de todo lo que rodea a un nodo A
+        de profundidad t con d paréntesis abiertos (saturado como en los
+        contextos). Un objetivo es alcanzable si, en algún nodo, lo que lo
+        rodea más lo más corto que lo contiene cabe en max_len.
+        """
+        cg = self.cg
+        num_nt = cg.num_nonterminals
+        tope = self.profundidad_contexto
+        inf = math.inf
+
+        dentro: List[List[float]] = [[inf] * num_nt]
+        for b in range(1, max_depth + 1):
+            hijos = dentro[b - 1]
+            fila = [
+                min((self._largo_alt(alt, hijos) for alt in cg.productions[a]), default=inf)
+                for a in range(num_nt)
+            ]
+            dentro.append(fila)
+            if fila == hijos:
+                # Desde acá las tablas no cambian: se repite la última fila
+                dentro.extend([fila] * (max_depth - b))
+                break
+
+        alcanzables: Dict[str, Set[Tuple]] = {familia: set() for familia in _FAMILIAS}
+        fuera: List[List[float]] = [[inf] * (tope + 1) for _ in range(num_nt)]
+        if cg.start < num_nt:
+            fuera[cg.start][0] = 0
+        for t in range(max_depth):
+            hijos = dentro[max_depth - t - 1]
+            siguiente: List[List[float]] = [[inf] * (tope + 1) for _ in range(num_nt)]
+            for a in range(num_nt):
+                for d, rodea in enumerate(fuera[a]):
+                    if rodea == inf:
+                        continue
+                    for i, alt in enumerate(cg.productions[a]):
+                        total = rodea + self._largo_alt(alt, hijos)
+                        if total > max_len:
+                            continue
+                        alcanzables["producciones"].add((a, i))
+                        balances = self._balances[a][i]
+                        for op, j in self._operadores[a][i]:
+                            alcanzables["contextos"].add(self._contexto(op, d + balances[j]))
+                        for j, sym in enumerate(alt):
+                            if sym >= num_nt:
+                                continue
+                            resto = total - hijos[sym]
+                            # Pares: el hijo con cada alternativa que quepa en su altura
+                            for k, alt_hijo in enumerate(cg.productions[sym]):
+                                if t + 1 < max_depth and resto + self._largo_alt(
+                                    alt_hijo, dentro[max_depth - t - 2]
+                                ) <= max_len:
+                                    alcanzables["pares"].add((a, i, j, k))
+                            dh = min(max(d + balances[j], 0), tope)
+                            if resto < siguiente[sym][dh]:
+                                siguiente[sym][dh] = resto
+            fuera = siguiente
+        return alcanzables
+
+    def _largo_alt(self, alt: Tuple[int, ...], hijos: List[float]) -> float:
+        """Largo mínimo de la alternativa con sus no terminales en la altura de 'hijos'."""
+        num_nt = self.cg.num_nonterminals
+        largo_min = self._largo_min
+        return sum(hijos[sym] if sym < num_nt else largo_min[sym] for sym in alt)
+
+    def _hacia_parentesis(self, abre: int | None) -> List[List[bool]]:
+        """
+        Marca, por no terminal, las alternativas que llevan más rápido a abrir
+        un paréntesis: las que lo contienen o, si no, la más corta de las que
+        acercan a un no terminal que lo abre.
+        """
+        cg = self.cg
+        num_nt = cg.num_nonterminals
+        # distancia[a] = expansiones mínimas desde a hasta una alternativa con '('
+        distancia = [
+            0 if any(abre in alt for alt in alts) else math.inf for alts in cg.productions[:num_nt]
+        ]
+        cambio = True
+        while cambio:
+            cambio = False
+            for a in range(num_nt):
+                for alt in cg.productions[a]:
+                    d = 1 + min((distancia[s] for s in alt if s < num_nt), default=math.inf)
+                    if d < distancia[a]:
+                        distancia[a] = d
+                        cambio = True
+        marcas = []
+        for a in range(num_nt):
+            alts = cg.productions[a]
+            if distancia[a] == 0 or distancia[a] == math.inf:
+                marcas.append([abre in alt for alt in alts])
+                continue
+            acercan = [
+                i for i, alt in enumerate(alts)
+                if 1 + min((distancia[s] for s in alt if s < num_nt), default=math.inf) == distancia[a]
+            ]
+            mejor = min(acercan, key=lambda i: self._largos[a][i])
+            marcas.append([i == mejor for i in range(len(alts))])
+        return marcas
+
+    def _contexto(self, op: str, d: int) -> Tuple[str, int]:
+        return op, min(max(d, 0), self.profundidad_contexto)
+
+    def _pendientes(
+        self, a: int, i: int, padre: Tuple[int, int, int] | None, d: int, profundo: int
+    ) -> int:
+        """
+        Objetivos sin cubrir que ejercita expandir A con la alternativa i en
+        ese contexto; 'profundo' es la mayor profundidad con contextos sin cubrir.
+        """
+        cubiertos = self.cubiertos
+        n = 0
+        if (a, i) not in cubiertos["producciones"]:
+            n += 1
+        if padre is not None and padre + (i,) not in cubiertos["pares"]:
+            n += 1
+        contextos = cubiertos["contextos"]
+        balances = self._balances[a][i]
+        for op, j in self._operadores[a][i]:
+            if self._contexto(op, d + balances[j]) not in contextos:
+                n += 1
+        # Abrir un paréntesis acerca los contextos más profundos que falten
+        if self._profundiza[a][i] and d < profundo:
+            n += 1
+        return n
+
+    def derivar(
+        self,
+        max_depth: int,
+        max_len: int,
+        rng: random.Random | None = None,
+        sesgo: float = SESGO,
+    ) -> Tuple[str, DerivationTree]:
+        """
+        Deriva una cadena de largo <= max_len (si la gramática lo permite)
+        sesgando la elección de alternativas hacia lo no cubierto. Solo se
+        eligen alternativas que caben en el largo restante y, mientras se
+        pueda, en la altura max_depth; cuando ninguna cabe, el nodo se
+        cierra con su alternativa de largo mínimo. Con sesgo=0 la elección
+        es uniforme. Retorna (cadena, árbol); no registra nada.
+        """
+        rng = rng or random
+        cg = self.cg
+        tree = DerivationTree(cg, leftmost=False, rng=rng)
+        symbols = tree.symbols
+        # Nodo pendiente -> ((A, i, j) del padre, paréntesis abiertos)
+        contexto: Dict[int, Tuple[Tuple[int, int, int] | None, int]] = {0: (None, 0)}
+        faltan = self.objetivos["contextos"] - self.cubiertos["contextos"]
+        profundo = max((d for _, d in faltan), default=-1)
+        # Largo de la cadena si todos los pendientes se cerraran con su largo mínimo
+        largo = self._largo_min[cg.start]
+        while tree.pending:
+            node = tree.next_nonterminal()
+            a = symbols[node]
+            padre, d = contexto.pop(node)
+            if not cg.productions[a]:
+                tree.expand(node, -1)
+                continue
+            libre = max_depth - tree.depths[node]
+            holgura = max_len - largo + self._largo_min[a]
+            alturas = self._alturas[a]
+            candidatas = [
+                i for i, n in enumerate(self._largos[a]) if n <= holgura and alturas[i] <= libre
+            ]
+            if not candidatas:
+                candidatas = [self._corta[a]]
+            pesos = [1.0 + sesgo * self._pendientes(a, i, padre, d, profundo) for i in candidatas]
+            x = rng.random() * sum(pesos)
+            elegida = candidatas[-1]
+            for i, peso in zip(candidatas, pesos):
+                x -= peso
+                if x < 0:
+                    elegida = i
+                    break
+            tree.expand(node, elegida)
+            largo += self._largos[a][elegida] - self._largo_min[a]
+            base = tree.first[node]
+            balances = self._balances[a][elegida]
+            for j, sym in enumerate(cg.productions[a][elegida]):
+                if sym < cg.num_nonterminals:
+                    contexto[base + j] = ((a, elegida, j), d + balances[j])
+        return tree.to_string(), tree
+
+    def registrar(self, tree: DerivationTree) -> int:
+        """Marca los objetivos que ejercita el árbol; retorna cuántos eran nuevos."""
+        cubiertos = self.cubiertos
+        producciones = cubiertos["producciones"]
+        pares = cubiertos["pares"]
+        contextos = cubiertos["contextos"]
+        antes = sum(len(c) for c in cubiertos.values())
+        symbols, alts, first = tree.symbols, tree.alts, tree.first
+        pila = [(0, 0)]
+        while pila:
+            node, d = pila.pop()
+            i = alts[node]
+            if i < 0:
+                continue
+            a = symbols[node]
+            producciones.add((a, i))
+            balances = self._balances[a][i]
+            for op, j in self._operadores[a][i]:
+                contextos.add(self._contexto(op, d + balances[j]))
+            base = first[node]
+            for j in range(tree.count[node]):
+                hijo = base + j
+                k = alts[hijo]
+                if k >= 0:
+                    pares.add((a, i, j, k))
+                    pila.append((hijo, d + balances[j]))
+        self.casos += 1
+        return sum(len(c) for c in cubiertos.values()) - antes
+
+    def _cubiertos(self, familia: str) -> int:
+        # Un árbol que se pasa de los límites puede cubrir objetivos inalcanzables: no cuentan
+        return len(self.cubiertos[familia] & self.objetivos[familia])
+
+    def fraccion(self) -> float:
+        """Fracción de todos los objetivos (de las tres familias) ya cubiertos."""
+        total = sum(len(o) for o in self.objetivos.values())
+        if total == 0:
+            return 1.0
+        return sum(self._cubiertos(familia) for familia in _FAMILIAS) / total
+
+    def _faltantes(self) -> Dict[str, List[str]]:
+        cg = self.cg
+        producciones = [
+            f"{cg.symbols[a]} -> {' '.join(cg.symbols[s] for s in cg.productions[a][i]) or 'ε'}"
+            for a, i in sorted(self.objetivos["producciones"] - self.cubiertos["producciones"])
+        ]
+        contextos = [
+            f"{op} en profundidad {d}"
+            for op, d in sorted(self.objetivos["contextos"] - self.cubiertos["contextos"])
+        ]
+        return {"producciones": producciones, "contextos": contextos}
+
+    def _inalcanzables(self) -> Dict[str, List[str]]:
+        cg = self.cg
+        return {
+            "producciones": [
+                f"{cg.symbols[a]} -> {' '.join(cg.symbols[s] for s in cg.productions[a][i]) or 'ε'}"
+                for a, i in sorted(self.inalcanzables["producciones"])
+            ],
+            "pares": len(self.inalcanzables["pares"]),
+            "contextos": [f"{op} en profundidad {d}" for op, d in sorted(self.inalcanzables["contextos"])],
+        }
+
+    def reporte(self) -> Dict:
+        """Resumen para el reporte general (sección 'cobertura')."""
+        reporte: Dict = {"casos": self.casos, "total": round(self.fraccion() * 100.0, 2)}
+        for familia in _FAMILIAS:
+            cubiertos = self._cubiertos(familia)
+            total = len(self.objetivos[familia])
+            reporte[familia] = {
+                "cubiertos": cubiertos,
+                "total": total,
+                "porcentaje": _porcentaje(cubiertos, total),
+            }
+        reporte["faltantes"] = self._faltantes()
+        if any(self.inalcanzables.values()):
+            reporte["inalcanzables"] = self._inalcanzables()
+        return reporte
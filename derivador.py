@@ -1,170 +1,1083 @@
 # derivador.py
 
-from typing import List, Tuple
+from bisect import bisect_right
+from collections import OrderedDict
+from operator import mul
+from typing import Callable, Dict, Hashable, List, Tuple
 import random
+import time
 
-from cfg_parser import Grammar, is_nonterminal
+from aleatorio import AleatorioPorLotes
+from cfg_parser import CompiledGrammar, Grammar, compile_grammar
+from instrumentacion import Instrumentacion
 
 OPERADORES = {"+", "-", "*", "/", "%"}
+# Orden fijo de los operadores (el orden de iteración de un set cambia entre procesos)
+OPERADORES_ORDENADOS = tuple(sorted(OPERADORES))
 
 
-def _contains_nonterminal(tokens: List[str], grammar: Grammar) -> bool:
-    return any(is_nonterminal(t, grammar) for t in tokens)
+class DerivationTree:
+    """
+    Árbol de derivación que se expande en el lugar.
 
+    Cada nodo guarda su símbolo, su profundidad, la alternativa con que se
+    expandió y el rango de sus hijos (los hijos de un nodo ocupan
+    posiciones contiguas en las listas). Los no
+    terminales pendientes se mantienen aparte, de modo que elegir y expandir
+    uno cuesta O(1) amortizado sin importar el largo de la forma sentencial.
 
-def _select_nonterminal_index(tokens: List[str], grammar: Grammar, mode: str) -> int | None:
-    indices = [i for i, t in enumerate(tokens) if is_nonterminal(t, grammar)]
-    if not indices:
-        return None
-    if mode == "balanced":
-        # Izquierda primero (tipo derivación más "ordenada")
-        return indices[0]
-    # Aleatorio
-    return random.choice(indices)
+    Con leftmost=True los pendientes forman una pila cuyo tope es el no
+    terminal de más a la izquierda; si no, se elige uno al azar con 'rng'
+    (por defecto, el generador global del módulo random).
+    """
+
+    __slots__ = (
+        "cg", "rng", "symbols", "depths", "alts", "first", "count", "pending", "leftmost", "size",
+        "height",
+    )
+
+    def __init__(
+        self, cg: CompiledGrammar, leftmost: bool = True, rng: random.Random | None = None
+    ) -> None:
+        self.cg = cg
+        self.rng = rng or random
+        self.symbols: List[int] = [cg.start]
+        self.depths: List[int] = [0]
+        # alts[n] = alternativa con que se expandió el nodo (-1 si no fue expandido)
+        self.alts: List[int] = [-1]
+        # first[n] = índice del primer hijo (-1 si el nodo no fue expandido)
+        self.first: List[int] = [-1]
+        self.count: List[int] = [0]
+        self.pending: List[int] = [0] if cg.start < cg.num_nonterminals else []
+        self.leftmost = leftmost
+        # Cantidad de símbolos en la forma sentencial actual (hojas del árbol)
+        self.size = 1
+        # Altura del árbol: niveles de expansión desde la raíz
+        self.height = 0
+
+    def next_nonterminal(self) -> int:
+        """Saca de los pendientes el próximo nodo no terminal a expandir."""
+        pending = self.pending
+        if self.leftmost:
+            return pending.pop()
+        k = self.rng.randrange(len(pending))
+        node = pending[k]
+        pending[k] = pending[-1]
+        pending.pop()
+        return node
+
+    def expand(self, node: int, alt: int) -> None:
+        """Expande el nodo con la alternativa 'alt' (-1: el no terminal no tiene producciones)."""
+        cg = self.cg
+        replacement = cg.productions[self.symbols[node]][alt] if alt >= 0 else ()
+        base = len(self.symbols)
+        depth = self.depths[node] + 1
+        n = len(replacement)
+        self.alts[node] = alt
+        self.first[node] = base
+        self.count[node] = n
+        self.symbols.extend(replacement)
+        self.depths.extend([depth] * n)
+        self.alts.extend([-1] * n)
+        self.first.extend([-1] * n)
+        self.count.extend([0] * n)
+        self.size += n - 1
+        if depth > self.height:
+            self.height = depth
+
+        num_nt = cg.num_nonterminals
+        if self.leftmost:
+            for i in range(n - 1, -1, -1):
+                if replacement[i] < num_nt:
+                    self.pending.append(base + i)
+        else:
+            for i in range(n):
+                if replacement[i] < num_nt:
+                    self.pending.append(base + i)
 
+    def set_leftmost(self) -> None:
+        """Pasa a selección por la izquierda, reordenando los pendientes."""
+        if self.leftmost:
+            return
+        self.leftmost = True
+        num_nt = self.cg.num_nonterminals
+        self.pending = [
+            node for node in reversed(list(self.leaves())) if self.symbols[node] < num_nt
+        ]
 
-def _tokens_to_string(tokens: List[str]) -> str:
+    def leaves(self):
+        """Recorre las hojas (nodos no expandidos) de izquierda a derecha."""
+        first = self.first
+        count = self.count
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            f = first[node]
+            if f < 0:
+                yield node
+            else:
+                stack.extend(range(f + count[node] - 1, f - 1, -1))
+
+    def to_string(self) -> str:
+        """Cadena de la forma sentencial actual."""
+        symbols = self.symbols
+        return _tokens_to_string([symbols[node] for node in self.leaves()], self.cg, self.rng)
+
+
+def _tokens_to_string(
+    tokens: List[int], cg: CompiledGrammar, rng: random.Random | None = None
+) -> str:
     """
-    Convierte la lista de tokens en una cadena.
-    Reemplaza 'num' / 'numero' / 'n' por dígitos aleatorios.
+    Convierte la lista de ids de símbolos en una cadena.
+    Reemplaza 'num' / 'numero' / 'n' por dígitos aleatorios (con un
+    AleatorioPorLotes, todos los dígitos se sortean de una vez).
     """
+    rng = rng or random
+    symbols = cg.symbols
+    is_number = cg.is_number
+    if isinstance(rng, AleatorioPorLotes):
+        digits = iter(rng.digitos(sum(1 for sid in tokens if is_number[sid])))
+        return "".join([next(digits) if is_number[sid] else symbols[sid] for sid in tokens])
     result: List[str] = []
-    for tok in tokens:
-        lower = tok.lower()
-        if lower in {"num", "numero", "n"}:
-            result.append(str(random.randint(0, 9)))
+    for sid in tokens:
+        if is_number[sid]:
+            result.append(str(rng.randint(0, 9)))
         else:
-            result.append(tok)
+            result.append(symbols[sid])
     return "".join(result)
 
 
-def derive_valid_string(
-    grammar: Grammar, max_depth: int, max_len: int, mode: str = "random"
-) -> Tuple[str, int]:
+# Un subárbol del pool: (terminales de izquierda a derecha, altura)
+Subtree = Tuple[List[int], int]
+
+
+class SubtreePool:
     """
-    Genera una cadena válida a partir de la gramática usando derivación controlada.
-    Retorna (cadena, profundidad_aproximada_por_pasos).
+    Pool acotado de subárboles ya derivados, para no volver a derivar una y
+    otra vez los subárboles chicos de las derivaciones extremas y de largo
+    exacto.
+
+    La clave es (no terminal, presupuesto restante): altura y largo exactos
+    en derive_extreme_string, largo en sample_exact_string. Solo se usan
+    para subárboles de altura <= max_height o largo <= max_len (nunca para
+    la raíz). Cada clave guarda hasta 'capacity' subárboles; mientras no
+    se llena, cada pedido deriva uno nuevo, y después se reusa uno al azar,
+    salvo con probabilidad 'refresh', en que se deriva uno nuevo que
+    reemplaza a uno al azar. Las claves se desalojan por LRU cuando pasan
+    de max_keys. Los dígitos de 'num' se sortean igual en cada cadena, así
+    que reusar un subárbol no repite sus números.
+
+    report() resume la reutilización y la diversidad (subárboles distintos
+    en el pool) para el reporte general.
     """
-    tokens: List[str] = [grammar.start_symbol]
-    depth = 0
-    max_depth_reached = 0
-    steps = 0
-    max_steps = max(max_depth * 10 + 50, 50)
 
-    while _contains_nonterminal(tokens, grammar) and depth < max_depth and steps < max_steps:
-        idx = _select_nonterminal_index(tokens, grammar, mode)
-        if idx is None:
-            break
-        nt = tokens[idx]
-        prod_list = grammar.productions.get(nt)
-        if not prod_list:
-            replacement: List[str] = []
-        else:
-            replacement = random.choice(prod_list)
-        tokens = tokens[:idx] + replacement + tokens[idx + 1 :]
-        depth += 1
-        steps += 1
-        max_depth_reached = max(max_depth_reached, depth)
-        if len(tokens) > max_len * 2:
+    def __init__(
+        self,
+        capacity: int = 16,
+        refresh: float = 0.05,
+        max_keys: int = 4096,
+        max_height: int = 6,
+        max_len: int = 15,
+    ) -> None:
+        if capacity < 1 or max_keys < 1 or not 0.0 <= refresh <= 1.0:
+            raise ValueError("El pool requiere capacity >= 1, max_keys >= 1 y 0 <= refresh <= 1.")
+        self.capacity = capacity
+        self.refresh = refresh
+        self.max_keys = max_keys
+        self.max_height = max_height
+        self.max_len = max_len
+        self.entries: "OrderedDict[Hashable, List[Subtree]]" = OrderedDict()
+        self.hits = 0
+        self.derived = 0
+        self.refreshed = 0
+        self.evicted = 0
+        # Claves y subárboles (y distintos) de los pools fusionados con merge_stats
+        self.merged_keys = 0
+        self.merged_stored = 0
+        self.merged_distinct = 0
+
+    def empty_copy(self) -> "SubtreePool":
+        """Pool vacío con la misma configuración (p. ej. uno por bloque paralelo)."""
+        return SubtreePool(self.capacity, self.refresh, self.max_keys, self.max_height, self.max_len)
+
+    def get(self, key: Hashable, derive: Callable[[], Subtree], rng: random.Random) -> Subtree:
+        """Un subárbol para la clave: reusado del pool o recién derivado con derive()."""
+        entries = self.entries.get(key)
+        if entries is None:
+            subtree = derive()
+            self.derived += 1
+            self.entries[key] = [subtree]
+            if len(self.entries) > self.max_keys:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+            return subtree
+        self.entries.move_to_end(key)
+        if len(entries) < self.capacity:
+            subtree = derive()
+            self.derived += 1
+            entries.append(subtree)
+            return subtree
+        if self.refresh and rng.random() < self.refresh:
+            subtree = derive()
+            self.derived += 1
+            self.refreshed += 1
+            entries[rng.randrange(len(entries))] = subtree
+            return subtree
+        self.hits += 1
+        return entries[rng.randrange(len(entries))]
+
+    def _stored(self) -> Tuple[int, int]:
+        stored = sum(len(entries) for entries in self.entries.values())
+        distinct = len({tuple(tokens) for entries in self.entries.values() for tokens, _ in entries})
+        return stored + self.merged_stored, distinct + self.merged_distinct
+
+    def merge_stats(self, other: "SubtreePool") -> "SubtreePool":
+        """
+        Suma las estadísticas de otro pool (p. ej. el de un bloque paralelo);
+        los subárboles no se copian, solo se suman sus cantidades (los
+        distintos se cuentan por pool).
+        """
+        self.hits += other.hits
+        self.derived += other.derived
+        self.refreshed += other.refreshed
+        self.evicted += other.evicted
+        stored, distinct = other._stored()
+        self.merged_keys += len(other.entries) + other.merged_keys
+        self.merged_stored += stored
+        self.merged_distinct += distinct
+        return self
+
+    def report(self) -> Dict:
+        """Resumen para el reporte general (sección 'pool_subarboles')."""
+        requests = self.hits + self.derived
+        stored, distinct = self._stored()
+        return {
+            "pedidos": requests,
+            "reusados": self.hits,
+            "derivados": self.derived,
+            "renovados": self.refreshed,
+            "claves_desalojadas": self.evicted,
+            "tasa_reuso": round(self.hits * 100.0 / requests, 2) if requests else 0.0,
+            "claves": len(self.entries) + self.merged_keys,
+            "subarboles": stored,
+            "subarboles_distintos": distinct,
+        }
+
+
+class CountTables:
+    """
+    Cantidad de derivaciones por no terminal y por longitud (en caracteres).
+
+    nt[A][n] cuenta los árboles de derivación de A cuya cadena mide n;
+    suffix[A][i][j][n] cuenta las formas de derivar, con largo n, el sufijo
+    que empieza en la posición j de la alternativa i de A. Cada terminal
+    numérico pesa 'number_weight' (una opción por dígito), así que en una
+    gramática no ambigua nt[A][n] es la cantidad de cadenas distintas.
+    """
+
+    def __init__(self, cg: CompiledGrammar, number_weight: int = 10) -> None:
+        self.cg = cg
+        self.number_weight = number_weight
+        self.max_len = -1
+        self.nt: List[List[int]] = [[] for _ in range(cg.num_nonterminals)]
+        self.suffix: List[List[List[List[int]]]] = [
+            [[[] for _ in range(len(alt) + 1)] for alt in alts] for alts in cg.productions
+        ]
+        # Largo y peso de cada terminal (num produce un dígito)
+        self.term_len = [1 if cg.is_number[sid] else len(sym) for sid, sym in enumerate(cg.symbols)]
+        self.term_weight = [number_weight if num else 1 for num in cg.is_number]
+
+    def extend(self, max_len: int) -> None:
+        """Completa las tablas hasta la longitud max_len (inclusive)."""
+        cg = self.cg
+        num_nt = cg.num_nonterminals
+        nt = self.nt
+        suffix = self.suffix
+        term_len = self.term_len
+        term_weight = self.term_weight
+
+        for n in range(self.max_len + 1, max_len + 1):
+            for a in range(num_nt):
+                nt[a].append(0)
+                for i, alt in enumerate(cg.productions[a]):
+                    for j in range(len(alt)):
+                        suffix[a][i][j].append(0)
+                    suffix[a][i][len(alt)].append(1 if n == 0 else 0)
+
+            # Parte de cada convolución que solo usa largos menores que n:
+            # se calcula una vez por n.
+            inner = {}
+            for a in range(num_nt):
+                for i, alt in enumerate(cg.productions[a]):
+                    table = suffix[a][i]
+                    for j, sym in enumerate(alt):
+                        if sym < num_nt and n > 1 and any(table[j + 1]):
+                            inner[a, i, j] = sum(map(mul, nt[sym][1:n], reversed(table[j + 1][1:n])))
+
+            # Las producciones unitarias o anulables dependen de valores de la
+            # misma longitud: se itera hasta un punto fijo.
+            rounds = 0
+            changed = True
+            while changed:
+                changed = False
+                rounds += 1
+                if rounds > num_nt + 1:
+                    raise ValueError(
+                        f"La gramática tiene infinitas derivaciones de longitud {n} "
+                        "(ciclo de producciones unitarias o vacías)."
+                    )
+                for a in range(num_nt):
+                    total = 0
+                    for i, alt in enumerate(cg.productions[a]):
+                        table = suffix[a][i]
+                        for j in range(len(alt) - 1, -1, -1):
+                            sym = alt[j]
+                            nxt = table[j + 1]
+                            if sym < num_nt:
+                                fx = nt[sym]
+                                value = fx[n] * nxt[0]
+                                if n > 0:
+                                    value += fx[0] * nxt[n] + inner.get((a, i, j), 0)
+                            else:
+                                ln = term_len[sym]
+                                value = term_weight[sym] * nxt[n - ln] if n >= ln else 0
+                            table[j][n] = value
+                        total += table[0][n]
+                    if total != nt[a][n]:
+                        nt[a][n] = total
+                        changed = True
+        self.max_len = max(self.max_len, max_len)
+
+    def count(self, sym: int, n: int) -> int:
+        """Derivaciones de largo n para el símbolo sym (terminal o no terminal)."""
+        if sym < self.cg.num_nonterminals:
+            return self.nt[sym][n]
+        return self.term_weight[sym] if self.term_len[sym] == n else 0
+
+
+def count_tables(grammar: Grammar, max_len: int, number_weight: int = 10) -> CountTables:
+    """Retorna las tablas de conteo de la gramática (memoizadas en grammar.cache) hasta max_len."""
+    key = ("counts", number_weight)
+    tables = grammar.cache.get(key)
+    if tables is None:
+        tables = CountTables(compile_grammar(grammar), number_weight)
+        grammar.cache[key] = tables
+    if tables.max_len < max_len:  # type: ignore[union-attr]
+        tables.extend(max_len)  # type: ignore[union-attr]
+    return tables  # type: ignore[return-value]
+
+
+def count_strings(grammar: Grammar, length: int) -> int:
+    """Cantidad de cadenas (derivaciones) de exactamente 'length' caracteres."""
+    tables = count_tables(grammar, length)
+    return tables.count(tables.cg.start, length)
+
+
+def _split_point(weights, total: int, lo: int, hi: int, rng: random.Random) -> int:
+    """
+    Elige m en [lo, hi] con probabilidad weights(m) / total.
+
+    Recorre los candidatos alternando entre ambos extremos, de modo que el
+    costo esperado es logarítmico cuando la masa se concentra en un borde.
+    """
+    r = rng.randrange(total)
+    while lo <= hi:
+        w = weights(lo)
+        if r < w:
+            return lo
+        r -= w
+        lo += 1
+        if lo > hi:
             break
+        w = weights(hi)
+        if r < w:
+            return hi
+        r -= w
+        hi -= 1
+    raise RuntimeError("Tablas de conteo inconsistentes.")
+
 
-    # Intento de terminar derivando alternativas poco recursivas
-    safety = 0
-    while _contains_nonterminal(tokens, grammar) and safety < max_steps:
-        safety += 1
-        idx = _select_nonterminal_index(tokens, grammar, "balanced")
-        if idx is None:
+def _exact_parts(
+    tables: CountTables, sym: int, n: int, rng: random.Random
+) -> List[Tuple[int, int]]:
+    """
+    Elige la alternativa de 'sym' con probabilidad proporcional a sus
+    derivaciones de largo n y reparte el largo entre sus símbolos.
+    Retorna [(símbolo, largo)] de izquierda a derecha.
+    """
+    nt = tables.nt
+    num_nt = tables.cg.num_nonterminals
+    suffix = tables.suffix[sym]
+    r = rng.randrange(nt[sym][n])
+    alt_index = 0
+    for alt_index, table in enumerate(suffix):
+        if r < table[0][n]:
             break
-        nt = tokens[idx]
-        prod_list = grammar.productions.get(nt, [])
-        if not prod_list:
-            replacement = []
+        r -= table[0][n]
+    alt = tables.cg.productions[sym][alt_index]
+    table = suffix[alt_index]
+
+    parts = []
+    rem = n
+    for j, child in enumerate(alt):
+        nxt = table[j + 1]
+        if child < num_nt:
+            fx = nt[child]
+            m = _split_point(lambda k: fx[k] * nxt[rem - k], table[j][rem], 0, rem, rng)
         else:
-            best = None
-            best_score = None
-            for alt in prod_list:
-                score = sum(1 for t in alt if is_nonterminal(t, grammar))
-                if best is None or score < best_score:
-                    best = alt
-                    best_score = score
-            replacement = best or []
-        tokens = tokens[:idx] + replacement + tokens[idx + 1 :]
-
-    s = _tokens_to_string(tokens)
-    if len(s) > max_len:
-        s = s[:max_len]
-    return s, max_depth_reached
+            m = tables.term_len[child]
+        parts.append((child, m))
+        rem -= m
+    return parts
 
 
-def derive_extreme_string(grammar: Grammar, max_depth: int, max_len: int) -> Tuple[str, int]:
+def _exact_tokens(tables: CountTables, sym: int, n: int, rng: random.Random) -> Subtree:
+    """Terminales y altura de un árbol de 'sym' de largo n muestreado uniformemente."""
+    num_nt = tables.cg.num_nonterminals
+    tokens: List[int] = []
+    height = 0
+    stack = [(sym, n, 1)]
+    while stack:
+        x, m, depth = stack.pop()
+        if x >= num_nt:
+            tokens.append(x)
+            continue
+        if depth > height:
+            height = depth
+        stack.extend((child, k, depth + 1) for child, k in reversed(_exact_parts(tables, x, m, rng)))
+    return tokens, height
+
+
+def sample_exact_string(
+    grammar: Grammar,
+    length: int,
+    rng: random.Random | None = None,
+    pool: SubtreePool | None = None,
+) -> Tuple[str, int]:
     """
-    Genera una cadena 'extrema', intentando llegar a la profundidad y longitud máximas.
+    Genera una cadena de exactamente 'length' caracteres, elegida de manera
+    uniforme entre todas las derivaciones de ese largo (sin rechazo ni truncado).
+    Retorna (cadena, altura_del_arbol_de_derivacion).
+
+    Con 'pool', los subárboles de largo <= pool.max_len se toman del pool
+    (ver SubtreePool): la cadena sigue midiendo 'length', pero deja de ser
+    uniforme en sus partes chicas.
     """
-    tokens: List[str] = [grammar.start_symbol]
-    depth = 0
-    max_depth_reached = 0
-    steps = 0
-    max_steps = max(max_depth * 15 + 100, 100)
+    rng = rng or random
+    tables = count_tables(grammar, length)
+    cg = tables.cg
+    num_nt = cg.num_nonterminals
+    if tables.count(cg.start, length) == 0:
+        raise ValueError(f"La gramática no genera cadenas de longitud {length}.")
 
-    # Fase 1: privilegiar producciones recursivas para aumentar profundidad
-    while _contains_nonterminal(tokens, grammar) and depth < max_depth and steps < max_steps:
-        idx = _select_nonterminal_index(tokens, grammar, "balanced")
-        if idx is None:
-            break
-        nt = tokens[idx]
-        prod_list = grammar.productions.get(nt, [])
-        if not prod_list:
-            replacement = []
+    result: List[str] = []
+    # Con un AleatorioPorLotes, posiciones de los 'num' (sus dígitos se sortean al final)
+    numbers: List[int] | None = [] if isinstance(rng, AleatorioPorLotes) else None
+    height = 0
+    # Pila de (símbolo, largo asignado, profundidad); el tope es lo de más a la izquierda
+    stack = [(cg.start, length, 1)]
+    while stack:
+        sym, n, depth = stack.pop()
+        if sym >= num_nt:
+            tokens = (sym,)
+        elif pool is not None and depth > 1 and n <= pool.max_len:
+            tokens, sub_height = pool.get(
+                ("largo", sym, n), lambda: _exact_tokens(tables, sym, n, rng), rng
+            )
+            height = max(height, depth - 1 + sub_height)
         else:
-            recursive = []
-            non_recursive = []
-            for alt in prod_list:
-                if nt in alt:
-                    recursive.append(alt)
-                else:
-                    non_recursive.append(alt)
-            if recursive:
-                replacement = random.choice(recursive)
+            if depth > height:
+                height = depth
+            parts = _exact_parts(tables, sym, n, rng)
+            stack.extend((child, m, depth + 1) for child, m in reversed(parts))
+            continue
+        for token in tokens:
+            if not cg.is_number[token]:
+                result.append(cg.symbols[token])
+            elif numbers is None:
+                result.append(str(rng.randint(0, 9)))
             else:
-                replacement = random.choice(prod_list)
-        tokens = tokens[:idx] + replacement + tokens[idx + 1 :]
-        depth += 1
-        steps += 1
-        max_depth_reached = max(max_depth_reached, depth)
-        if len(tokens) > max_len * 2:
-            break
+                numbers.append(len(result))
+                result.append("")
 
-    # Fase 2: cerrar derivaciones con alternativas no recursivas
-    safety = 0
-    while _contains_nonterminal(tokens, grammar) and safety < max_steps:
-        safety += 1
-        idx = _select_nonterminal_index(tokens, grammar, "balanced")
-        if idx is None:
-            break
-        nt = tokens[idx]
-        prod_list = grammar.productions.get(nt, [])
-        if not prod_list:
-            replacement = []
-        else:
-            non_recursive = [alt for alt in prod_list if nt not in alt]
-            if non_recursive:
-                replacement = random.choice(non_recursive)
+    if numbers:
+        for position, digit in zip(numbers, rng.digitos(len(numbers))):  # type: ignore[union-attr]
+            result[position] = digit
+    return "".join(result), height
+
+
+def _solve_linear(matrix: List[List[float]], rhs: List[float]) -> List[float] | None:
+    """Resuelve matrix · x = rhs por eliminación gaussiana (None si es singular)."""
+    n = len(rhs)
+    a = [row[:] + [rhs[i]] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        if abs(a[pivot][col]) < 1e-300:
+            return None
+        a[col], a[pivot] = a[pivot], a[col]
+        for r in range(col + 1, n):
+            factor = a[r][col] / a[col][col]
+            if factor:
+                for c in range(col, n + 1):
+                    a[r][c] -= factor * a[col][c]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (a[r][n] - sum(a[r][c] * x[c] for c in range(r + 1, n))) / a[r][r]
+    return x
+
+
+class BoltzmannOracle:
+    """
+    Parámetros de la función generatriz de la gramática para el muestreo de Boltzmann.
+
+    El tamaño se mide en caracteres: cada terminal aporta z^largo (num aporta
+    10·z, uno por dígito). La singularidad rho se calcula una sola vez; para
+    cada tamaño objetivo se ajusta z <= rho de modo que el tamaño esperado
+    se acerque al objetivo, y se guardan las probabilidades de cada alternativa.
+    """
+
+    def __init__(self, cg: CompiledGrammar) -> None:
+        self.cg = cg
+        self.term_len = [1 if cg.is_number[sid] else len(sym) for sid, sym in enumerate(cg.symbols)]
+        self.term_mult = [10 if num else 1 for num in cg.is_number]
+        self.min_len = self._min_lengths()
+        # Alternativas invertidas (para apilarlas) y cuánto suman al largo mínimo
+        self.reversed_alts = [[alt[::-1] for alt in alts] for alts in cg.productions]
+        self.budget_delta = [
+            [sum(self.min_len[sym] for sym in alt) - self.min_len[a] for alt in alts]
+            for a, alts in enumerate(cg.productions)
+        ]
+        self.rho = self._singularity()
+        # z ajustado y probabilidades acumuladas por tamaño objetivo
+        self.tuned: Dict[int, Tuple[float, List[List[float]]]] = {}
+
+    def _min_lengths(self) -> List[float]:
+        cg = self.cg
+        num_nt = cg.num_nonterminals
+        inf = float("inf")
+        lengths = [inf] * num_nt + self.term_len[num_nt:]
+        changed = True
+        while changed:
+            changed = False
+            for a in range(num_nt):
+                for alt in cg.productions[a]:
+                    value = sum(lengths[sym] for sym in alt)
+                    if value < lengths[a]:
+                        lengths[a] = value
+                        changed = True
+        return lengths
+
+    def values(self, z: float) -> Tuple[List[float], List[float]] | None:
+        """
+        Resuelve Y = Φ(z, Y) por el método de Newton desde Y = 0.
+        Retorna (Y, dY/dz), o None si z está sobre la singularidad.
+        """
+        cg = self.cg
+        num_nt = cg.num_nonterminals
+        weights = [0.0] * num_nt + [
+            self.term_mult[sym] * z ** self.term_len[sym] for sym in range(num_nt, len(cg.symbols))
+        ]
+        y = [0.0] * num_nt
+        for _ in range(200):
+            phi = [0.0] * num_nt
+            dphi_dz = [0.0] * num_nt
+            matrix = [[1.0 if r == c else 0.0 for c in range(num_nt)] for r in range(num_nt)]
+            for a in range(num_nt):
+                for alt in cg.productions[a]:
+                    ws = [y[sym] if sym < num_nt else weights[sym] for sym in alt]
+                    prod = 1.0
+                    for w in ws:
+                        prod *= w
+                    phi[a] += prod
+                    if z > 0:
+                        dphi_dz[a] += prod * sum(self.term_len[sym] for sym in alt if sym >= num_nt) / z
+                    for j, sym in enumerate(alt):
+                        if sym < num_nt:
+                            others = 1.0
+                            for k, w in enumerate(ws):
+                                if k != j:
+                                    others *= w
+                            matrix[a][sym] -= others
+            step = _solve_linear(matrix, [phi[a] - y[a] for a in range(num_nt)])
+            if step is None or any(d < -1e-9 * max(1.0, abs(v)) for d, v in zip(step, y)):
+                return None
+            y = [v + d for v, d in zip(y, step)]
+            if any(v > 1e15 or v != v for v in y):
+                return None
+            if all(abs(d) <= 1e-12 * max(1.0, abs(v)) for d, v in zip(step, y)):
+                derivative = _solve_linear(matrix, dphi_dz)
+                if derivative is None or any(v < 0 for v in derivative):
+                    return None
+                return y, derivative
+        return None
+
+    def _singularity(self) -> float:
+        lo, hi = 0.0, 1.0
+        while self.values(hi) is not None:
+            lo, hi = hi, hi * 2
+            if hi > 2.0 ** 20:
+                raise ValueError("La gramática genera un lenguaje finito; no hay cadenas grandes.")
+        for _ in range(80):
+            mid = (lo + hi) / 2
+            if self.values(mid) is None:
+                hi = mid
             else:
-                replacement = random.choice(prod_list)
-        tokens = tokens[:idx] + replacement + tokens[idx + 1 :]
-        if len(tokens) > max_len * 2:
-            break
+                lo = mid
+            if hi - lo <= 1e-13 * hi:
+                break
+        if lo == 0.0:
+            raise ValueError("No se pudo evaluar la función generatriz de la gramática.")
+        return lo
+
+    def expected_size(self, z: float) -> float:
+        result = self.values(z)
+        if result is None:
+            return float("inf")
+        y, dy = result
+        start = self.cg.start
+        return z * dy[start] / y[start] if y[start] > 0 else 0.0
+
+    def tune(self, target: int) -> Tuple[float, List[List[float]]]:
+        """Retorna (z, probabilidades acumuladas por alternativa) para el tamaño objetivo."""
+        cached = self.tuned.get(target)
+        if cached is not None:
+            return cached
+        lo, hi = 0.0, self.rho
+        if self.expected_size(hi) > target:
+            for _ in range(60):
+                mid = (lo + hi) / 2
+                if self.expected_size(mid) < target:
+                    lo = mid
+                else:
+                    hi = mid
+        z = hi
+        result = self.values(z)
+        if result is None:
+            z = lo
+            result = self.values(z)
+        if result is None:
+            raise ValueError("No se pudo ajustar el parámetro de Boltzmann.")
+        y = result[0]
+        cg = self.cg
+        num_nt = cg.num_nonterminals
+        cumulative: List[List[float]] = []
+        for a in range(num_nt):
+            acc = 0.0
+            row: List[float] = []
+            for alt in cg.productions[a]:
+                prod = 1.0
+                for sym in alt:
+                    prod *= y[sym] if sym < num_nt else self.term_mult[sym] * z ** self.term_len[sym]
+                acc += prod
+                row.append(acc)
+            cumulative.append([v / acc for v in row] if acc > 0 else row)
+        self.tuned[target] = (z, cumulative)
+        return z, cumulative
+
+
+def boltzmann_oracle(grammar: Grammar) -> BoltzmannOracle:
+    """Retorna el oráculo de Boltzmann de la gramática (memoizado en grammar.cache)."""
+    oracle = grammar.cache.get("boltzmann")
+    if oracle is None:
+        oracle = BoltzmannOracle(compile_grammar(grammar))
+        grammar.cache["boltzmann"] = oracle
+    return oracle  # type: ignore[return-value]
+
+
+def derive_boltzmann_string(
+    grammar: Grammar,
+    target_len: int,
+    tolerance: float = 0.1,
+    max_attempts: int = 100000,
+    rng: random.Random | None = None,
+    inst: Instrumentacion | None = None,
+) -> Tuple[str, int]:
+    """
+    Genera una cadena válida de largo en [target_len·(1-tolerance), target_len·(1+tolerance)]
+    con un muestreador de Boltzmann con rechazo.
+
+    Cada intento se aborta apenas su largo mínimo posible supera el límite
+    superior, por lo que el costo esperado es lineal en el tamaño de la salida.
+    Retorna (cadena, altura_del_arbol_de_derivacion).
+
+    Con 'inst' cuenta los intentos abortados por largo y los descartados por
+    quedar cortos, y mide la fase "boltzmann".
+    """
+    oracle = boltzmann_oracle(grammar)
+    cg = oracle.cg
+    num_nt = cg.num_nonterminals
+    _, cumulative = oracle.tune(target_len)
+    reversed_alts = oracle.reversed_alts
+    budget_delta = oracle.budget_delta
+    symbols = cg.symbols
+    is_number = cg.is_number
+    lower = int(target_len * (1 - tolerance))
+    upper = int(target_len * (1 + tolerance))
+    rand = (rng or random).random
+    digits = "0123456789"
+    aborted = 0
+    if inst is not None:
+        t0 = time.perf_counter_ns()
+
+    for attempt in range(max_attempts):
+        result: List[str] = []
+        height = 0
+        # Largo emitido más el largo mínimo de lo que queda en la pila
+        budget = oracle.min_len[cg.start]
+        stack = [cg.start]
+        depths = [1]
+        while stack and budget <= upper:
+            sym = stack.pop()
+            depth = depths.pop()
+            if sym >= num_nt:
+                result.append(digits[int(rand() * 10)] if is_number[sym] else symbols[sym])
+                continue
+            if depth > height:
+                height = depth
+            i = bisect_right(cumulative[sym], rand())
+            budget += budget_delta[sym][i]
+            children = reversed_alts[sym][i]
+            stack.extend(children)
+            depths.extend([depth + 1] * len(children))
+        if stack:
+            aborted += 1
+            continue
+        s = "".join(result)
+        if lower <= len(s) <= upper:
+            if inst is not None:
+                inst.sumar_fase("boltzmann", time.perf_counter_ns() - t0)
+                inst.contar("derivaciones_boltzmann")
+                inst.contar("intentos_abortados", aborted)
+                inst.contar("intentos_cortos", attempt - aborted)
+            return s, height
+    raise ValueError(
+        f"No se obtuvo una cadena de largo {lower}..{upper} en {max_attempts} intentos; "
+        "pruebe con una tolerancia mayor."
+    )
+
+
+def _sumset(a: int, b: int, mask: int) -> int:
+    """Suma de conjuntos de largos representados como bits: {x + y : x en a, y en b}."""
+    if a.bit_count() < b.bit_count():
+        a, b = b, a
+    result = 0
+    while b:
+        low = b & -b
+        result |= a << (low.bit_length() - 1)
+        b ^= low
+    return result & mask
+
+
+class HeightTables:
+    """
+    Largos alcanzables por altura de árbol, hasta una longitud máxima.
+
+    Los conjuntos de largos se guardan como enteros usados de bitset (el bit
+    n indica que el largo n es alcanzable). le[h][X] son los largos de los
+    árboles de X con altura <= h y eq[h][X] los de altura exactamente h (un
+    terminal tiene altura 0; una producción vacía, altura 1). Para cada
+    alternativa i de A se guardan además los prefijos: prefix_le[h][A][i][j]
+    y prefix_eq[h][A][i][j] son los largos de los primeros j hijos con
+    altura <= h - 1 y con alguno de altura exactamente h - 1.
+    """
+
+    def __init__(self, cg: CompiledGrammar, max_len: int) -> None:
+        self.cg = cg
+        self.max_len = max_len
+        self.mask = (1 << (max_len + 1)) - 1
+        num_nt = cg.num_nonterminals
+        term_len = [1 if cg.is_number[sid] else len(sym) for sid, sym in enumerate(cg.symbols)]
+        terminals = [0] * num_nt + [1 << n for n in term_len[num_nt:]]
+        self.terminals = [t & self.mask for t in terminals]
+        self.le: List[List[int]] = [list(self.terminals)]
+        self.eq: List[List[int]] = [list(self.terminals)]
+        self.prefix_le: List[List[List[List[int]]]] = [[]]
+        self.prefix_eq: List[List[List[List[int]]]] = [[]]
 
-    s = _tokens_to_string(tokens)
+    @property
+    def max_height(self) -> int:
+        return len(self.le) - 1
 
-    # Si quedó muy corta, extenderla agregando operadores y números
-    while len(s) < max_len:
-        op = random.choice(list(OPERADORES))
-        s = f"({s}{op}{random.randint(0,9)})"
-        if len(s) > max_len * 2:
+    def extend(self, max_height: int) -> None:
+        """Completa las tablas hasta la altura max_height (inclusive)."""
+        cg = self.cg
+        num_nt = cg.num_nonterminals
+        mask = self.mask
+        for h in range(len(self.le), max_height + 1):
+            le_prev = self.le[h - 1]
+            eq_prev = self.eq[h - 1]
+            le = [0] * num_nt + self.terminals[num_nt:]
+            eq = [0] * len(le)
+            pre_le: List[List[List[int]]] = []
+            pre_eq: List[List[List[int]]] = []
+            for a in range(num_nt):
+                alts_le = []
+                alts_eq = []
+                for alt in cg.productions[a]:
+                    p_le = [1]
+                    p_eq = [0]
+                    for sym in alt:
+                        last_le = p_le[-1]
+                        last_eq = p_eq[-1]
+                        p_eq.append(
+                            _sumset(last_eq, le_prev[sym], mask) | _sumset(last_le, eq_prev[sym], mask)
+                        )
+                        p_le.append(_sumset(last_le, le_prev[sym], mask))
+                    if h == 1:
+                        # Altura 1: todos los hijos son terminales (o no hay hijos)
+                        p_eq[-1] = p_le[-1]
+                    alts_le.append(p_le)
+                    alts_eq.append(p_eq)
+                    eq[a] |= p_eq[-1]
+                le[a] = le_prev[a] | eq[a]
+                pre_le.append(alts_le)
+                pre_eq.append(alts_eq)
+            self.le.append(le)
+            self.eq.append(eq)
+            self.prefix_le.append(pre_le)
+            self.prefix_eq.append(pre_eq)
+
+    def target(self, sym: int, max_height: int, max_len: int) -> Tuple[int, int] | None:
+        """
+        (altura, largo) más cercanos al objetivo: la mayor altura <= max_height
+        con algún árbol de largo <= max_len y, con esa altura, el mayor largo.
+        """
+        limit = (1 << (min(max_len, self.max_len) + 1)) - 1
+        for h in range(min(max_height, self.max_height), 0, -1):
+            lengths = self.eq[h][sym] & limit
+            if lengths:
+                return h, lengths.bit_length() - 1
+        return None
+
+    def _split(
+        self, child_le: int, child_eq: int, prev_le: int, prev_eq: int, t: int, exact: bool,
+        rng: random.Random,
+    ) -> Tuple[int, bool, bool]:
+        """
+        Elige el largo m del último hijo de un prefijo de largo t. Retorna
+        (m, hijo_exacto, prefijo_exacto), buscando desde una posición al azar.
+        """
+        hi = min(t, (child_le | child_eq).bit_length() - 1)
+        lo = max(0, t - (prev_le | prev_eq).bit_length() + 1)
+        if hi < lo:
+            raise ValueError("Tablas de alturas inconsistentes.")
+        start = rng.randint(lo, hi)
+        for k in range(hi - lo + 1):
+            m = start + k
+            if m > hi:
+                m -= hi - lo + 1
+            rest = t - m
+            if not exact:
+                if child_le >> m & 1 and prev_le >> rest & 1:
+                    return m, False, False
+                continue
+            options = []
+            if child_eq >> m & 1 and prev_le >> rest & 1:
+                options.append((m, True, False))
+            if child_le >> m & 1 and prev_eq >> rest & 1:
+                options.append((m, False, True))
+            if options:
+                return options[0] if len(options) == 1 else rng.choice(options)
+        raise ValueError("Tablas de alturas inconsistentes.")
+
+    def sample(
+        self,
+        sym: int,
+        height: int,
+        length: int,
+        rng: random.Random,
+        pool: SubtreePool | None = None,
+        exact: bool = True,
+    ) -> List[int]:
+        """
+        Terminales (de izquierda a derecha) de un árbol de 'sym' con altura
+        exactamente 'height' (o a lo más 'height' con exact=False) y largo
+        exactamente 'length'; el par debe ser alcanzable (ver target). Con
+        'pool', los subárboles de altura <= pool.max_height se toman del pool.
+        """
+        cg = self.cg
+        num_nt = cg.num_nonterminals
+        tokens: List[int] = []
+        # Pila de (símbolo, altura, altura_exacta, largo)
+        stack = [(sym, height, exact, length)]
+        while stack:
+            x, h, exact, n = stack.pop()
+            if x >= num_nt:
+                tokens.append(x)
+                continue
+            if pool is not None and h <= pool.max_height and (tokens or stack):
+                subtree, _ = pool.get(
+                    ("altura", x, h, exact, n),
+                    lambda: (self.sample(x, h, n, rng, None, exact), h),
+                    rng,
+                )
+                tokens.extend(subtree)
+                continue
+            prefixes = self.prefix_eq[h][x] if exact else self.prefix_le[h][x]
+            alts = [i for i, pre in enumerate(prefixes) if pre[-1] >> n & 1]
+            i = alts[0] if len(alts) == 1 else rng.choice(alts)
+            alt = cg.productions[x][i]
+            pre_le = self.prefix_le[h][x][i]
+            pre_eq = self.prefix_eq[h][x][i]
+            if h == 1:
+                # Todos los hijos son terminales
+                stack.extend((c, 0, False, 0) for c in reversed(alt))
+                continue
+            le_prev = self.le[h - 1]
+            eq_prev = self.eq[h - 1]
+            t = n
+            for j in range(len(alt) - 1, -1, -1):
+                child = alt[j]
+                m, child_exact, exact = self._split(
+                    le_prev[child], eq_prev[child], pre_le[j], pre_eq[j], t, exact, rng
+                )
+                stack.append((child, h - 1, child_exact, m))
+                t -= m
+        return tokens
+
+
+def height_tables(grammar: Grammar, max_height: int, max_len: int) -> HeightTables:
+    """Retorna las tablas de alturas de la gramática (memoizadas en grammar.cache)."""
+    key = ("heights", max_len)
+    tables = grammar.cache.get(key)
+    if tables is None:
+        tables = HeightTables(compile_grammar(grammar), max_len)
+        grammar.cache[key] = tables
+    if tables.max_height < max_height:  # type: ignore[union-attr]
+        tables.extend(max_height)  # type: ignore[union-attr]
+    return tables  # type: ignore[return-value]
+
+
+def _close_minimal(tree: DerivationTree) -> int:
+    """
+    Expande todos los pendientes con su alternativa de altura mínima
+    (best_terminating). Retorna la cantidad de expansiones.
+    """
+    best = tree.cg.best_terminating
+    symbols = tree.symbols
+    steps = 0
+    while tree.pending:
+        node = tree.next_nonterminal()
+        tree.expand(node, best[symbols[node]])
+        steps += 1
+    return steps
+
+
+def derive_valid_string(
+    grammar: Grammar,
+    max_depth: int,
+    max_len: int,
+    mode: str = "random",
+    rng: random.Random | None = None,
+    inst: Instrumentacion | None = None,
+) -> Tuple[str, int]:
+    """
+    Genera una cadena válida a partir de la gramática usando derivación controlada.
+    Retorna (cadena, altura_del_arbol_de_derivacion).
+
+    A diferencia de derive_extreme_string y de Cobertura, donde max_depth es
+    la altura del árbol, acá max_depth acota la cantidad de expansiones
+    aleatorias (como en la versión original): el cierre mínimo posterior
+    puede dejar un árbol más alto que max_depth, y la altura retornada es
+    la del árbol final.
+
+    Con 'inst' cuenta las expansiones de cada fase, el motivo del corte de
+    la fase aleatoria (profundidad, max_steps o largo) y los truncamientos,
+    y mide las fases "derivacion", "cierre" y "serializacion".
+    """
+    rng = rng or random
+    cg = compile_grammar(grammar)
+    tree = DerivationTree(cg, leftmost=(mode == "balanced"), rng=rng)
+    steps = 0
+    max_steps = max(max_depth * 10 + 50, 50)
+    if inst is not None:
+        t0 = time.perf_counter_ns()
+
+    while tree.pending and steps < max_depth and steps < max_steps:
+        node = tree.next_nonterminal()
+        prod_list = cg.productions[tree.symbols[node]]
+        tree.expand(node, rng.randrange(len(prod_list)) if prod_list else -1)
+        steps += 1
+        if tree.size > max_len * 2:
+            if inst is not None:
+                inst.contar("cortes_por_largo")
             break
 
+    if inst is not None:
+        t1 = time.perf_counter_ns()
+        inst.sumar_fase("derivacion", t1 - t0)
+        inst.contar("derivaciones_validas")
+        inst.contar("expansiones", steps)
+        if tree.pending and tree.size <= max_len * 2:
+            inst.contar("cortes_por_max_steps" if steps >= max_steps else "cortes_por_profundidad")
+
+    # Cierre con las alternativas de altura mínima: cada hijo tiene menor
+    # altura mínima que su padre, así que termina en una cantidad acotada de pasos
+    tree.set_leftmost()
+    closing = _close_minimal(tree)
+
+    if inst is not None:
+        t2 = time.perf_counter_ns()
+        inst.sumar_fase("cierre", t2 - t1)
+        inst.contar("expansiones_cierre", closing)
+    s = tree.to_string()
     if len(s) > max_len:
+        if inst is not None:
+            inst.contar("truncamientos")
+            inst.contar("caracteres_truncados", len(s) - max_len)
         s = s[:max_len]
-    return s, max_depth_reached or depth or 1
+    if inst is not None:
+        inst.sumar_fase("serializacion", time.perf_counter_ns() - t2)
+    return s, tree.height
+
+
+def derive_extreme_string(
+    grammar: Grammar,
+    max_depth: int,
+    max_len: int,
+    rng: random.Random | None = None,
+    inst: Instrumentacion | None = None,
+    pool: SubtreePool | None = None,
+) -> Tuple[str, int]:
+    """
+    Genera una cadena 'extrema': un árbol de derivación con altura max_depth
+    y largo max_len exactos cuando la gramática lo permite. Si no, usa la
+    mayor altura alcanzable <= max_depth y, con esa altura, el mayor largo
+    <= max_len. La cadena nunca se trunca, así que siempre es válida.
+    Retorna (cadena, altura_del_arbol_de_derivacion).
+
+    Con 'inst' cuenta las cadenas que no alcanzan los límites pedidos y las
+    que caen al árbol mínimo, y mide las fases "tablas_alturas" y
+    "muestreo_extremo". Con 'pool', los subárboles chicos se reusan (ver
+    SubtreePool); la altura y el largo de la cadena no cambian.
+    """
+    rng = rng or random
+    cg = compile_grammar(grammar)
+    if inst is not None:
+        inst.contar("derivaciones_extremas")
+    if cg.start >= cg.num_nonterminals:
+        return _tokens_to_string([cg.start], cg, rng), 1
+    if inst is not None:
+        t0 = time.perf_counter_ns()
+    tables = height_tables(grammar, max_depth, max_len)
+    target = tables.target(cg.start, max_depth, max_len)
+    if inst is not None:
+        t1 = time.perf_counter_ns()
+        inst.sumar_fase("tablas_alturas", t1 - t0)
+    if target is not None:
+        height, length = target
+        s = _tokens_to_string(tables.sample(cg.start, height, length, rng, pool), cg, rng)
+        if inst is not None:
+            inst.sumar_fase("muestreo_extremo", time.perf_counter_ns() - t1)
+            if (height, length) != (max_depth, max_len):
+                inst.contar("extremas_bajo_limite")
+        return s, height
 
+    # Ningún árbol cabe en los límites: se deriva el de menor altura
+    tree = DerivationTree(cg, leftmost=True, rng=rng)
+    closing = _close_minimal(tree)
+    if inst is not None:
+        inst.sumar_fase("muestreo_extremo", time.perf_counter_ns() - t1)
+        inst.contar("extremas_arbol_minimo")
+        inst.contar("expansiones_cierre", closing)
+    return tree.to_string(), tree.height or 1
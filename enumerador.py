@@ -0,0 +1,150 @@
+# enumerador.py
+
+from itertools import product
+from typing import Dict, Iterator, List, Tuple
+
+from cfg_parser import Grammar, compile_grammar
+from derivador import count_tables
+
+DIGITOS = "0123456789"
+# Marcadores internos de los terminales numéricos (área de uso privado de Unicode)
+_BASE_MARCADOR = 0xE000
+
+
+class Enumerador:
+    """
+    Enumeración exhaustiva de las cadenas de una gramática por longitud.
+
+    Trabaja sobre plantillas: cadenas donde cada terminal numérico ('num')
+    queda como un marcador. Las listas de plantillas de cada (no terminal,
+    longitud) y de cada sufijo de alternativa se calculan una sola vez y se
+    reutilizan, así que la subestructura compartida no se recalcula. Las
+    tablas de conteo (con peso 1 por 'num') descartan de antemano las
+    combinaciones de largos que no producen nada.
+    """
+
+    def __init__(self, grammar: Grammar) -> None:
+        self.grammar = grammar
+        self.cg = cg = compile_grammar(grammar)
+        num_nt = cg.num_nonterminals
+        self._marcas: Dict[int, str] = {}
+        self._texto: List[str] = []
+        for sid, sym in enumerate(cg.symbols):
+            if sid >= num_nt and cg.is_number[sid]:
+                self._marcas[sid] = chr(_BASE_MARCADOR + len(self._marcas))
+                self._texto.append(self._marcas[sid])
+            else:
+                self._texto.append(sym)
+        # Marcador -> nombre del terminal (plantillas) y -> campo de formato (cadenas)
+        self._a_nombre = {ord(m): cg.symbols[sid] for sid, m in self._marcas.items()}
+        self._a_campo = {ord(m): "{}" for m in self._marcas.values()}
+        self._a_campo.update({ord("{"): "{{", ord("}"): "}}"})
+        self._listas: Dict[Tuple[int, int], List[str]] = {}
+        self._sufijos: Dict[Tuple[int, int, int, int], List[str]] = {}
+        self.tablas = count_tables(grammar, 0, number_weight=1)
+
+    def _preparar(self, max_len: int) -> None:
+        if self.tablas.max_len < max_len:
+            self.tablas = count_tables(self.grammar, max_len, number_weight=1)
+
+    def lista(self, sym: int, n: int) -> List[str]:
+        """Plantillas distintas de largo n derivables desde sym (memoizadas)."""
+        if sym >= self.cg.num_nonterminals:
+            return [self._texto[sym]] if self.tablas.term_len[sym] == n else []
+        clave = (sym, n)
+        resultado = self._listas.get(clave)
+        if resultado is None:
+            self._preparar(n)
+            if self.tablas.count(sym, n) == 0:
+                resultado = []
+            else:
+                vistas: Dict[str, None] = {}
+                for i in range(len(self.cg.productions[sym])):
+                    vistas.update(dict.fromkeys(self._sufijo(sym, i, 0, n)))
+                resultado = list(vistas)
+            self._listas[clave] = resultado
+        return resultado
+
+    def _sufijo(self, a: int, i: int, j: int, n: int) -> List[str]:
+        """Plantillas de largo n del sufijo que empieza en la posición j de la alternativa i de a."""
+        alt = self.cg.productions[a][i]
+        if j == len(alt):
+            return [""] if n == 0 else []
+        clave = (a, i, j, n)
+        resultado = self._sufijos.get(clave)
+        if resultado is not None:
+            return resultado
+        resultado = []
+        tablas = self.tablas
+        resto = tablas.suffix[a][i][j + 1]
+        if tablas.suffix[a][i][j][n]:
+            sym = alt[j]
+            for m in range(n + 1):
+                if not resto[n - m] or not tablas.count(sym, m):
+                    continue
+                cabezas = self.lista(sym, m)
+                colas = self._sufijo(a, i, j + 1, n - m)
+                resultado.extend(x + y for x in cabezas for y in colas)
+        self._sufijos[clave] = resultado
+        return resultado
+
+    def plantillas(self, n: int) -> List[str]:
+        """Plantillas de largo n del símbolo inicial, con los 'num' como marcadores."""
+        self._preparar(n)
+        return self.lista(self.cg.start, n)
+
+    def a_plantilla(self, plantilla: str) -> str:
+        """Texto de una plantilla con el nombre del terminal numérico en lugar del marcador."""
+        return plantilla.translate(self._a_nombre) if self._marcas else plantilla
+
+    def cadenas(self, plantilla: str) -> Iterator[str]:
+        """Todas las cadenas de una plantilla, con cada 'num' reemplazado por cada dígito."""
+        if not self._marcas:
+            yield plantilla
+            return
+        formato = plantilla.translate(self._a_campo)
+        campos = sum(plantilla.count(m) for m in self._marcas.values())
+        if campos == 0:
+            yield plantilla
+            return
+        for digitos in product(DIGITOS, repeat=campos):
+            yield formato.format(*digitos)
+
+
+def obtener_enumerador(grammar: Grammar) -> Enumerador:
+    """Retorna el enumerador de la gramática (memoizado en grammar.cache)."""
+    enumerador = grammar.cache.get("enumerador")
+    if enumerador is None:
+        enumerador = Enumerador(grammar)
+        grammar.cache["enumerador"] = enumerador
+    return enumerador  # type: ignore[return-value]
+
+
+def enumerar(
+    grammar: Grammar, max_len: int, plantillas: bool = False, min_len: int = 0
+) -> Iterator[str]:
+    """
+    Genera todas las cadenas válidas (o, con plantillas=True, todas las
+    plantillas con 'num' como comodín) de largo min_len..max_len, en orden
+    de longitud creciente. Las cadenas se producen de a una; solo se
+    mantienen en memoria las listas de plantillas memoizadas.
+    """
+    enumerador = obtener_enumerador(grammar)
+    for n in range(min_len, max_len + 1):
+        for plantilla in enumerador.plantillas(n):
+            if plantillas:
+                yield enumerador.a_plantilla(plantilla)
+            else:
+                yield from enumerador.cadenas(plantilla)
+
+
+def contar_enumeracion(grammar: Grammar, max_len: int, plantillas: bool = False) -> Dict[int, int]:
+    """
+    Cantidad de cadenas (o plantillas) por largo, de 0 a max_len, sin
+    enumerarlas: sale directo de las tablas de conteo. En una gramática
+    ambigua cuenta derivaciones, así que es una cota superior.
+    """
+    tablas = count_tables(grammar, max_len, number_weight=1 if plantillas else 10)
+    inicio = tablas.cg.start
+    return {n: tablas.count(inicio, n) for n in range(max_len + 1)}
+
@@ -0,0 +1,236 @@
+# estadisticas.py
+
+from collections import Counter
+from typing import Dict, Tuple
+import math
+
+from derivador import OPERADORES_ORDENADOS
+
+TIPOS = ("valida", "invalida", "extrema")
+TIPOS_MUTACION = ("eliminacion", "sustitucion", "insercion")
+PERCENTILES = (50, 95, 99)
+
+# Clave de tiempo en el reporte -> tipo de caso
+_CLAVES_TIEMPO = (("validas", "valida"), ("invalidas", "invalida"), ("extremas", "extrema"))
+
+
+def analizar_cadena(cadena: str) -> Tuple[Dict[str, int], int]:
+    """
+    Cuenta los operadores y estima la profundidad en un solo recorrido de la cadena.
+
+    La profundidad se estima a partir del anidamiento de paréntesis. No es
+    exacta, pero es una buena aproximación para expresiones aritméticas.
+    """
+    operadores = dict.fromkeys(OPERADORES_ORDENADOS, 0)
+    depth = 0
+    max_depth = 0
+    for ch in cadena:
+        if ch in operadores:
+            operadores[ch] += 1
+        elif ch == "(":
+            depth += 1
+            if depth > max_depth:
+                max_depth = depth
+        elif ch == ")":
+            if depth:
+                depth -= 1
+    return operadores, max_depth
+
+
+def percentil(histograma: Counter, total: int, p: int) -> int:
+    """Percentil p (método del rango más cercano) a partir de un histograma de enteros."""
+    if total == 0:
+        return 0
+    rango = max(1, math.ceil(p * total / 100))
+    acumulado = 0
+    for valor in sorted(histograma):
+        acumulado += histograma[valor]
+        if acumulado >= rango:
+            return valor
+    return max(histograma)
+
+
+def resumen_verificacion(verificados: int, mal_etiquetados: Dict[str, int]) -> Dict:
+    """Resumen de la verificación de etiquetas para el reporte general."""
+    total_mal = sum(mal_etiquetados.values())
+    return {
+        "verificados": verificados,
+        "mal_etiquetados": total_mal,
+        "tasa_mal_etiquetados": round(total_mal * 100.0 / verificados, 2) if verificados else 0.0,
+        "por_tipo": dict(mal_etiquetados),
+    }
+
+
+class AcumuladorEstadisticas:
+    """
+    Estadísticas del reporte general calculadas en línea, caso por caso.
+
+    Solo guarda contadores e histogramas (no los casos), y dos acumuladores
+    se pueden fusionar, así que sirve igual para generación en streaming,
+    en paralelo o por fragmentos.
+    """
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.conteo_por_tipo = {"valida": 0, "invalida": 0, "extrema": 0}
+        self.suma_longitudes = 0
+        self.profundidad_maxima = 0
+        self.operadores = dict.fromkeys(OPERADORES_ORDENADOS, 0)
+        self.mutaciones = dict.fromkeys(TIPOS_MUTACION, 0)
+        self.hist_longitud: Counter = Counter()
+        self.hist_profundidad: Counter = Counter()
+        self.tiempos_ms: Dict[str, float] = {}
+        # Verificación de etiquetas con el reconocedor (opcional)
+        self.verificados = 0
+        self.mal_etiquetados = {"valida": 0, "invalida": 0, "extrema": 0}
+
+    def agregar(self, caso: Dict) -> None:
+        """Suma un caso ya construido (usa sus conteos precalculados)."""
+        longitud = caso.get("longitud", len(caso.get("cadena", "")))
+        self._sumar(
+            caso.get("tipo", "valida"),
+            longitud,
+            caso.get("profundidad", 0),
+            caso.get("operadores", {}),
+            caso.get("mutaciones", {}),
+        )
+
+    def agregar_lote(self, lote) -> None:
+        """Suma todos los casos de un casos.LoteCasos leyendo directamente sus columnas."""
+        if not len(lote):
+            return
+        self.total += len(lote)
+        for codigo, n in Counter(lote.tipos).items():
+            self.conteo_por_tipo[TIPOS[codigo]] += n
+        self.suma_longitudes += sum(lote.longitudes)
+        self.profundidad_maxima = max(self.profundidad_maxima, max(lote.profundidades))
+        self.hist_longitud.update(lote.longitudes)
+        self.hist_profundidad.update(lote.profundidades)
+        for op, columna in lote.operadores.items():
+            self.operadores[op] = self.operadores.get(op, 0) + sum(columna)
+        for k, columna in lote.mutaciones.items():
+            self.mutaciones[k] = self.mutaciones.get(k, 0) + sum(columna)
+
+    def agregar_cadena(
+        self, cadena: str, tipo: str, mutaciones: Dict[str, int] | None = None
+    ) -> Tuple[Dict[str, int], int]:
+        """Analiza la cadena en un solo recorrido y la suma; retorna (operadores, profundidad)."""
+        operadores, profundidad = analizar_cadena(cadena)
+        self._sumar(tipo, len(cadena), profundidad, operadores, mutaciones or {})
+        return operadores, profundidad
+
+    def _sumar(
+        self,
+        tipo: str,
+        longitud: int,
+        profundidad: int,
+        operadores: Dict[str, int],
+        mutaciones: Dict[str, int],
+    ) -> None:
+        self.total += 1
+        if tipo in self.conteo_por_tipo:
+            self.conteo_por_tipo[tipo] += 1
+        self.suma_longitudes += longitud
+        if profundidad > self.profundidad_maxima:
+            self.profundidad_maxima = profundidad
+        self.hist_longitud[longitud] += 1
+        self.hist_profundidad[profundidad] += 1
+        for op in self.operadores:
+            self.operadores[op] += operadores.get(op, 0)
+        # Las claves de las mutaciones dependen del motor (ver mutador.py)
+        for k, n in mutaciones.items():
+            self.mutaciones[k] = self.mutaciones.get(k, 0) + n
+
+    def registrar_verificacion(self, tipo_original: str, bien_etiquetado: bool) -> None:
+        """Registra el resultado de verificar la etiqueta de un caso."""
+        self.verificados += 1
+        if not bien_etiquetado:
+            self.mal_etiquetados[tipo_original] = self.mal_etiquetados.get(tipo_original, 0) + 1
+
+    def agregar_tiempo(self, clave: str, ms: float) -> None:
+        """Suma tiempo (en ms) a una categoría: "validas", "invalidas" o "extremas"."""
+        self.tiempos_ms[clave] = self.tiempos_ms.get(clave, 0.0) + ms
+
+    def fusionar(self, otro: "AcumuladorEstadisticas") -> "AcumuladorEstadisticas":
+        """Agrega en este acumulador los datos de otro (p. ej. de otro proceso o fragmento)."""
+        self.total += otro.total
+        for tipo, n in otro.conteo_por_tipo.items():
+            self.conteo_por_tipo[tipo] = self.conteo_por_tipo.get(tipo, 0) + n
+        self.suma_longitudes += otro.suma_longitudes
+        self.profundidad_maxima = max(self.profundidad_maxima, otro.profundidad_maxima)
+        for op, n in otro.operadores.items():
+            self.operadores[op] = self.operadores.get(op, 0) + n
+        for k, n in otro.mutaciones.items():
+            self.mutaciones[k] = self.mutaciones.get(k, 0) + n
+        self.hist_longitud.update(otro.hist_longitud)
+        self.hist_profundidad.update(otro.hist_profundidad)
+        for clave, ms in otro.tiempos_ms.items():
+            self.agregar_tiempo(clave, ms)
+        self.verificados += otro.verificados
+        for tipo, n in otro.mal_etiquetados.items():
+            self.mal_etiquetados[tipo] = self.mal_etiquetados.get(tipo, 0) + n
+        return self
+
+    def reporte(self, tiempos_ms_por_tipo: Dict[str, float] | None = None) -> Dict:
+        """
+        Arma el reporte general. Si no se entregan tiempos, se usan los
+        acumulados con agregar_tiempo.
+        """
+        if tiempos_ms_por_tipo is None:
+            tiempos_ms_por_tipo = self.tiempos_ms
+        total_casos = self.total
+        if total_casos == 0:
+            return {
+                "total": 0,
+                "porcentajes": {"validas": 0.0, "invalidas": 0.0, "extremas": 0.0},
+                "longitud_promedio": 0.0,
+                "profundidad_maxima": 0,
+                "operadores": dict.fromkeys(OPERADORES_ORDENADOS, 0),
+                "mutaciones": dict.fromkeys(TIPOS_MUTACION, 0),
+                "tiempos_ms": {},
+                "histogramas": {"longitud": {}, "profundidad": {}},
+                "percentiles": {
+                    "longitud": {f"p{p}": 0 for p in PERCENTILES},
+                    "profundidad": {f"p{p}": 0 for p in PERCENTILES},
+                },
+            }
+
+        conteo_por_tipo = self.conteo_por_tipo
+        porcentajes = {
+            clave: round(conteo_por_tipo.get(tipo, 0) * 100.0 / total_casos, 2)
+            for clave, tipo in _CLAVES_TIEMPO
+        }
+
+        tiempos_detalle: Dict[str, Dict[str, float]] = {}
+        for clave_tiempo, tipo_caso in _CLAVES_TIEMPO:
+            total_ms = tiempos_ms_por_tipo.get(clave_tiempo, 0.0)
+            n = conteo_por_tipo.get(tipo_caso, 0)
+            tiempos_detalle[clave_tiempo] = {
+                "total_ms": round(total_ms, 3),
+                "promedio_ms": round(total_ms / n, 3) if n > 0 else 0.0,
+            }
+
+        reporte = {
+            "total": total_casos,
+            "porcentajes": porcentajes,
+            "longitud_promedio": round(self.suma_longitudes / total_casos, 2),
+            "profundidad_maxima": self.profundidad_maxima,
+            "operadores": dict(self.operadores),
+            "mutaciones": dict(self.mutaciones),
+            "tiempos_ms": tiempos_detalle,
+            "histogramas": {
+                "longitud": dict(sorted(self.hist_longitud.items())),
+                "profundidad": dict(sorted(self.hist_profundidad.items())),
+            },
+            "percentiles": {
+                "longitud": {
+                    f"p{p}": percentil(self.hist_longitud, total_casos, p) for p in PERCENTILES
+                },
+                "profundidad": {
+                    f"p{p}": percentil(self.hist_profundidad, total_casos, p) for p in PERCENTILES
+                },
+            },
+        }
+        if self.verificados:
+            reporte["verificacion"] = resumen_verificacion(self.verificados, self.mal_etiquetados)
+        return reporte
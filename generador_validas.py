@@ -1,32 +1,47 @@
 # generador_validas.py
  
-from typing import Dict, List, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+from pathlib import Path
+import hashlib
+import math
+import pickle
 import time
 import random
 import json
 
+from aleatorio import crear_aleatorio
+from casos import CasoVista, LoteCasos, a_json
 from cfg_parser import Grammar
-from derivador import derive_valid_string, derive_extreme_string, OPERADORES
+from cobertura import Cobertura
+from derivador import (
+    derive_valid_string,
+    derive_extreme_string,
+    derive_boltzmann_string,
+    sample_exact_string,
+    SubtreePool,
+    OPERADORES_ORDENADOS,
+)
+from enumerador import enumerar
+from estadisticas import AcumuladorEstadisticas, analizar_cadena, resumen_verificacion
+from instrumentacion import Instrumentacion
+from mutador import MotorMutaciones
+from reconocedor import obtener_reconocedor
+from salida import EscritorFragmentos, EscritorJSONL, guardar_atomico, verificar_fragmentos
+from vistos import Vistos
 
+# Símbolos que pueden introducir las mutaciones (en orden fijo, para reproducibilidad)
+_POOL_SUSTITUCION = OPERADORES_ORDENADOS + ("a", "b", "?")
+_POOL_INSERCION = OPERADORES_ORDENADOS + (")", "(", "?")
+_TIPOS_MUTACION = ("eliminacion", "sustitucion", "insercion")
 
-def _contar_operadores(cadena: str) -> Dict[str, int]:
-    return {op: cadena.count(op) for op in OPERADORES}
+# Casos por tarea en la generación paralela. Es fijo para que el resultado
+# dependa solo de la semilla maestra y no de la cantidad de procesos.
+TAMANO_BLOQUE = 1000
 
-
-def _estimar_profundidad(cadena: str) -> int:
-    """
-    Estima la profundidad del 'árbol' a partir del anidamiento de paréntesis.
-    No es exacto, pero es una buena aproximación para expresiones aritméticas.
-    """
-    depth = 0
-    max_depth = 0
-    for ch in cadena:
-        if ch == "(":
-            depth += 1
-            max_depth = max(max_depth, depth)
-        elif ch == ")":
-            depth = max(depth - 1, 0)
-    return max_depth
+# Con unicidad, sorteos permitidos por caso pedido antes de rendirse (el
+# lenguaje puede tener menos cadenas distintas que las pedidas)
+MAX_SORTEOS_POR_CASO = 50
 
 
 def _crear_caso(
@@ -34,12 +49,13 @@ def _crear_caso(
     tipo: str,
     mutaciones: Dict[str, int] | None = None,
 ) -> Dict:
+    operadores, profundidad = analizar_cadena(cadena)
     caso: Dict = {
         "cadena": cadena,
         "tipo": tipo,
         "longitud": len(cadena),
-        "profundidad": _estimar_profundidad(cadena),
-        "operadores": _contar_operadores(cadena),
+        "profundidad": profundidad,
+        "operadores": operadores,
     }
     if mutaciones is None:
         caso["mutaciones"] = {"eliminacion": 0, "sustitucion": 0, "insercion": 0}
@@ -48,88 +64,667 @@ def _crear_caso(
     return caso
 
 
+# Lista de dicts (por defecto) o lote columnar (con compacto=True)
+Casos = List[Dict] | LoteCasos
+
+
+def _nuevos_casos(compacto: bool) -> Casos:
+    return LoteCasos() if compacto else []
+
+
+def _agregar_caso(
+    casos: Casos, cadena: str, tipo: str, mutaciones: Dict[str, int] | None = None
+) -> None:
+    if isinstance(casos, LoteCasos):
+        casos.agregar(cadena, tipo, mutaciones)
+    else:
+        casos.append(_crear_caso(cadena, tipo, mutaciones))
+
+
+Sorteo = Tuple[str, Dict[str, int] | None]
+
+
+def _sortear_unicos(
+    sortear: Callable[[], Sorteo],
+    cantidad: int,
+    tipo: str,
+    vistos: Vistos | None,
+    inst: Instrumentacion | None = None,
+    sorteos: Dict[str, int] | None = None,
+    limite: int | None = None,
+) -> Iterator[Sorteo]:
+    """
+    Produce 'cantidad' sorteos (cadena, mutaciones). Con 'vistos', descarta
+    las cadenas ya vistas (contándolas como rechazos del tipo) y se detiene
+    tras 'limite' sorteos (por defecto, cantidad·MAX_SORTEOS_POR_CASO),
+    aunque falten casos (con 'inst', los que faltaron quedan en el contador
+    "casos_faltantes"). Si se entrega 'sorteos', ahí se cuentan por tipo
+    los sorteos hechos con 'vistos', para poder retomar con el límite que
+    quedaba.
+    """
+    if vistos is None:
+        for _ in range(cantidad):
+            yield sortear()
+        return
+    if limite is None:
+        limite = cantidad * MAX_SORTEOS_POR_CASO
+    elif limite <= 0:
+        return
+    entregados = 0
+    for _ in range(limite):
+        if entregados == cantidad:
+            return
+        if sorteos is not None:
+            sorteos[tipo] = sorteos.get(tipo, 0) + 1
+        cadena, mutaciones = sortear()
+        if vistos.agregar(cadena):
+            entregados += 1
+            yield cadena, mutaciones
+        else:
+            vistos.rechazar(tipo)
+    if inst is not None and entregados < cantidad:
+        inst.contar("casos_faltantes", cantidad - entregados)
+
+
+def _generar(
+    sortear: Callable[[], Sorteo],
+    cantidad: int,
+    tipo: str,
+    vistos: Vistos | None,
+    compacto: bool,
+    inst: Instrumentacion | None = None,
+) -> Casos:
+    casos = _nuevos_casos(compacto)
+    for cadena, mutaciones in _sortear_unicos(sortear, cantidad, tipo, vistos, inst):
+        _agregar_caso(casos, cadena, tipo, mutaciones)
+    return casos
+
+
 def generar_casos_validos(
-    grammar: Grammar, cantidad: int, max_depth: int, max_len: int
-) -> Tuple[List[Dict], float]:
-    casos: List[Dict] = []
+    grammar: Grammar,
+    cantidad: int,
+    max_depth: int,
+    max_len: int,
+    rng: random.Random | None = None,
+    compacto: bool = False,
+    vistos: Vistos | None = None,
+    inst: Instrumentacion | None = None,
+) -> Tuple[Casos, float]:
+    """
+    Genera 'cantidad' de casos válidos con derive_valid_string. max_depth es
+    la cantidad de expansiones aleatorias de cada derivación, no la altura
+    del árbol como en los casos extremos y la cobertura (ver derivador).
+    """
+    t0 = time.time()
+    casos = _generar(
+        lambda: (
+            derive_valid_string(grammar, max_depth, max_len, mode="random", rng=rng, inst=inst)[0],
+            None,
+        ),
+        cantidad, "valida", vistos, compacto, inst,
+    )
+    t1 = time.time()
+    tiempo_total_ms = (t1 - t0) * 1000.0
+    return casos, tiempo_total_ms
+
+
+def generar_casos_longitud_exacta(
+    grammar: Grammar,
+    cantidad: int,
+    longitud: int,
+    rng: random.Random | None = None,
+    compacto: bool = False,
+    vistos: Vistos | None = None,
+    inst: Instrumentacion | None = None,
+    pool: SubtreePool | None = None,
+) -> Tuple[Casos, float]:
+    """
+    Genera 'cantidad' de casos válidos de exactamente 'longitud' caracteres,
+    muestreados de manera uniforme (útil para medir latencia vs. tamaño de entrada).
+    Con 'pool' se reusan los subárboles chicos (ver derivador.SubtreePool).
+    """
+    t0 = time.time()
+    casos = _generar(
+        lambda: (sample_exact_string(grammar, longitud, rng=rng, pool=pool)[0], None),
+        cantidad, "valida", vistos, compacto, inst,
+    )
+    t1 = time.time()
+    tiempo_total_ms = (t1 - t0) * 1000.0
+    return casos, tiempo_total_ms
+
+
+def generar_casos_grandes(
+    grammar: Grammar,
+    cantidad: int,
+    longitud_objetivo: int,
+    tolerancia: float = 0.1,
+    rng: random.Random | None = None,
+    compacto: bool = False,
+    vistos: Vistos | None = None,
+    inst: Instrumentacion | None = None,
+) -> Tuple[Casos, float]:
+    """
+    Genera 'cantidad' de casos válidos muy grandes (p. ej. 100k–1M caracteres)
+    con muestreo de Boltzmann: cada cadena mide entre
+    longitud_objetivo·(1-tolerancia) y longitud_objetivo·(1+tolerancia).
+    """
     t0 = time.time()
-    for _ in range(cantidad):
-        cadena, _ = derive_valid_string(grammar, max_depth, max_len, mode="random")
-        casos.append(_crear_caso(cadena, "valida"))
+    casos = _generar(
+        lambda: (
+            derive_boltzmann_string(grammar, longitud_objetivo, tolerancia, rng=rng, inst=inst)[0],
+            None,
+        ),
+        cantidad, "valida", vistos, compacto, inst,
+    )
     t1 = time.time()
     tiempo_total_ms = (t1 - t0) * 1000.0
     return casos, tiempo_total_ms
 
 
-def _mutar_cadena(cadena: str, max_mutaciones: int = 2) -> Tuple[str, Dict[str, int]]:
+def generar_casos_cobertura(
+    grammar: Grammar,
+    cobertura: Cobertura,
+    max_casos: int,
+    max_depth: int,
+    max_len: int,
+    objetivo: float = 1.0,
+    rng: random.Random | None = None,
+    compacto: bool = False,
+    vistos: Vistos | None = None,
+    inst: Instrumentacion | None = None,
+) -> Tuple[Casos, float]:
+    """
+    Genera casos válidos guiados por cobertura (ver cobertura.Cobertura):
+    cada derivación favorece las producciones, pares de producciones y
+    contextos de operadores que aún no aparecen. Se detiene cuando la
+    fracción cubierta llega a 'objetivo' o al generar max_casos casos; el
+    resultado queda en cobertura.reporte(). Las derivaciones que exceden
+    max_len se descartan (y no cuentan para la cobertura).
+    """
+    rng = rng or random
+    casos = _nuevos_casos(compacto)
+    t0 = time.time()
+    sorteos = max_casos * MAX_SORTEOS_POR_CASO
+    while len(casos) < max_casos and sorteos > 0 and cobertura.fraccion() < objetivo:
+        sorteos -= 1
+        cadena, arbol = cobertura.derivar(max_depth, max_len, rng)
+        if len(cadena) > max_len:
+            if inst is not None:
+                inst.contar("cobertura_descartes_por_largo")
+            continue
+        if vistos is not None and not vistos.agregar(cadena):
+            vistos.rechazar("valida")
+            continue
+        cobertura.registrar(arbol)
+        _agregar_caso(casos, cadena, "valida")
+    t1 = time.time()
+    tiempo_total_ms = (t1 - t0) * 1000.0
+    return casos, tiempo_total_ms
+
+
+def _mutar_cadena(
+    cadena: str,
+    max_mutaciones: int = 2,
+    rng: random.Random | None = None,
+    inst: Instrumentacion | None = None,
+) -> Tuple[str, Dict[str, int]]:
     """
     Genera una versión inválida de la cadena mediante mutaciones sintácticas simples:
     - Eliminación de caracteres
     - Sustitución por operadores u otros símbolos
     - Inserción de operadores/paréntesis
+    Con 'inst' cuenta las bases vacías y las mutaciones que no cambiaron la cadena.
     """
+    rng = rng or random
     mut_counts = {"eliminacion": 0, "sustitucion": 0, "insercion": 0}
     if not cadena:
+        if inst is not None:
+            inst.contar("mutaciones_base_vacia")
         return cadena, mut_counts
 
-    num_mut = random.randint(1, max_mutaciones)
+    num_mut = rng.randint(1, max_mutaciones)
     s = cadena
     for _ in range(num_mut):
         if not s:
             break
-        mtype = random.choice(["eliminacion", "sustitucion", "insercion"])
-        idx = random.randrange(0, len(s))
+        mtype = rng.choice(_TIPOS_MUTACION)
+        idx = rng.randrange(0, len(s))
         if mtype == "eliminacion":
             s = s[:idx] + s[idx + 1 :]
             mut_counts["eliminacion"] += 1
         elif mtype == "sustitucion":
-            pool = list(OPERADORES) + ["a", "b", "?"]
-            new_char = random.choice(pool)
+            new_char = rng.choice(_POOL_SUSTITUCION)
             s = s[:idx] + new_char + s[idx + 1 :]
             mut_counts["sustitucion"] += 1
         elif mtype == "insercion":
-            pool = list(OPERADORES) + [")", "(", "?"]
-            new_char = random.choice(pool)
+            new_char = rng.choice(_POOL_INSERCION)
             s = s[:idx] + new_char + s[idx:]
             mut_counts["insercion"] += 1
+    if inst is not None:
+        inst.contar("mutaciones", num_mut)
+        if s == cadena:
+            inst.contar("mutaciones_sin_efecto")
     return s, mut_counts
 
 
 def generar_casos_invalidos_desde_validos(
-    casos_validos: List[Dict], cantidad: int, max_mutaciones: int = 2
-) -> Tuple[List[Dict], float]:
+    casos_validos: Casos,
+    cantidad: int,
+    max_mutaciones: int = 2,
+    rng: random.Random | None = None,
+    compacto: bool = False,
+    vistos: Vistos | None = None,
+    inst: Instrumentacion | None = None,
+    mutador: MotorMutaciones | None = None,
+) -> Tuple[Casos, float]:
     """
     Genera 'cantidad' de casos inválidos mutando cadenas válidas ya generadas.
+    Con 'mutador' (ver mutador.MotorMutaciones) las mutaciones son por
+    tokens y el resultado es siempre inválido.
     """
     if not casos_validos or cantidad <= 0:
-        return [], 0.0
+        return _nuevos_casos(compacto), 0.0
 
-    casos: List[Dict] = []
+    rng = rng or random
+    mutar = _mutar_cadena if mutador is None else mutador.mutar
     t0 = time.time()
-    for _ in range(cantidad):
-        base = random.choice(casos_validos)["cadena"]
-        mutada, mut_counts = _mutar_cadena(base, max_mutaciones)
-        casos.append(_crear_caso(mutada, "invalida", mut_counts))
+    casos = _generar(
+        lambda: mutar(rng.choice(casos_validos)["cadena"], max_mutaciones, rng, inst),
+        cantidad, "invalida", vistos, compacto, inst,
+    )
     t1 = time.time()
     tiempo_total_ms = (t1 - t0) * 1000.0
     return casos, tiempo_total_ms
 
 
 def generar_casos_extremos(
-    grammar: Grammar, cantidad: int, max_depth: int, max_len: int
-) -> Tuple[List[Dict], float]:
-    casos: List[Dict] = []
+    grammar: Grammar,
+    cantidad: int,
+    max_depth: int,
+    max_len: int,
+    rng: random.Random | None = None,
+    compacto: bool = False,
+    vistos: Vistos | None = None,
+    inst: Instrumentacion | None = None,
+    pool: SubtreePool | None = None,
+) -> Tuple[Casos, float]:
     t0 = time.time()
-    for _ in range(cantidad):
-        cadena, _ = derive_extreme_string(grammar, max_depth, max_len)
-        casos.append(_crear_caso(cadena, "extrema"))
+    casos = _generar(
+        lambda: (
+            derive_extreme_string(grammar, max_depth, max_len, rng=rng, inst=inst, pool=pool)[0],
+            None,
+        ),
+        cantidad, "extrema", vistos, compacto, inst,
+    )
     t1 = time.time()
     tiempo_total_ms = (t1 - t0) * 1000.0
     return casos, tiempo_total_ms
 
 
+def _reetiquetar(caso: Dict | CasoVista, en_lenguaje: bool) -> bool:
+    """
+    Corrige la etiqueta del caso según el reconocedor; retorna True si ya era correcta.
+    Válidos y extremos deben pertenecer al lenguaje; los inválidos, no.
+    """
+    if caso["tipo"] == "invalida":
+        if en_lenguaje:
+            caso["tipo"] = "valida"
+            return False
+        return True
+    if not en_lenguaje:
+        caso["tipo"] = "invalida"
+        return False
+    return True
+
+
+def verificar_etiquetas(
+    casos: Casos,
+    grammar: Grammar,
+    reetiquetar: bool = True,
+    acumulador: AcumuladorEstadisticas | None = None,
+    errores: Dict[int, str] | None = None,
+    inst: Instrumentacion | None = None,
+) -> Dict:
+    """
+    Verifica con el reconocedor de la gramática que cada caso esté bien
+    etiquetado (p. ej. una cadena truncada que quedó fuera del lenguaje, o una
+    mutación que sigue siendo válida). Con reetiquetar=True corrige el 'tipo'
+    de los casos mal etiquetados; si se entrega 'errores', se le agrega
+    índice -> tipo original de cada uno. Retorna el resumen para el reporte
+    general (con 'inst', el tiempo queda en la fase "verificacion").
+    """
+    if inst is not None:
+        t0 = time.perf_counter_ns()
+    en_lenguaje = obtener_reconocedor(grammar).reconoce_lote(caso["cadena"] for caso in casos)
+    mal_etiquetados = {"valida": 0, "invalida": 0, "extrema": 0}
+    for i, (caso, valida) in enumerate(zip(casos, en_lenguaje)):
+        tipo_original = caso["tipo"]
+        if reetiquetar:
+            correcto = _reetiquetar(caso, valida)
+        else:
+            correcto = valida == (tipo_original != "invalida")
+        if not correcto:
+            mal_etiquetados[tipo_original] = mal_etiquetados.get(tipo_original, 0) + 1
+            if errores is not None:
+                errores[i] = tipo_original
+        if acumulador is not None:
+            acumulador.registrar_verificacion(tipo_original, correcto)
+    if inst is not None:
+        inst.sumar_fase("verificacion", time.perf_counter_ns() - t0)
+    return resumen_verificacion(len(casos), mal_etiquetados)
+
+
+def _semilla_bloque(semilla: int, categoria: str, indice: int) -> int:
+    """Semilla del bloque 'indice' de una categoría, derivada de la semilla maestra."""
+    digest = hashlib.sha256(f"{semilla}:{categoria}:{indice}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def _datos_gramatica(grammar: Grammar) -> Tuple:
+    """Representación liviana y determinista de la gramática para enviarla a los procesos."""
+    return (
+        grammar.start_symbol,
+        tuple(sorted(grammar.nonterminals)),
+        tuple(sorted(grammar.terminals)),
+        tuple((nt, tuple(tuple(alt) for alt in alts)) for nt, alts in grammar.productions.items()),
+    )
+
+
+# Gramáticas ya reconstruidas en cada proceso trabajador, por clave
+_GRAMATICAS_PROCESO: Dict[str, Grammar] = {}
+
+
+def _gramatica_de_tarea(clave: str, datos: Tuple) -> Grammar:
+    grammar = _GRAMATICAS_PROCESO.get(clave)
+    if grammar is None:
+        start, nonterminals, terminals, productions = datos
+        grammar = Grammar(
+            start_symbol=start,
+            nonterminals=set(nonterminals),
+            terminals=set(terminals),
+            productions={nt: [list(alt) for alt in alts] for nt, alts in productions},
+        )
+        _GRAMATICAS_PROCESO[clave] = grammar
+    return grammar
+
+
+def _tarea_bloque(
+    tarea: Tuple,
+) -> Tuple[
+    Casos, float, AcumuladorEstadisticas, Dict[int, str], Instrumentacion | None, SubtreePool | None
+]:
+    """
+    Genera un bloque de casos de una categoría en un proceso trabajador.
+    Retorna (casos, tiempo_ms, estadísticas_del_bloque, errores, inst, pool),
+    donde errores asocia el índice de cada caso reetiquetado con su tipo
+    original, inst es la instrumentación del bloque y pool el pool de
+    subárboles que usó (None si no se pidieron). Con operadores de mutación,
+    las bases del bloque se mutan juntas con mutador.MotorMutaciones.
+    """
+    (
+        categoria, clave, datos, semilla, cantidad, max_depth, max_len, max_mutaciones, bases,
+        verificar, compacto, instrumentar, aleatorio, pool, operadores_mutacion,
+    ) = tarea
+    grammar = _gramatica_de_tarea(clave, datos)
+    rng = crear_aleatorio(semilla, aleatorio)
+    inst = Instrumentacion() if instrumentar else None
+    if categoria == "validas":
+        casos, tiempo_ms = generar_casos_validos(
+            grammar, cantidad, max_depth, max_len, rng=rng, compacto=compacto, inst=inst
+        )
+    elif categoria == "extremas":
+        casos, tiempo_ms = generar_casos_extremos(
+            grammar, cantidad, max_depth, max_len, rng=rng, compacto=compacto, inst=inst, pool=pool
+        )
+    else:
+        casos = _nuevos_casos(compacto)
+        t0 = time.time()
+        if operadores_mutacion is None:
+            for base in bases:
+                mutada, mut_counts = _mutar_cadena(base, max_mutaciones, rng, inst)
+                _agregar_caso(casos, mutada, "invalida", mut_counts)
+        else:
+            mutador = MotorMutaciones(grammar, operadores_mutacion)
+            for mutada, mut_counts in mutador.mutar_lote(bases, max_mutaciones, rng, inst):
+                _agregar_caso(casos, mutada, "invalida", mut_counts)
+        t1 = time.time()
+        tiempo_ms = (t1 - t0) * 1000.0
+
+    acumulador = AcumuladorEstadisticas()
+    errores: Dict[int, str] = {}
+    if verificar:
+        verificar_etiquetas(casos, grammar, acumulador=acumulador, errores=errores, inst=inst)
+    if isinstance(casos, LoteCasos):
+        acumulador.agregar_lote(casos)
+    else:
+        for caso in casos:
+            acumulador.agregar(caso)
+    acumulador.agregar_tiempo(categoria, tiempo_ms)
+    return casos, tiempo_ms, acumulador, errores, inst, pool
+
+
+def _bloques(cantidad: int) -> List[int]:
+    return [min(TAMANO_BLOQUE, cantidad - i) for i in range(0, cantidad, TAMANO_BLOQUE)]
+
+
+def _unir_bloques(bloques: List[Tuple], compacto: bool) -> Casos:
+    """Concatena, en orden, los casos de los resultados de _tarea_bloque."""
+    casos = _nuevos_casos(compacto)
+    for casos_bloque, *_ in bloques:
+        if compacto:
+            casos.extender(casos_bloque)
+        else:
+            casos.extend(casos_bloque)
+    return casos
+
+
+def _filtrar_bloque(
+    bloque: Tuple, categoria: str, tipo: str, vistos: Vistos, faltan: int, verificar: bool, compacto: bool
+) -> Tuple:
+    """
+    Deja en un resultado de _tarea_bloque solo los casos no vistos (a lo más
+    'faltan') y rehace sus estadísticas con los casos que quedaron.
+    """
+    casos_bloque, tiempo_ms, _, errores, inst, pool = bloque
+    casos = _nuevos_casos(compacto)
+    acumulador = AcumuladorEstadisticas()
+    for i, caso in enumerate(casos_bloque):
+        if len(casos) == faltan:
+            break
+        if not vistos.agregar(caso["cadena"]):
+            vistos.rechazar(tipo)
+            continue
+        if compacto:
+            casos.agregar_caso(caso)
+        else:
+            casos.append(caso)
+            acumulador.agregar(caso)
+        if verificar:
+            acumulador.registrar_verificacion(errores.get(i, caso["tipo"]), i not in errores)
+    if compacto:
+        acumulador.agregar_lote(casos)
+    acumulador.agregar_tiempo(categoria, tiempo_ms)
+    return casos, tiempo_ms, acumulador, {}, inst, pool
+
+
+def generar_casos_paralelo(
+    grammar: Grammar,
+    n_validas: int,
+    n_invalidas: int,
+    n_extremas: int,
+    max_depth: int,
+    max_len: int,
+    semilla: int = 0,
+    procesos: int | None = None,
+    max_mutaciones: int = 2,
+    ejecutor: Executor | None = None,
+    acumulador: AcumuladorEstadisticas | None = None,
+    verificar: bool = False,
+    compacto: bool = False,
+    vistos: Vistos | None = None,
+    bases_extra: List[str] | None = None,
+    inst: Instrumentacion | None = None,
+    aleatorio: str | None = None,
+    pool: SubtreePool | None = None,
+    operadores_mutacion: Sequence[str] | None = None,
+) -> Tuple[Casos, Dict[str, float]]:
+    """
+    Genera casos válidos, inválidos y extremos repartiendo el trabajo en un
+    pool de procesos.
+
+    El trabajo se divide en bloques de TAMANO_BLOQUE casos y cada bloque usa
+    su propio random.Random, sembrado a partir de (semilla, categoría, índice);
+    por eso el resultado es reproducible sin importar la cantidad de procesos.
+    Con procesos=1 todo se ejecuta en el proceso actual.
+
+    Retorna (casos, tiempos_ms) en el formato que espera calcular_estadisticas:
+    los casos vienen en el orden válidos, inválidos, extremos, y los tiempos
+    son la suma del tiempo de cómputo de los bloques de cada categoría. Si se
+    entrega 'acumulador', se le fusionan las estadísticas calculadas en cada
+    bloque, sin volver a recorrer los casos. Con verificar=True cada bloque
+    verifica y corrige sus etiquetas (ver verificar_etiquetas) y el resumen
+    queda en el acumulador; las bases de los inválidos son solo los casos
+    realmente válidos. Con compacto=True los bloques viajan y se retornan
+    como un único LoteCasos.
+
+    Con 'vistos' (ver vistos.crear_vistos) todos los casos son distintos: el
+    proceso principal filtra los bloques en orden (válidos, extremos e
+    inválidos) y, si faltan casos, genera bloques adicionales con los índices
+    siguientes, así que el resultado sigue siendo reproducible. Los sorteos
+    descartados quedan contados en vistos.rechazados. 'bases_extra' agrega
+    cadenas válidas generadas por otro medio a las bases de los inválidos.
+    Con 'inst', cada bloque se instrumenta por separado y se fusiona en él.
+    Con aleatorio="python" o "numpy", cada bloque usa un
+    aleatorio.AleatorioPorLotes (dígitos sorteados en bloque) en vez de
+    random.Random; el resultado sigue siendo reproducible, pero es otro.
+    Con 'pool', los bloques de extremos reusan subárboles (ver
+    derivador.SubtreePool), cada uno con una copia vacía del pool para que
+    el resultado no dependa de la cantidad de procesos; sus estadísticas
+    se suman en 'pool'. Con 'operadores_mutacion' (nombres del catálogo
+    mutador.OPERADORES) los inválidos se generan por lotes con
+    mutador.MotorMutaciones, que garantiza que sean inválidos.
+    """
+    datos = _datos_gramatica(grammar)
+    clave = hashlib.sha256(repr(datos).encode("utf-8")).hexdigest()
+
+    def tareas(categoria: str, cantidades: List[int], bases_por_bloque=None, primero: int = 0):
+        return [
+            (
+                categoria,
+                clave,
+                datos,
+                _semilla_bloque(semilla, categoria, primero + i),
+                n,
+                max_depth,
+                max_len,
+                max_mutaciones,
+                bases_por_bloque[i] if bases_por_bloque else None,
+                verificar,
+                compacto,
+                inst is not None,
+                aleatorio,
+                pool.empty_copy() if pool is not None and categoria == "extremas" else None,
+                tuple(operadores_mutacion) if operadores_mutacion is not None else None,
+            )
+            for i, n in enumerate(cantidades)
+        ]
+
+    def completar(
+        categoria: str, tipo: str, cantidad: int, bloques: List[Tuple], bases_de_bloques=None
+    ) -> List[Tuple]:
+        """Filtra los bloques contra 'vistos' y genera más hasta juntar 'cantidad' casos únicos."""
+        filtrados: List[Tuple] = []
+        aceptados = 0
+        sorteados = 0
+        limite = cantidad * MAX_SORTEOS_POR_CASO
+        siguiente = len(bloques)
+        while True:
+            for bloque in bloques:
+                filtrado = _filtrar_bloque(
+                    bloque, categoria, tipo, vistos, cantidad - aceptados, verificar, compacto
+                )
+                filtrados.append(filtrado)
+                aceptados += len(filtrado[0])
+                sorteados += len(bloque[0])
+            faltan = cantidad - aceptados
+            if faltan <= 0 or sorteados >= limite:
+                return filtrados
+            # Se pide lo que falta, agrandado según la tasa de aceptación observada
+            extra = min(math.ceil(1.1 * faltan * sorteados / max(aceptados, 1)), limite - sorteados)
+            cantidades = _bloques(extra)
+            bases_por_bloque = None
+            if bases_de_bloques is not None:
+                bases_por_bloque = bases_de_bloques(cantidades, siguiente)
+            bloques = list(
+                ejecutar(_tarea_bloque, tareas(categoria, cantidades, bases_por_bloque, siguiente))
+            )
+            siguiente += len(cantidades)
+
+    propio = ejecutor is None and procesos != 1
+    if propio:
+        ejecutor = ProcessPoolExecutor(max_workers=procesos)
+    ejecutar = map if ejecutor is None else ejecutor.map
+    try:
+        tareas_validas = tareas("validas", _bloques(n_validas))
+        tareas_extremas = tareas("extremas", _bloques(n_extremas))
+        resultados = list(ejecutar(_tarea_bloque, tareas_validas + tareas_extremas))
+        bloques_validos = resultados[: len(tareas_validas)]
+        bloques_extremos = resultados[len(tareas_validas) :]
+        if vistos is not None:
+            bloques_validos = completar("validas", "valida", n_validas, bloques_validos)
+            bloques_extremos = completar("extremas", "extrema", n_extremas, bloques_extremos)
+        casos_validos = _unir_bloques(bloques_validos, compacto)
+        casos_extremos = _unir_bloques(bloques_extremos, compacto)
+
+        # Las bases de cada bloque de inválidos se eligen aquí, con su propia semilla
+        bases = [caso["cadena"] for caso in casos_validos if caso["tipo"] == "valida"]
+        if bases_extra:
+            bases.extend(bases_extra)
+
+        def bases_de_bloques(cantidades: List[int], primero: int = 0) -> List[List[str]]:
+            bases_por_bloque = []
+            for i, n in enumerate(cantidades, primero):
+                rng_bases = random.Random(_semilla_bloque(semilla, "bases", i))
+                bases_por_bloque.append([bases[rng_bases.randrange(len(bases))] for _ in range(n)])
+            return bases_por_bloque
+
+        bloques_invalidos = []
+        if bases:
+            bases_por_bloque = bases_de_bloques(_bloques(n_invalidas))
+            tareas_invalidas = tareas("invalidas", [len(b) for b in bases_por_bloque], bases_por_bloque)
+            bloques_invalidos = list(ejecutar(_tarea_bloque, tareas_invalidas))
+            if vistos is not None:
+                bloques_invalidos = completar(
+                    "invalidas", "invalida", n_invalidas, bloques_invalidos, bases_de_bloques
+                )
+        casos_invalidos = _unir_bloques(bloques_invalidos, compacto)
+    finally:
+        if propio and ejecutor is not None:
+            ejecutor.shutdown()
+
+    todos = bloques_validos + bloques_invalidos + bloques_extremos
+    for _, _, estadisticas_bloque, _, inst_bloque, pool_bloque in todos:
+        if acumulador is not None:
+            acumulador.fusionar(estadisticas_bloque)
+        if inst is not None and inst_bloque is not None:
+            inst.fusionar(inst_bloque)
+        if pool is not None and pool_bloque is not None:
+            pool.merge_stats(pool_bloque)
+
+    tiempos_ms = {
+        "validas": sum(bloque[1] for bloque in bloques_validos),
+        "invalidas": sum(bloque[1] for bloque in bloques_invalidos),
+        "extremas": sum(bloque[1] for bloque in bloques_extremos),
+    }
+    if compacto:
+        casos_validos.extender(casos_invalidos)
+        casos_validos.extender(casos_extremos)
+        return casos_validos, tiempos_ms
+    return casos_validos + casos_invalidos + casos_extremos, tiempos_ms
+
+
 def calcular_estadisticas(
-    casos: List[Dict], tiempos_ms_por_tipo: Dict[str, float]
+    casos: Casos, tiempos_ms_por_tipo: Dict[str, float]
 ) -> Dict:
     """
     Calcula las métricas pedidas en el enunciado:
@@ -140,80 +735,350 @@ def calcular_estadisticas(
     - Conteo de operadores
     - Niveles de mutación por tipo
     - Tiempos de ejecución por categoría
+    - Histogramas y percentiles (p50/p95/p99) de longitud y profundidad
     """
-    total_casos = len(casos)
-    if total_casos == 0:
-        return {
-            "total": 0,
-            "porcentajes": {"validas": 0.0, "invalidas": 0.0, "extremas": 0.0},
-            "longitud_promedio": 0.0,
-            "profundidad_maxima": 0,
-            "operadores": {op: 0 for op in OPERADORES},
-            "mutaciones": {"eliminacion": 0, "sustitucion": 0, "insercion": 0},
-            "tiempos_ms": {},
-        }
+    acumulador = AcumuladorEstadisticas()
+    if isinstance(casos, LoteCasos):
+        acumulador.agregar_lote(casos)
+    else:
+        for caso in casos:
+            acumulador.agregar(caso)
+    return acumulador.reporte(tiempos_ms_por_tipo)
+
 
-    conteo_por_tipo = {"valida": 0, "invalida": 0, "extrema": 0}
-    longitudes: List[int] = []
-    profundidades: List[int] = []
-    operadores_totales = {op: 0 for op in OPERADORES}
-    mut_totales = {"eliminacion": 0, "sustitucion": 0, "insercion": 0}
-
-    for caso in casos:
-        tipo = caso.get("tipo", "valida")
-        if tipo in conteo_por_tipo:
-            conteo_por_tipo[tipo] += 1
-        longitudes.append(caso.get("longitud", len(caso.get("cadena", ""))))
-        profundidades.append(caso.get("profundidad", 0))
-        ops = caso.get("operadores", {})
-        for op in OPERADORES:
-            operadores_totales[op] += ops.get(op, 0)
-        muts = caso.get("mutaciones", {})
-        for k in mut_totales:
-            mut_totales[k] += muts.get(k, 0)
-
-    porcentajes = {
-        "validas": round(conteo_por_tipo["valida"] * 100.0 / total_casos, 2),
-        "invalidas": round(conteo_por_tipo["invalida"] * 100.0 / total_casos, 2),
-        "extremas": round(conteo_por_tipo["extrema"] * 100.0 / total_casos, 2),
+def iterar_casos(
+    grammar: Grammar,
+    n_validas: int,
+    n_invalidas: int,
+    n_extremas: int,
+    max_depth: int,
+    max_len: int,
+    max_mutaciones: int = 2,
+    rng: random.Random | None = None,
+    tiempos_ms: Dict[str, float] | None = None,
+    tam_reservorio: int = 1000,
+    vistos: Vistos | None = None,
+    inst: Instrumentacion | None = None,
+    pool: SubtreePool | None = None,
+    mutador: MotorMutaciones | None = None,
+    estado: Dict | None = None,
+) -> Iterator[Dict]:
+    """
+    Genera los casos uno a uno (válidos, inválidos y extremos, en ese orden)
+    sin mantenerlos en memoria.
+
+    Las bases de los inválidos salen de un reservorio de tamaño fijo con una
+    muestra uniforme de los válidos generados. Si se entrega 'tiempos_ms', se
+    le suma el tiempo de generación de cada categoría. Con 'vistos' se
+    descartan las cadenas repetidas; en memoria queda solo su resumen. Con
+    'inst' se instrumentan las derivaciones y mutaciones. Con 'pool' los
+    extremos reusan subárboles (ver derivador.SubtreePool), y con 'mutador'
+    los inválidos se mutan por tokens (ver mutador.MotorMutaciones).
+
+    'estado' (un dict, vacío al empezar) se actualiza antes de entregar cada
+    caso con los casos producidos por categoría, los sorteos hechos y el
+    reservorio. Junto con el estado de rng, vistos, inst y pool tomado en
+    ese momento, alcanza para retomar la generación en otra corrida: con
+    una copia de ese dict se producen exactamente los casos que faltaban
+    (ver generar_en_fragmentos).
+    """
+    rng = rng or random
+    if tiempos_ms is None:
+        tiempos_ms = {}
+    for clave in ("validas", "invalidas", "extremas"):
+        tiempos_ms.setdefault(clave, 0.0)
+    if estado is None:
+        estado = {}
+    for clave in ("validas", "invalidas", "extremas"):
+        estado.setdefault(clave, 0)
+    hechos: Dict[str, int] = estado.setdefault("sorteos", {})
+    reservorio: List[str] = estado.setdefault("reservorio", [])
+
+    def limite(cantidad: int, tipo: str) -> int:
+        return cantidad * MAX_SORTEOS_POR_CASO - hechos.get(tipo, 0)
+
+    mutar = _mutar_cadena if mutador is None else mutador.mutar
+    sorteos = _sortear_unicos(
+        lambda: (
+            derive_valid_string(grammar, max_depth, max_len, mode="random", rng=rng, inst=inst)[0],
+            None,
+        ),
+        n_validas - estado["validas"], "valida", vistos, inst, hechos, limite(n_validas, "valida"),
+    )
+    t0 = time.perf_counter()
+    for i, (cadena, _) in enumerate(sorteos, estado["validas"]):
+        caso = _crear_caso(cadena, "valida")
+        if len(reservorio) < tam_reservorio:
+            reservorio.append(cadena)
+        else:
+            j = rng.randrange(i + 1)
+            if j < tam_reservorio:
+                reservorio[j] = cadena
+        estado["validas"] = i + 1
+        tiempos_ms["validas"] += (time.perf_counter() - t0) * 1000.0
+        yield caso
+        t0 = time.perf_counter()
+
+    if reservorio:
+        sorteos = _sortear_unicos(
+            lambda: mutar(rng.choice(reservorio), max_mutaciones, rng, inst),
+            n_invalidas - estado["invalidas"], "invalida", vistos, inst,
+            hechos, limite(n_invalidas, "invalida"),
+        )
+        t0 = time.perf_counter()
+        for mutada, mut_counts in sorteos:
+            caso = _crear_caso(mutada, "invalida", mut_counts)
+            estado["invalidas"] += 1
+            tiempos_ms["invalidas"] += (time.perf_counter() - t0) * 1000.0
+            yield caso
+            t0 = time.perf_counter()
+
+    sorteos = _sortear_unicos(
+        lambda: (
+            derive_extreme_string(grammar, max_depth, max_len, rng=rng, inst=inst, pool=pool)[0],
+            None,
+        ),
+        n_extremas - estado["extremas"], "extrema", vistos, inst, hechos, limite(n_extremas, "extrema"),
+    )
+    t0 = time.perf_counter()
+    for cadena, _ in sorteos:
+        caso = _crear_caso(cadena, "extrema")
+        estado["extremas"] += 1
+        tiempos_ms["extremas"] += (time.perf_counter() - t0) * 1000.0
+        yield caso
+        t0 = time.perf_counter()
+
+
+def generar_en_streaming(
+    grammar: Grammar,
+    n_validas: int,
+    n_invalidas: int,
+    n_extremas: int,
+    max_depth: int,
+    max_len: int,
+    nombre: str = "resultados.jsonl",
+    compresion: str | None = None,
+    max_mutaciones: int = 2,
+    rng: random.Random | None = None,
+    verificar: bool = False,
+    vistos: Vistos | None = None,
+    inst: Instrumentacion | None = None,
+    pool: SubtreePool | None = None,
+    mutador: MotorMutaciones | None = None,
+) -> Dict:
+    """
+    Genera los casos y los escribe en 'nombre' en formato JSONL a medida que
+    se producen; el reporte general se calcula de forma incremental y se
+    guarda en un archivo lateral (ver salida.ruta_reporte). El uso de memoria
+    no crece con la cantidad de casos (con 'vistos', solo en 16 a 32 bytes
+    por caso, o nada con un vistos.FiltroBloom). Con verificar=True cada
+    etiqueta se verifica y corrige con el reconocedor. Retorna el reporte,
+    con la sección 'duplicados' si se pidió unicidad y las secciones
+    'instrumentacion' y 'pool_subarboles' si se entregaron 'inst' y 'pool'.
+    """
+    tiempos_ms: Dict[str, float] = {}
+    acumulador = AcumuladorEstadisticas()
+    reconocedor = obtener_reconocedor(grammar) if verificar else None
+    with EscritorJSONL(nombre, compresion) as escritor:
+        for caso in iterar_casos(
+            grammar, n_validas, n_invalidas, n_extremas, max_depth, max_len,
+            max_mutaciones=max_mutaciones, rng=rng, tiempos_ms=tiempos_ms, vistos=vistos, inst=inst,
+            pool=pool, mutador=mutador,
+        ):
+            if reconocedor is not None:
+                tipo_original = caso["tipo"]
+                if inst is not None:
+                    t0 = time.perf_counter_ns()
+                en_lenguaje = reconocedor.reconoce_lote((caso["cadena"],))[0]
+                if inst is not None:
+                    inst.sumar_fase("verificacion", time.perf_counter_ns() - t0)
+                acumulador.registrar_verificacion(tipo_original, _reetiquetar(caso, en_lenguaje))
+            escritor.escribir(caso)
+            acumulador.agregar(caso)
+        reporte = acumulador.reporte(tiempos_ms)
+        if vistos is not None:
+            reporte["duplicados"] = vistos.reporte()
+        if inst is not None:
+            reporte["instrumentacion"] = inst.reporte()
+        if pool is not None:
+            reporte["pool_subarboles"] = pool.report()
+        escritor.cerrar(reporte)
+    return reporte
+
+
+# Punto de control de una generación en fragmentos (dentro de su directorio)
+PUNTO_CONTROL = "punto_control.pkl"
+
+
+def _restaurar(objeto: object, guardado: object) -> None:
+    """Copia en 'objeto' el estado de su versión guardada (sin perder un gancho de instrumentación)."""
+    gancho = getattr(objeto, "gancho", None)
+    objeto.__dict__.update(guardado.__dict__)
+    if isinstance(objeto, Instrumentacion):
+        objeto.gancho = gancho
+
+
+def generar_en_fragmentos(
+    grammar: Grammar,
+    n_validas: int,
+    n_invalidas: int,
+    n_extremas: int,
+    max_depth: int,
+    max_len: int,
+    directorio: str,
+    max_casos: int | None = None,
+    max_bytes: int | None = None,
+    compresion: str | None = None,
+    max_mutaciones: int = 2,
+    semilla: int = 0,
+    aleatorio: str | None = None,
+    verificar: bool = False,
+    vistos: Vistos | None = None,
+    inst: Instrumentacion | None = None,
+    pool: SubtreePool | None = None,
+    mutador: MotorMutaciones | None = None,
+) -> Dict:
+    """
+    Como generar_en_streaming, pero escribe los casos en fragmentos JSONL
+    dentro de 'directorio', rotando cada max_casos casos o max_bytes bytes
+    (ver salida.EscritorFragmentos), con un manifiesto que lista cada
+    fragmento con sus casos, bytes y sha256, y el reporte general al final.
+
+    Al cerrar cada fragmento se guarda un punto de control (PUNTO_CONTROL:
+    estado del generador aleatorio, casos producidos por categoría,
+    acumulador de estadísticas, vistos, inst y pool). Si el directorio ya
+    tiene uno, la corrida se retoma desde ahí: los fragmentos cerrados se
+    comprueban contra su sha256 y no se regeneran, y el resto sale igual
+    que en una corrida sin interrupciones. Los parámetros tienen que ser los
+    de la corrida original (si no, ValueError); si ya había terminado, se
+    retorna su reporte. El punto de control es un pickle: solo se deben
+    retomar directorios propios.
+    """
+    ruta_control = Path(directorio) / PUNTO_CONTROL
+    parametros = {
+        "gramatica": hashlib.sha256(repr(_datos_gramatica(grammar)).encode("utf-8")).hexdigest(),
+        "cantidades": (n_validas, n_invalidas, n_extremas),
+        "max_depth": max_depth,
+        "max_len": max_len,
+        "max_mutaciones": max_mutaciones,
+        "semilla": semilla,
+        "aleatorio": aleatorio,
+        "verificar": verificar,
+        "max_casos": max_casos,
+        "max_bytes": max_bytes,
+        "compresion": compresion,
+        "vistos": type(vistos).__name__ if vistos is not None else None,
+        "instrumentacion": inst is not None,
+        "pool": pool is not None,
+        "mutador": mutador.nombres if mutador is not None else None,
     }
+    rng = crear_aleatorio(semilla, aleatorio)
+    tiempos_ms: Dict[str, float] = {}
+    estado: Dict = {}
+    acumulador = AcumuladorEstadisticas()
+    fragmentos: List[Dict] = []
+    if ruta_control.exists():
+        with open(ruta_control, "rb") as f:
+            control = pickle.load(f)
+        if control["parametros"] != parametros:
+            raise ValueError(
+                f"El directorio {directorio} tiene una corrida con otros parámetros; "
+                "para empezar otra, use un directorio nuevo."
+            )
+        if control["completo"]:
+            return control["reporte"]
+        fragmentos = control["fragmentos"]
+        verificar_fragmentos(directorio, fragmentos)
+        rng.setstate(control["rng"])
+        tiempos_ms = control["tiempos_ms"]
+        estado = control["estado"]
+        acumulador = control["acumulador"]
+        for objeto, guardado in ((vistos, control["vistos"]), (inst, control["inst"]), (pool, control["pool"])):
+            if objeto is not None:
+                _restaurar(objeto, guardado)
 
-    longitud_promedio = round(sum(longitudes) / len(longitudes), 2) if longitudes else 0.0
-    profundidad_maxima = max(profundidades) if profundidades else 0
-
-    tiempos_detalle: Dict[str, Dict[str, float]] = {}
-    # tiempos_ms_por_tipo usa claves "validas", "invalidas", "extremas"
-    for clave_tiempo, tipo_caso in [
-        ("validas", "valida"),
-        ("invalidas", "invalida"),
-        ("extremas", "extrema"),
-    ]:
-        total_ms = tiempos_ms_por_tipo.get(clave_tiempo, 0.0)
-        n = conteo_por_tipo[tipo_caso]
-        tiempos_detalle[clave_tiempo] = {
-            "total_ms": round(total_ms, 3),
-            "promedio_ms": round(total_ms / n, 3) if n > 0 else 0.0,
+    escritor = EscritorFragmentos(directorio, max_casos, max_bytes, compresion, fragmentos=fragmentos)
+
+    def guardar_control(completo: bool = False, reporte: Dict | None = None) -> None:
+        control = {
+            "parametros": parametros,
+            "fragmentos": escritor.fragmentos,
+            "rng": rng.getstate(),
+            "tiempos_ms": tiempos_ms,
+            "estado": estado,
+            "acumulador": acumulador,
+            "vistos": vistos,
+            "inst": inst,
+            "pool": pool,
+            "completo": completo,
+            "reporte": reporte,
         }
+        guardar_atomico(ruta_control, pickle.dumps(control, protocol=pickle.HIGHEST_PROTOCOL))
+        escritor.guardar_manifiesto({"completo": completo, "reporte_general": reporte})
 
-    reporte = {
-        "total": total_casos,
-        "porcentajes": porcentajes,
-        "longitud_promedio": longitud_promedio,
-        "profundidad_maxima": profundidad_maxima,
-        "operadores": operadores_totales,
-        "mutaciones": mut_totales,
-        "tiempos_ms": tiempos_detalle,
-    }
+    reconocedor = obtener_reconocedor(grammar) if verificar else None
+    for caso in iterar_casos(
+        grammar, n_validas, n_invalidas, n_extremas, max_depth, max_len,
+        max_mutaciones=max_mutaciones, rng=rng, tiempos_ms=tiempos_ms, vistos=vistos, inst=inst,
+        pool=pool, mutador=mutador, estado=estado,
+    ):
+        if reconocedor is not None:
+            tipo_original = caso["tipo"]
+            if inst is not None:
+                t0 = time.perf_counter_ns()
+            en_lenguaje = reconocedor.reconoce_lote((caso["cadena"],))[0]
+            if inst is not None:
+                inst.sumar_fase("verificacion", time.perf_counter_ns() - t0)
+            acumulador.registrar_verificacion(tipo_original, _reetiquetar(caso, en_lenguaje))
+        cerrado = escritor.escribir(caso)
+        acumulador.agregar(caso)
+        if cerrado:
+            guardar_control()
+    escritor.cerrar_fragmento()
+    reporte = acumulador.reporte(tiempos_ms)
+    if vistos is not None:
+        reporte["duplicados"] = vistos.reporte()
+    if inst is not None:
+        reporte["instrumentacion"] = inst.reporte()
+    if pool is not None:
+        reporte["pool_subarboles"] = pool.report()
+    guardar_control(completo=True, reporte=reporte)
+    return reporte
+
+
+def enumerar_en_streaming(
+    grammar: Grammar,
+    max_len: int,
+    nombre: str = "enumeracion.jsonl",
+    plantillas: bool = False,
+    min_len: int = 0,
+    compresion: str | None = None,
+) -> Dict:
+    """
+    Escribe en formato JSONL, como casos válidos, todas las cadenas (o
+    plantillas) de largo min_len..max_len en orden de longitud creciente
+    (ver enumerador.enumerar). Usa memoria constante en la salida y guarda
+    el reporte en el archivo lateral. Retorna el reporte.
+    """
+    acumulador = AcumuladorEstadisticas()
+    with EscritorJSONL(nombre, compresion) as escritor:
+        for cadena in enumerar(grammar, max_len, plantillas, min_len):
+            caso = _crear_caso(cadena, "valida")
+            escritor.escribir(caso)
+            acumulador.agregar(caso)
+        reporte = acumulador.reporte()
+        escritor.cerrar(reporte)
     return reporte
 
 
-def guardar_json(casos: List[Dict], reporte: Dict, nombre: str = "resultados.json") -> None:
+def guardar_json(casos: Casos, reporte: Dict, nombre: str = "resultados.json") -> None:
     """
     Exporta todos los casos y el reporte general en un archivo JSON.
+    Acepta también un LoteCasos (ver casos.a_json).
     """
     data = {
         "casos": casos,
         "reporte_general": reporte,
     }
     with open(nombre, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+        json.dump(data, f, ensure_ascii=False, indent=4, default=a_json)
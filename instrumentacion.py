@@ -0,0 +1,90 @@
+# instrumentacion.py
+
+from typing import Callable, Dict
+import time
+
+# Gancho de perfilado: gancho(evento, nombre, valor), con evento "contador"
+# (valor = cantidad sumada) o "fase" (valor = duración en ns)
+Gancho = Callable[[str, str, int], None]
+
+
+class _Fase:
+    """Administrador de contexto que mide una fase con perf_counter_ns."""
+
+    __slots__ = ("inst", "nombre", "t0")
+
+    def __init__(self, inst: "Instrumentacion", nombre: str) -> None:
+        self.inst = inst
+        self.nombre = nombre
+        self.t0 = 0
+
+    def __enter__(self) -> "_Fase":
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *excepcion) -> None:
+        self.inst.sumar_fase(self.nombre, time.perf_counter_ns() - self.t0)
+
+
+class Instrumentacion:
+    """
+    Contadores y tiempos por fase de las rutas críticas de la generación
+    (expansiones, cortes anticipados, iteraciones del cierre, truncamientos,
+    reintentos, etc.).
+
+    Las funciones instrumentadas reciben inst=None por defecto y solo tocan
+    la instancia cuando la hay, así que sin instrumentación el costo es una
+    comparación por punto de medición. Dos instancias se pueden fusionar
+    (p. ej. las de los bloques de la generación paralela). El 'gancho', si
+    se entrega, recibe cada evento en el momento (para herramientas de
+    perfilado externas); no viaja a otros procesos, donde los eventos de
+    cada bloque le llegan ya sumados al fusionar.
+    """
+
+    def __init__(self, gancho: Gancho | None = None) -> None:
+        self.contadores: Dict[str, int] = {}
+        self.tiempos_ns: Dict[str, int] = {}
+        self.llamadas: Dict[str, int] = {}
+        self.gancho = gancho
+
+    def contar(self, nombre: str, cantidad: int = 1) -> None:
+        self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+        if self.gancho is not None:
+            self.gancho("contador", nombre, cantidad)
+
+    def sumar_fase(self, fase: str, ns: int, llamadas: int = 1) -> None:
+        """Suma 'ns' nanosegundos (medidos con time.perf_counter_ns) a una fase."""
+        self.tiempos_ns[fase] = self.tiempos_ns.get(fase, 0) + ns
+        self.llamadas[fase] = self.llamadas.get(fase, 0) + llamadas
+        if self.gancho is not None:
+            self.gancho("fase", fase, ns)
+
+    def fase(self, nombre: str) -> _Fase:
+        """Mide el bloque 'with inst.fase(nombre): ...' y lo suma a esa fase."""
+        return _Fase(self, nombre)
+
+    def fusionar(self, otra: "Instrumentacion") -> "Instrumentacion":
+        """Agrega en esta instancia los contadores y tiempos de otra."""
+        for nombre, cantidad in otra.contadores.items():
+            self.contar(nombre, cantidad)
+        for fase, ns in otra.tiempos_ns.items():
+            self.sumar_fase(fase, ns, otra.llamadas.get(fase, 0))
+        return self
+
+    def __getstate__(self) -> Dict:
+        # El gancho suele ser una función local o un objeto no serializable
+        estado = dict(self.__dict__)
+        estado["gancho"] = None
+        return estado
+
+    def reporte(self) -> Dict:
+        """Resumen para el reporte general (sección 'instrumentacion')."""
+        fases = {
+            fase: {
+                "llamadas": self.llamadas.get(fase, 0),
+                "total_ms": round(ns / 1e6, 3),
+                "promedio_us": round(ns / 1e3 / max(self.llamadas.get(fase, 0), 1), 3),
+            }
+            for fase, ns in sorted(self.tiempos_ns.items())
+        }
+        return {"contadores": dict(sorted(self.contadores.items())), "fases": fases}
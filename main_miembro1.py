@@ -1,16 +1,68 @@
 # main_miembro1.py
 
-import os
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, List
+import argparse
+import json
+import os
+import random
+import sys
+import time
 
-from cfg_parser import load_grammar
+from aleatorio import MOTORES
+from almacen import EXTENSION_ALMACEN, guardar_almacen
+from cache_gramatica import cargar_gramatica, guardar_gramatica
+from casos import LoteCasos
+from cfg_parser import Grammar
+from cobertura import Cobertura
+from derivador import SubtreePool
+from estadisticas import AcumuladorEstadisticas
+from instrumentacion import Instrumentacion
+from mutador import MUTADORES, OPERADORES, MotorMutaciones
 from generador_validas import (
+    generar_casos_cobertura,
+    generar_en_fragmentos,
+    generar_casos_paralelo,
     generar_casos_validos,
     generar_casos_invalidos_desde_validos,
     generar_casos_extremos,
     calcular_estadisticas,
     guardar_json,
+    verificar_etiquetas,
 )
+from salida import MANIFIESTO, EscritorJSONL, compresion_por_nombre
+from vistos import crear_vistos
+
+# Gramática por defecto: 'gramatica.txt' en la MISMA carpeta que este archivo
+RUTA_GRAMATICA = Path(__file__).resolve().parent / "gramatica.txt"
+
+# Parámetros de un trabajo y sus valores por defecto (los mismos del modo interactivo)
+TRABAJO_POR_DEFECTO: Dict = {
+    "gramatica": str(RUTA_GRAMATICA),
+    "validas": 20,
+    "invalidas": 20,
+    "extremas": 10,
+    "profundidad": 6,
+    "longitud": 40,
+    "semilla": 0,
+    "salida": "resultados.json",
+    "cobertura": 0,
+    "unicos": False,
+    "verificar": True,
+    "compacto": False,
+    "instrumentar": False,
+    # Motor de aleatorio.AleatorioPorLotes ("python" o "numpy"); None = random.Random
+    "aleatorio": None,
+    # Reusar subárboles chicos en los extremos (derivador.SubtreePool)
+    "reusar_subarboles": False,
+    # Mutaciones de los inválidos: "caracteres" o "tokens" (mutador.MotorMutaciones)
+    "mutador": "caracteres",
+    # Escribir en fragmentos retomables dentro del directorio 'salida', rotando
+    # cada tantos casos o bytes (0 = sin fragmentos; ver generar_en_fragmentos)
+    "fragmento_casos": 0,
+    "fragmento_bytes": 0,
+}
 
 
 def _pedir_entero(mensaje: str, por_defecto: int) -> int:
@@ -33,15 +85,14 @@ def _pedir_entero(mensaje: str, por_defecto: int) -> int:
         return por_defecto
 
 
-def main() -> None:
+def _main_interactivo() -> None:
     print("=== Proyecto 2 INFO1148: Generador Automático de Casos de Prueba ===\n")
 
-    # Ruta absoluta a 'gramatica.txt' en la MISMA carpeta que este archivo
-    script_dir = Path(__file__).resolve().parent
-    ruta_gramatica = script_dir / "gramatica.txt"
+    ruta_gramatica = RUTA_GRAMATICA
 
     print(f"Cargando gramática desde '{ruta_gramatica}'...\n")
-    grammar = load_grammar(str(ruta_gramatica))
+    # Con cache en disco: los artefactos precalculados se reutilizan entre corridas
+    grammar = cargar_gramatica(str(ruta_gramatica))
 
     print(f"Símbolo inicial : {grammar.start_symbol}")
     print(f"No terminales   : {', '.join(sorted(grammar.nonterminals))}")
@@ -53,6 +104,9 @@ def main() -> None:
 
     max_depth = _pedir_entero("Profundidad máxima de derivación", 6)
     max_len = _pedir_entero("Longitud máxima de la cadena", 40)
+    objetivo_cobertura = _pedir_entero(
+        "Cobertura objetivo de la gramática en % (0 = sin guía por cobertura)", 0
+    )
 
     try:
         nombre_json = input(
@@ -65,10 +119,24 @@ def main() -> None:
         nombre_json = "resultados.json"
 
     print("\n--- Generación de casos ---")
-    print("Generando casos válidos...")
-    casos_validos, t_validas = generar_casos_validos(
-        grammar, n_validas, max_depth, max_len
-    )
+    cobertura = None
+    if objetivo_cobertura > 0:
+        print("Generando casos válidos guiados por cobertura...")
+        cobertura = Cobertura(grammar, max_depth=max_depth, max_len=max_len)
+        casos_validos, t_validas = generar_casos_cobertura(
+            grammar, cobertura, n_validas, max_depth, max_len, objetivo_cobertura / 100.0
+        )
+        porcentaje = round(cobertura.fraccion() * 100.0, 2)
+        print(f"  -> {len(casos_validos)} válidos guiados ({porcentaje}% de cobertura).")
+    else:
+        casos_validos, t_validas = [], 0.0
+    if len(casos_validos) < n_validas:
+        print("Generando casos válidos...")
+        casos_extra, t_extra = generar_casos_validos(
+            grammar, n_validas - len(casos_validos), max_depth, max_len
+        )
+        casos_validos += casos_extra
+        t_validas += t_extra
     print(f"  -> {len(casos_validos)} válidos generados.")
 
     print("Generando casos extremos...")
@@ -91,11 +159,22 @@ def main() -> None:
         "extremas": t_extremas,
     }
 
+    print("\nVerificando etiquetas con el reconocedor de la gramática...")
+    verificacion = verificar_etiquetas(casos_todos, grammar)
+    print(f"  -> {verificacion['mal_etiquetados']} casos reetiquetados.")
+
     print("\nCalculando estadísticas...")
     reporte = calcular_estadisticas(casos_todos, tiempos_ms)
+    reporte["verificacion"] = verificacion
+    if cobertura is not None:
+        reporte["cobertura"] = cobertura.reporte()
 
     print(f"Guardando resultados en '{nombre_json}'...")
     guardar_json(casos_todos, reporte, nombre_json)
+    try:
+        guardar_gramatica(grammar)
+    except OSError as e:
+        print(f"No se pudo actualizar el cache de la gramática: {e}")
 
     print("\n=== Resumen del Proceso ===")
     print(f"Total de casos generados: {reporte['total']}")
@@ -103,9 +182,343 @@ def main() -> None:
         print(f"  {categoria}: {porcentaje}%")
     print(f"Longitud promedio : {reporte['longitud_promedio']}")
     print(f"Profundidad máxima: {reporte['profundidad_maxima']}")
+    print(f"Mal etiquetados   : {verificacion['tasa_mal_etiquetados']}%")
     print(f"Archivo JSON generado: {nombre_json}")
     print("\nFin de la ejecución.\n")
 
 
+# ----------------------------------------------------------------------
+# Modo no interactivo: argumentos de línea de comandos y archivos de trabajos
+
+
+def _normalizar_trabajo(trabajo: Dict, base: Dict, directorio: Path | None = None) -> Dict:
+    """
+    Completa un trabajo con los valores de 'base' y valida sus campos. Las
+    rutas relativas se resuelven desde 'directorio' (el del archivo de trabajos).
+    """
+    desconocidos = sorted(set(trabajo) - set(TRABAJO_POR_DEFECTO) - {"nombre"})
+    if desconocidos:
+        raise ValueError(f"Campos desconocidos en el trabajo: {', '.join(desconocidos)}")
+    completo = {**base, **trabajo}
+    for campo, por_defecto in TRABAJO_POR_DEFECTO.items():
+        valor = completo[campo]
+        if isinstance(por_defecto, bool):
+            if not isinstance(valor, bool):
+                raise ValueError(f"El campo '{campo}' debe ser true o false.")
+        elif isinstance(por_defecto, int):
+            if isinstance(valor, bool) or not isinstance(valor, int) or valor < 0:
+                raise ValueError(f"El campo '{campo}' debe ser un entero no negativo.")
+    if completo["aleatorio"] not in (None,) + MOTORES:
+        raise ValueError(f"El campo 'aleatorio' debe ser null o uno de: {', '.join(MOTORES)}.")
+    if completo["mutador"] not in MUTADORES:
+        raise ValueError(f"El campo 'mutador' debe ser uno de: {', '.join(MUTADORES)}.")
+    if (completo["fragmento_casos"] or completo["fragmento_bytes"]) and completo["cobertura"] > 0:
+        raise ValueError("La salida en fragmentos no admite la generación guiada por cobertura.")
+    if directorio is not None:
+        for campo in ("gramatica", "salida"):
+            if campo in trabajo and not Path(trabajo[campo]).is_absolute():
+                completo[campo] = str(directorio / trabajo[campo])
+    return completo
+
+
+def leer_trabajos(ruta: str) -> List[Dict]:
+    """
+    Lee un archivo de trabajos en JSON: una lista de trabajos, o un objeto
+    {"comun": {...}, "trabajos": [...]} donde "comun" tiene los valores
+    compartidos. Cada trabajo admite los campos de TRABAJO_POR_DEFECTO y un
+    "nombre" opcional.
+    """
+    with open(ruta, "r", encoding="utf-8") as f:
+        datos = json.load(f)
+    directorio = Path(ruta).resolve().parent
+    base = dict(TRABAJO_POR_DEFECTO)
+    if isinstance(datos, dict):
+        base = _normalizar_trabajo(datos.get("comun", {}), base, directorio)
+        datos = datos.get("trabajos")
+    if not isinstance(datos, list):
+        raise ValueError("El archivo de trabajos debe tener una lista de trabajos.")
+    trabajos = []
+    for i, trabajo in enumerate(datos):
+        completo = _normalizar_trabajo(trabajo, base, directorio)
+        completo.setdefault("nombre", f"trabajo-{i}")
+        trabajos.append(completo)
+    return trabajos
+
+
+def _guardar_salida(casos, reporte: Dict, salida: str) -> None:
+    """
+    Guarda en JSON o, si el nombre termina en .jsonl (con o sin
+    compresión), en JSONL; con la extensión .casos, en un almacén binario
+    (ver almacen.py).
+    """
+    if Path(salida).suffix == EXTENSION_ALMACEN:
+        guardar_almacen(casos, salida, reporte)
+        return
+    compresion = compresion_por_nombre(salida)
+    nombre = Path(salida).with_suffix("") if compresion else Path(salida)
+    if nombre.suffix == ".jsonl":
+        with EscritorJSONL(salida, compresion) as escritor:
+            escritor.escribir_varios(casos)
+            escritor.cerrar(reporte)
+    else:
+        guardar_json(casos, reporte, salida)
+
+
+def _por_tipo_fragmentos(directorio: str) -> Dict[str, int]:
+    """Casos por tipo de una salida en fragmentos, según su manifiesto."""
+    with open(Path(directorio) / MANIFIESTO, "r", encoding="utf-8") as f:
+        fragmentos = json.load(f)["fragmentos"]
+    por_tipo: Dict[str, int] = {}
+    for fragmento in fragmentos:
+        for tipo, cantidad in fragmento["por_tipo"].items():
+            por_tipo[tipo] = por_tipo.get(tipo, 0) + cantidad
+    return por_tipo
+
+
+def _resumen_trabajo(trabajo: Dict, ruta: str, reporte: Dict, por_tipo: Dict[str, int], t0: float) -> Dict:
+    resumen = {
+        "nombre": trabajo.get("nombre"),
+        "estado": "ok",
+        "gramatica": ruta,
+        "salida": trabajo["salida"],
+        "semilla": trabajo["semilla"],
+        "total": reporte["total"],
+        "por_tipo": por_tipo,
+        "longitud_promedio": reporte["longitud_promedio"],
+        "profundidad_maxima": reporte["profundidad_maxima"],
+    }
+    if "verificacion" in reporte:
+        resumen["tasa_mal_etiquetados"] = reporte["verificacion"]["tasa_mal_etiquetados"]
+    if "cobertura" in reporte:
+        resumen["cobertura"] = reporte["cobertura"]["total"]
+    if "duplicados" in reporte:
+        resumen["rechazados"] = reporte["duplicados"]["rechazados"]
+    resumen["duracion_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+    return resumen
+
+
+def ejecutar_trabajo(
+    trabajo: Dict,
+    gramaticas: Dict[str, Grammar],
+    ejecutor=None,
+    procesos: int | None = None,
+) -> Dict:
+    """
+    Ejecuta un trabajo completo (generación, verificación, reporte y
+    salida) con generar_casos_paralelo, y retorna su resumen. Las
+    gramáticas se cargan una sola vez y se guardan en 'gramaticas' para
+    los trabajos siguientes; 'ejecutor' es el pool compartido. Con
+    fragmento_casos o fragmento_bytes, el trabajo se genera en este proceso
+    con generar_en_fragmentos y, si se interrumpe, al ejecutarlo de nuevo
+    se retoma donde quedó.
+    """
+    t0 = time.perf_counter()
+    ruta = str(Path(trabajo["gramatica"]).resolve())
+    grammar = gramaticas.get(ruta)
+    if grammar is None:
+        grammar = gramaticas[ruta] = cargar_gramatica(ruta)
+
+    n_validas = trabajo["validas"]
+    max_depth = trabajo["profundidad"]
+    max_len = trabajo["longitud"]
+    compacto = trabajo["compacto"]
+    total = n_validas + trabajo["invalidas"] + trabajo["extremas"]
+    vistos = crear_vistos(max(total, 1)) if trabajo["unicos"] else None
+    acumulador = AcumuladorEstadisticas()
+    inst = Instrumentacion() if trabajo["instrumentar"] else None
+    pool = SubtreePool() if trabajo["reusar_subarboles"] else None
+
+    if trabajo["fragmento_casos"] or trabajo["fragmento_bytes"]:
+        reporte = generar_en_fragmentos(
+            grammar,
+            n_validas,
+            trabajo["invalidas"],
+            trabajo["extremas"],
+            max_depth,
+            max_len,
+            trabajo["salida"],
+            max_casos=trabajo["fragmento_casos"] or None,
+            max_bytes=trabajo["fragmento_bytes"] or None,
+            semilla=trabajo["semilla"],
+            aleatorio=trabajo["aleatorio"],
+            verificar=trabajo["verificar"],
+            vistos=vistos,
+            inst=inst,
+            pool=pool,
+            mutador=MotorMutaciones(grammar) if trabajo["mutador"] == "tokens" else None,
+        )
+        return _resumen_trabajo(trabajo, ruta, reporte, _por_tipo_fragmentos(trabajo["salida"]), t0)
+
+    # Los válidos guiados por cobertura se generan primero, en este proceso
+    cobertura = None
+    guiados = LoteCasos() if compacto else []
+    if trabajo["cobertura"] > 0:
+        cobertura = Cobertura(grammar, max_depth=max_depth, max_len=max_len)
+        guiados, ms = generar_casos_cobertura(
+            grammar, cobertura, n_validas, max_depth, max_len, trabajo["cobertura"] / 100.0,
+            rng=random.Random(trabajo["semilla"]), compacto=compacto, vistos=vistos, inst=inst,
+        )
+        if trabajo["verificar"]:
+            verificar_etiquetas(guiados, grammar, acumulador=acumulador, inst=inst)
+        if compacto:
+            acumulador.agregar_lote(guiados)
+        else:
+            for caso in guiados:
+                acumulador.agregar(caso)
+        acumulador.agregar_tiempo("validas", ms)
+
+    casos, _ = generar_casos_paralelo(
+        grammar,
+        n_validas - len(guiados),
+        trabajo["invalidas"],
+        trabajo["extremas"],
+        max_depth,
+        max_len,
+        semilla=trabajo["semilla"],
+        procesos=procesos,
+        ejecutor=ejecutor,
+        acumulador=acumulador,
+        verificar=trabajo["verificar"],
+        compacto=compacto,
+        vistos=vistos,
+        bases_extra=[caso["cadena"] for caso in guiados if caso["tipo"] == "valida"],
+        inst=inst,
+        aleatorio=trabajo["aleatorio"],
+        pool=pool,
+        operadores_mutacion=tuple(OPERADORES) if trabajo["mutador"] == "tokens" else None,
+    )
+    if compacto:
+        guiados.extender(casos)
+    else:
+        guiados.extend(casos)
+    casos = guiados
+
+    reporte = acumulador.reporte()
+    if cobertura is not None:
+        reporte["cobertura"] = cobertura.reporte()
+    if vistos is not None:
+        reporte["duplicados"] = vistos.reporte()
+    if inst is not None:
+        reporte["instrumentacion"] = inst.reporte()
+    if pool is not None:
+        reporte["pool_subarboles"] = pool.report()
+    _guardar_salida(casos, reporte, trabajo["salida"])
+    return _resumen_trabajo(trabajo, ruta, reporte, dict(acumulador.conteo_por_tipo), t0)
+
+
+def ejecutar_trabajos(trabajos: List[Dict], procesos: int | None = None) -> List[Dict]:
+    """
+    Ejecuta los trabajos en orden compartiendo un único pool de procesos
+    (con procesos=1, todo en el proceso actual) y las gramáticas ya
+    cargadas. Un trabajo que falla, con cualquier excepción, queda con
+    estado "error", su mensaje y el tipo de la excepción, sin detener a los
+    demás; si la falla rompió el pool, los trabajos siguientes usan uno
+    nuevo. Retorna los resúmenes en el mismo orden.
+    """
+    gramaticas: Dict[str, Grammar] = {}
+    resumenes = []
+    ejecutor = ProcessPoolExecutor(max_workers=procesos) if procesos != 1 else None
+    try:
+        for trabajo in trabajos:
+            try:
+                resumen = ejecutar_trabajo(trabajo, gramaticas, ejecutor, procesos)
+            except Exception as e:
+                resumen = {
+                    "nombre": trabajo.get("nombre"), "estado": "error",
+                    "error": str(e), "tipo_error": type(e).__name__,
+                }
+                if isinstance(e, BrokenExecutor) and ejecutor is not None:
+                    ejecutor.shutdown(wait=False)
+                    ejecutor = ProcessPoolExecutor(max_workers=procesos)
+            resumenes.append(resumen)
+            print(json.dumps(resumen, ensure_ascii=False), flush=True)
+    finally:
+        if ejecutor is not None:
+            ejecutor.shutdown()
+    for grammar in gramaticas.values():
+        try:
+            guardar_gramatica(grammar)
+        except OSError as e:
+            print(f"No se pudo actualizar el cache de la gramática: {e}", file=sys.stderr)
+    return resumenes
+
+
+def _argumentos() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Generador automático de casos de prueba a partir de una gramática. "
+        "Sin argumentos, pide los parámetros por consola.",
+    )
+    por_defecto = TRABAJO_POR_DEFECTO
+    parser.add_argument("-g", "--gramatica", default=por_defecto["gramatica"],
+                        help="archivo de la gramática (por defecto: gramatica.txt)")
+    parser.add_argument("--validas", type=int, default=por_defecto["validas"])
+    parser.add_argument("--invalidas", type=int, default=por_defecto["invalidas"])
+    parser.add_argument("--extremas", type=int, default=por_defecto["extremas"])
+    parser.add_argument("--profundidad", type=int, default=por_defecto["profundidad"],
+                        help="profundidad máxima de derivación: expansiones aleatorias "
+                             "de cada válida; altura del árbol en extremas y cobertura")
+    parser.add_argument("--longitud", type=int, default=por_defecto["longitud"],
+                        help="longitud máxima de la cadena")
+    parser.add_argument("--semilla", type=int, default=por_defecto["semilla"])
+    parser.add_argument("-o", "--salida", default=por_defecto["salida"],
+                        help="archivo de salida (.json, .jsonl con compresión opcional o .casos)")
+    parser.add_argument("--cobertura", type=int, default=por_defecto["cobertura"],
+                        help="cobertura objetivo en %% para los válidos (0 = sin guía)")
+    parser.add_argument("--unicos", action="store_true", help="no repetir cadenas")
+    parser.add_argument("--sin-verificar", dest="verificar", action="store_false",
+                        help="no verificar las etiquetas con el reconocedor")
+    parser.add_argument("--compacto", action="store_true",
+                        help="mantener los casos en formato columnar (menos memoria)")
+    parser.add_argument("--instrumentar", action="store_true",
+                        help="agregar al reporte contadores y tiempos por fase de la generación")
+    parser.add_argument("--aleatorio", choices=MOTORES, default=None,
+                        help="sortear los dígitos en bloque con este motor (cambia la secuencia generada)")
+    parser.add_argument("--reusar-subarboles", action="store_true",
+                        help="reusar subárboles chicos en los casos extremos (más rápido, menos diverso)")
+    parser.add_argument("--mutador", choices=MUTADORES, default=por_defecto["mutador"],
+                        help="mutar los inválidos por caracteres o por tokens (siempre inválidos)")
+    parser.add_argument("--fragmento-casos", type=int, default=por_defecto["fragmento_casos"],
+                        help="escribir en fragmentos de N casos dentro del directorio --salida (retomable)")
+    parser.add_argument("--fragmento-bytes", type=int, default=por_defecto["fragmento_bytes"],
+                        help="escribir en fragmentos de hasta N bytes dentro del directorio --salida (retomable)")
+    parser.add_argument("-t", "--trabajos", help="archivo JSON con varios trabajos")
+    parser.add_argument("-p", "--procesos", type=int, default=None,
+                        help="procesos del pool compartido (1 = sin pool; por defecto, uno por CPU)")
+    parser.add_argument("--resumen", help="guardar también los resúmenes en este archivo JSON")
+    return parser
+
+
+def main(argv: List[str] | None = None) -> int:
+    """
+    Punto de entrada. Sin argumentos usa el modo interactivo; con
+    argumentos ejecuta un trabajo, o todos los de --trabajos, e imprime un
+    resumen JSON por línea. Retorna el código de salida (1 si algún
+    trabajo falló).
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv:
+        _main_interactivo()
+        return 0
+
+    args = _argumentos().parse_args(argv)
+    try:
+        if args.trabajos:
+            trabajos = leer_trabajos(args.trabajos)
+        else:
+            campos = {campo: getattr(args, campo) for campo in TRABAJO_POR_DEFECTO}
+            trabajos = [_normalizar_trabajo(campos, TRABAJO_POR_DEFECTO)]
+            trabajos[0]["nombre"] = Path(args.salida).stem
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    resumenes = ejecutar_trabajos(trabajos, args.procesos)
+    if args.resumen:
+        with open(args.resumen, "w", encoding="utf-8") as f:
+            json.dump(resumenes, f, ensure_ascii=False, indent=4)
+    return 0 if all(r["estado"] == "ok" for r in resumenes) else 1
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
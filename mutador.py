@@ -0,0 +1,329 @@
+# mutador.py
+
+from typing import Callable, Dict, List, Sequence, Tuple
+import random
+
+from cfg_parser import Grammar
+from instrumentacion import Instrumentacion
+from reconocedor import PrefijosLR, obtener_reconocedor
+
+# Motores de mutación de los inválidos: "caracteres" (generador_validas._mutar_cadena)
+# o "tokens" (MotorMutaciones)
+MUTADORES = ("caracteres", "tokens")
+
+# Una edición del arreglo de tokens: tokens[inicio:fin] = reemplazo
+Edicion = Tuple[int, int, List[int]]
+# Operador de mutación: (motor, tokens, rng) -> edición, o None si no se puede aplicar
+OperadorMutacion = Callable[["MotorMutaciones", List[int], random.Random], Edicion | None]
+
+# Catálogo de operadores por nombre, en orden de registro (ver registrar_operador)
+OPERADORES: Dict[str, OperadorMutacion] = {}
+# Clave del respaldo que garantiza una cadena inválida (no es un operador del catálogo)
+RESPALDO = "simbolo_invalido"
+# Caracteres para el respaldo: se usa el primero que no aparece en ningún terminal
+_CANDIDATOS_RESPALDO = "?#@$~`¿§"
+# Intentos por caso antes de recurrir al respaldo
+MAX_INTENTOS = 8
+
+
+def registrar_operador(nombre: str) -> Callable[[OperadorMutacion], OperadorMutacion]:
+    """
+    Decorador que agrega un operador al catálogo con ese nombre. El
+    operador recibe (motor, tokens, rng) y retorna la edición (inicio, fin,
+    reemplazo) que aplicaría, o None si no hay dónde aplicarlo; no modifica
+    'tokens'. Los conteos de cada caso usan el nombre como clave.
+    """
+
+    def registrar(operador: OperadorMutacion) -> OperadorMutacion:
+        if nombre in OPERADORES or nombre == RESPALDO:
+            raise ValueError(f"Ya hay un operador de mutación llamado '{nombre}'.")
+        OPERADORES[nombre] = operador
+        return operador
+
+    return registrar
+
+
+class MotorMutaciones:
+    """
+    Mutaciones sobre los tokens de cadenas válidas, con resultado inválido
+    garantizado.
+
+    Las bases se separan en tokens con el analizador léxico del
+    reconocedor (los mismos ids de terminal de la derivación) y cada caso
+    aplica entre 1 y max_mutaciones ediciones de operadores del catálogo
+    (ver OPERADORES), elegidos al azar. De la gramática se deducen los
+    operadores infijos (terminales entre dos no terminales), los operandos
+    (números y terminales que forman solos una alternativa) y los pares
+    de delimitadores (a X b), así que los operadores apuntan a errores con
+    sentido para la gramática: un operando faltante, un paréntesis sin
+    pareja, dos operadores seguidos, etc.
+
+    Cada resultado se verifica con el reconocedor de forma incremental: las
+    pilas LR de cada base se calculan una vez y el análisis retoma en la
+    región editada (ver Reconocedor.reconoce_edicion). Si el resultado es
+    válido se vuelve a intentar desde la base, y tras max_intentos se
+    inserta un carácter que no aparece en ningún terminal (clave
+    "simbolo_invalido"), que ningún análisis léxico acepta. mutar_lote
+    procesa un lote de bases de una vez, analizando cada base distinta una
+    sola vez.
+    """
+
+    def __init__(
+        self, grammar: Grammar, operadores: Sequence[str] | None = None, max_intentos: int = MAX_INTENTOS
+    ) -> None:
+        nombres = tuple(OPERADORES) if operadores is None else tuple(operadores)
+        desconocidos = [nombre for nombre in nombres if nombre not in OPERADORES]
+        if desconocidos:
+            raise ValueError(
+                f"Operadores de mutación desconocidos: {', '.join(desconocidos)} "
+                f"(se admite {', '.join(OPERADORES)})."
+            )
+        if not nombres:
+            raise ValueError("Se necesita al menos un operador de mutación.")
+        self.nombres = nombres
+        self._operadores = [OPERADORES[nombre] for nombre in nombres]
+        self.max_intentos = max_intentos
+        self.reconocedor = obtener_reconocedor(grammar)
+
+        cg = self.reconocedor.cg
+        self.cg = cg
+        num_nt = cg.num_nonterminals
+        terminales = range(num_nt, len(cg.symbols))
+        infijos = set()
+        atomos = {sid for sid in terminales if cg.is_number[sid]}
+        pares: Dict[int, int] = {}
+        for alts in cg.productions:
+            for alt in alts:
+                if len(alt) == 1 and alt[0] >= num_nt:
+                    atomos.add(alt[0])
+                for j in range(1, len(alt) - 1):
+                    if alt[j] >= num_nt and alt[j - 1] < num_nt and alt[j + 1] < num_nt:
+                        infijos.add(alt[j])
+                    if alt[j] < num_nt and alt[j - 1] >= num_nt and alt[j + 1] >= num_nt:
+                        if alt[j - 1] != alt[j + 1]:
+                            pares[alt[j - 1]] = alt[j + 1]
+        self.terminales = tuple(terminales)
+        self.infijos = tuple(sorted(infijos))
+        self.atomos = frozenset(atomos)
+        # Delimitadores: apertura -> cierre y cierre -> apertura
+        self.aperturas = pares
+        self.cierres = {cierre: apertura for apertura, cierre in pares.items()}
+        self.delimitadores = tuple(sorted(set(pares) | set(pares.values())))
+        texto = "".join(cg.symbols[sid] for sid in terminales if not cg.is_number[sid])
+        self.simbolo_invalido = next((c for c in _CANDIDATOS_RESPALDO if c not in texto), None)
+
+    def texto(self, sid: int, rng: random.Random) -> str:
+        """Texto de un token nuevo (un dígito al azar para los números)."""
+        if self.cg.is_number[sid]:
+            return str(rng.randint(0, 9))
+        return self.cg.symbols[sid]
+
+    def cierre(self, tokens: List[int], i: int) -> int:
+        """Posición del cierre que corresponde a la apertura tokens[i] (i si no tiene)."""
+        apertura = tokens[i]
+        cierre = self.aperturas[apertura]
+        nivel = 0
+        for j in range(i, len(tokens)):
+            if tokens[j] == apertura:
+                nivel += 1
+            elif tokens[j] == cierre:
+                nivel -= 1
+                if nivel == 0:
+                    return j
+        return i
+
+    def mutar(
+        self,
+        cadena: str,
+        max_mutaciones: int = 2,
+        rng: random.Random | None = None,
+        inst: Instrumentacion | None = None,
+    ) -> Tuple[str, Dict[str, int]]:
+        """Una versión inválida de la cadena y los conteos por operador."""
+        return self.mutar_lote((cadena,), max_mutaciones, rng, inst)[0]
+
+    def mutar_lote(
+        self,
+        bases: Sequence[str],
+        max_mutaciones: int = 2,
+        rng: random.Random | None = None,
+        inst: Instrumentacion | None = None,
+    ) -> List[Tuple[str, Dict[str, int]]]:
+        """
+        Muta cada base del lote, en orden; retorna (cadena, conteos) por
+        base. Con 'inst' cuenta las ediciones aplicadas, los reintentos, los
+        respaldos y las verificaciones que no pudieron ser incrementales.
+        """
+        rng = rng or random
+        analizadas: Dict[str, Tuple | None] = {}
+        resultados = []
+        for base in bases:
+            if base in analizadas:
+                analisis = analizadas[base]
+            else:
+                analisis = analizadas[base] = self._analizar(base)
+            resultados.append(self._mutar(base, analisis, max_mutaciones, rng, inst))
+        return resultados
+
+    def _analizar(self, cadena: str) -> Tuple | None:
+        """(tokens, textos, espacios_finales, pilas LR) de la base, o None si no se puede tokenizar."""
+        separada = self.reconocedor.tokenizar_lexemas(cadena)
+        if separada is None:
+            return None
+        tokens, textos, final = separada
+        prefijos = self.reconocedor.prefijos_lr(tokens + [self.reconocedor.eof])
+        return tokens, textos, final, prefijos
+
+    def _mutar(
+        self,
+        base: str,
+        analisis: Tuple | None,
+        max_mutaciones: int,
+        rng: random.Random,
+        inst: Instrumentacion | None,
+    ) -> Tuple[str, Dict[str, int]]:
+        conteos = dict.fromkeys(self.nombres, 0)
+        conteos[RESPALDO] = 0
+        operadores = self._operadores
+        cadena = base
+        if analisis is not None:
+            tokens_base, textos_base, final, prefijos = analisis
+            for _ in range(self.max_intentos):
+                tokens = list(tokens_base)
+                textos = list(textos_base)
+                aplicadas = [0] * len(operadores)
+                # tokens[:desde] no cambió y tokens[i] es el token i - delta de la base desde 'hasta'
+                desde, hasta, delta = len(tokens), 0, 0
+                for _ in range(rng.randint(1, max_mutaciones)):
+                    for _ in range(len(operadores)):
+                        k = rng.randrange(len(operadores))
+                        edicion = operadores[k](self, tokens, rng)
+                        if edicion is not None:
+                            break
+                    else:
+                        continue
+                    inicio, fin, reemplazo = edicion
+                    tokens[inicio:fin] = reemplazo
+                    textos[inicio:fin] = [self.texto(sid, rng) for sid in reemplazo]
+                    aplicadas[k] += 1
+                    cambio = len(reemplazo) - (fin - inicio)
+                    desde = min(desde, inicio)
+                    hasta = hasta + cambio if hasta >= fin else max(hasta, inicio + len(reemplazo))
+                    delta += cambio
+                if not any(aplicadas):
+                    continue
+                cadena = "".join(textos) + final
+                if not self._es_valida(cadena, tokens, prefijos, desde, hasta, delta, inst):
+                    for nombre, n in zip(self.nombres, aplicadas):
+                        conteos[nombre] += n
+                    if inst is not None:
+                        inst.contar("mutaciones", sum(aplicadas))
+                    return cadena, conteos
+                if inst is not None:
+                    inst.contar("mutaciones_reintentos")
+
+        # Respaldo: un carácter que el análisis léxico no reconoce
+        if inst is not None:
+            inst.contar("mutaciones_respaldo")
+        if self.simbolo_invalido is None:
+            return cadena, conteos
+        i = rng.randrange(len(base) + 1)
+        conteos[RESPALDO] = 1
+        return base[:i] + self.simbolo_invalido + base[i:], conteos
+
+    def _es_valida(
+        self,
+        cadena: str,
+        tokens: List[int],
+        prefijos: PrefijosLR | None,
+        desde: int,
+        hasta: int,
+        delta: int,
+        inst: Instrumentacion | None,
+    ) -> bool:
+        reconocedor = self.reconocedor
+        # Al unir los textos, dos tokens pueden formar uno solo (p. ej. dos números)
+        retokenizados = reconocedor.tokenizar(cadena)
+        if retokenizados is None:
+            return False
+        if prefijos is None or len(retokenizados) != len(tokens) + 1 or retokenizados[:-1] != tokens:
+            if inst is not None:
+                inst.contar("mutaciones_verificacion_completa")
+            return reconocedor.reconoce(cadena)
+        return reconocedor.reconoce_edicion(retokenizados, prefijos, desde, hasta, delta)
+
+
+# ----------------------------------------------------------------------
+# Catálogo de operadores. Los primeros apuntan a errores típicos de la
+# gramática; los últimos son las mutaciones genéricas, a nivel de token.
+
+
+@registrar_operador("operando_faltante")
+def _operando_faltante(motor: MotorMutaciones, tokens: List[int], rng: random.Random) -> Edicion | None:
+    """Quita un operando (un átomo o un grupo entre delimitadores) junto a un operador infijo."""
+    infijos = motor.infijos
+    ultimo = len(tokens) - 1
+    candidatos = [
+        i
+        for i, sid in enumerate(tokens)
+        if (sid in motor.atomos or sid in motor.aperturas)
+        and ((i > 0 and tokens[i - 1] in infijos) or (i < ultimo and tokens[i + 1] in infijos))
+    ]
+    if not candidatos:
+        return None
+    i = rng.choice(candidatos)
+    fin = motor.cierre(tokens, i) + 1 if tokens[i] in motor.aperturas else i + 1
+    return i, fin, []
+
+
+@registrar_operador("parentesis_desbalanceado")
+def _parentesis_desbalanceado(
+    motor: MotorMutaciones, tokens: List[int], rng: random.Random
+) -> Edicion | None:
+    """Quita uno de los delimitadores de un par o agrega uno suelto."""
+    if not motor.delimitadores:
+        return None
+    posiciones = [i for i, sid in enumerate(tokens) if sid in motor.aperturas or sid in motor.cierres]
+    if posiciones and rng.random() < 0.5:
+        i = rng.choice(posiciones)
+        return i, i + 1, []
+    i = rng.randrange(len(tokens) + 1)
+    return i, i, [rng.choice(motor.delimitadores)]
+
+
+@registrar_operador("operador_adyacente")
+def _operador_adyacente(motor: MotorMutaciones, tokens: List[int], rng: random.Random) -> Edicion | None:
+    """Agrega un operador infijo pegado a otro (p. ej. "1+*2")."""
+    posiciones = [i for i, sid in enumerate(tokens) if sid in motor.infijos]
+    if not posiciones:
+        return None
+    i = rng.choice(posiciones) + rng.randrange(2)
+    return i, i, [rng.choice(motor.infijos)]
+
+
+@registrar_operador("eliminacion")
+def _eliminacion(motor: MotorMutaciones, tokens: List[int], rng: random.Random) -> Edicion | None:
+    """Quita un token cualquiera."""
+    if not tokens:
+        return None
+    i = rng.randrange(len(tokens))
+    return i, i + 1, []
+
+
+@registrar_operador("sustitucion")
+def _sustitucion(motor: MotorMutaciones, tokens: List[int], rng: random.Random) -> Edicion | None:
+    """Reemplaza un token por otro terminal."""
+    if not tokens:
+        return None
+    i = rng.randrange(len(tokens))
+    sid = rng.choice(motor.terminales)
+    if sid == tokens[i]:
+        return None
+    return i, i + 1, [sid]
+
+
+@registrar_operador("insercion")
+def _insercion(motor: MotorMutaciones, tokens: List[int], rng: random.Random) -> Edicion | None:
+    """Inserta un terminal cualquiera."""
+    i = rng.randrange(len(tokens) + 1)
+    return i, i, [rng.choice(motor.terminales)]
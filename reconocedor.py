@@ -0,0 +1,538 @@
+# reconocedor.py
+
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+import re
+
+from cfg_parser import Grammar, compile_grammar
+
+# Códigos de acción de la tabla LR: >= 0 desplazar al estado, ACEPTAR, o -(p + 2) reducir p
+ACEPTAR = -1
+# Máxima cantidad de resultados memoizados por reconocedor
+MAX_MEMO = 1 << 18
+
+
+class Reconocedor:
+    """
+    Reconocedor compilado a partir de una Grammar.
+
+    Construye tablas LALR(1) (LR(1) canónico con estados fusionados por
+    núcleo); si la gramática tiene conflictos, usa un parser de Earley con
+    las predicciones precalculadas por no terminal. El analizador léxico
+    reconoce los terminales por su texto (el más largo primero), toma cada
+    dígito como un terminal numérico ('num'), igual que los generadores
+    (así "12" es 'num num'), e ignora espacios.
+
+    Si todos los terminales son de un carácter ASCII, reconoce convierte la
+    cadena en tokens con un único bytes.translate y el análisis LR recorre
+    esos bytes con tablas densas (una lista por estado), sin pasar por el
+    analizador léxico.
+    """
+
+    def __init__(self, grammar: Grammar) -> None:
+        cg = compile_grammar(grammar)
+        self.cg = cg
+        num_nt = cg.num_nonterminals
+        self.eof = len(cg.symbols)
+
+        # Producciones aplanadas: (lado izquierdo, lado derecho)
+        self.prod_lhs: List[int] = []
+        self.prod_rhs: List[Tuple[int, ...]] = []
+        self.prods_por_nt: List[List[int]] = [[] for _ in range(num_nt)]
+        for nt, alts in enumerate(cg.productions):
+            for alt in alts:
+                self.prods_por_nt[nt].append(len(self.prod_lhs))
+                self.prod_lhs.append(nt)
+                self.prod_rhs.append(alt)
+        # (largo del lado derecho, lado izquierdo) de cada producción, para reducir
+        self._reducciones = [(len(rhs), lhs) for lhs, rhs in zip(self.prod_lhs, self.prod_rhs)]
+        # Resultados ya calculados (se vacía al llegar a MAX_MEMO entradas)
+        self._memo: Dict[str, bool] = {}
+
+        self.anulables = self._calcular_anulables()
+        self.first = self._calcular_first()
+        self._patron, self._lexemas = self._compilar_lexico()
+
+        self.accion: List[Dict[int, int]] = []
+        self.ir_a: List[Dict[int, int]] = []
+        self.es_lalr = self._construir_lalr()
+        self._traduccion = self._compilar_traduccion() if self.es_lalr else None
+        # Acciones por estado indexadas por id de token (hasta el byte 255, el token inválido)
+        ancho = max(self.eof + 1, 256)
+        self._accion_densa = [[fila.get(s) for s in range(ancho)] for fila in self.accion]
+        # Cadenas de reducciones unitarias ya resueltas (ver _reconocer_lr)
+        self._unitarias: Dict[int, Tuple[int, int]] = {}
+
+    def __getstate__(self) -> Dict:
+        # Los resultados memoizados no se guardan (ver cache_gramatica)
+        estado = self.__dict__.copy()
+        estado["_memo"] = {}
+        estado["_unitarias"] = {}
+        return estado
+
+    # ------------------------------------------------------------------
+    # Análisis léxico
+
+    def _compilar_lexico(self):
+        cg = self.cg
+        terminales = range(cg.num_nonterminals, len(cg.symbols))
+        numeros = [sid for sid in terminales if cg.is_number[sid]]
+        literales = sorted(
+            (sid for sid in terminales if not cg.is_number[sid]), key=lambda sid: -len(cg.symbols[sid])
+        )
+        lexemas = {cg.symbols[sid]: sid for sid in literales}
+        partes = [r"\s+"] + [re.escape(cg.symbols[sid]) for sid in literales]
+        if numeros:
+            for d in "0123456789":
+                lexemas.setdefault(d, numeros[0])
+        partes.append(".")
+        return re.compile("|".join(partes), re.DOTALL), lexemas
+
+    def _compilar_traduccion(self) -> Tuple[bytes, bytes, bytes] | None:
+        """
+        (tabla de bytes.translate, espacios a borrar, token EOF) si todos los
+        terminales son de un carácter ASCII; cada byte que no es un terminal
+        se traduce a 255, que no tiene acción en ningún estado.
+        """
+        if self.eof >= 255:
+            return None
+        tabla = bytearray([255]) * 256
+        for lexema, sid in self._lexemas.items():
+            if len(lexema) != 1 or not lexema.isascii():
+                return None
+            tabla[ord(lexema)] = sid
+        espacios = bytes(b for b in range(128) if chr(b).isspace() and chr(b) not in self._lexemas)
+        return bytes(tabla), espacios, bytes([self.eof])
+
+    def tokenizar(self, cadena: str) -> List[int] | None:
+        """Ids de los terminales de la cadena (terminando en EOF), o None si hay un carácter inválido."""
+        lexemas = self._patron.findall(cadena)
+        tokens = list(map(self._lexemas.get, lexemas))
+        if None in tokens:
+            # Camino lento: espacios o caracteres inválidos
+            tokens = []
+            for lexema in lexemas:
+                sid = self._lexemas.get(lexema)
+                if sid is None:
+                    if lexema.isspace():
+                        continue
+                    return None
+                tokens.append(sid)
+        tokens.append(self.eof)
+        return tokens
+
+    def tokenizar_lexemas(self, cadena: str) -> Tuple[List[int], List[str], str] | None:
+        """
+        Como tokenizar, pero retorna (tokens sin EOF, texto de cada token,
+        espacios finales); el texto de cada token incluye los espacios que
+        lo preceden, así que "".join(textos) + final reconstruye la cadena.
+        """
+        lexemas = self._patron.findall(cadena)
+        tokens = list(map(self._lexemas.get, lexemas))
+        if None not in tokens:
+            return tokens, lexemas, ""
+        # Camino lento: espacios o caracteres inválidos
+        tokens = []
+        textos: List[str] = []
+        espacios = ""
+        for lexema in lexemas:
+            sid = self._lexemas.get(lexema)
+            if sid is None:
+                if lexema.isspace():
+                    espacios += lexema
+                    continue
+                return None
+            tokens.append(sid)
+            textos.append(espacios + lexema)
+            espacios = ""
+        return tokens, textos, espacios
+
+    # ------------------------------------------------------------------
+    # Conjuntos auxiliares
+
+    def _calcular_anulables(self) -> Set[int]:
+        anulables: Set[int] = set()
+        cambio = True
+        while cambio:
+            cambio = False
+            for p, rhs in enumerate(self.prod_rhs):
+                lhs = self.prod_lhs[p]
+                if lhs not in anulables and all(s in anulables for s in rhs):
+                    anulables.add(lhs)
+                    cambio = True
+        return anulables
+
+    def _calcular_first(self) -> List[Set[int]]:
+        num_nt = self.cg.num_nonterminals
+        first: List[Set[int]] = [set() for _ in range(num_nt)]
+        cambio = True
+        while cambio:
+            cambio = False
+            for p, rhs in enumerate(self.prod_rhs):
+                destino = first[self.prod_lhs[p]]
+                antes = len(destino)
+                for s in rhs:
+                    if s < num_nt:
+                        destino |= first[s]
+                        if s not in self.anulables:
+                            break
+                    else:
+                        destino.add(s)
+                        break
+                if len(destino) != antes:
+                    cambio = True
+        return first
+
+    def _first_secuencia(self, simbolos: Iterable[int], siguiente: int) -> Set[int]:
+        num_nt = self.cg.num_nonterminals
+        resultado: Set[int] = set()
+        for s in simbolos:
+            if s < num_nt:
+                resultado |= self.first[s]
+                if s not in self.anulables:
+                    return resultado
+            else:
+                resultado.add(s)
+                return resultado
+        resultado.add(siguiente)
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Construcción de tablas LALR(1)
+
+    def _clausura(self, items: Iterable[Tuple[int, int, int]]) -> FrozenSet[Tuple[int, int, int]]:
+        num_nt = self.cg.num_nonterminals
+        resultado = set(items)
+        pendientes = list(resultado)
+        while pendientes:
+            p, punto, la = pendientes.pop()
+            rhs = self.prod_rhs[p] if p >= 0 else (self.cg.start,)
+            if punto < len(rhs) and rhs[punto] < num_nt:
+                siguientes = self._first_secuencia(rhs[punto + 1 :], la)
+                for q in self.prods_por_nt[rhs[punto]]:
+                    for b in siguientes:
+                        item = (q, 0, b)
+                        if item not in resultado:
+                            resultado.add(item)
+                            pendientes.append(item)
+        return frozenset(resultado)
+
+    def _construir_lalr(self) -> bool:
+        """Construye las tablas; retorna False si hay conflictos (se usará Earley)."""
+        cg = self.cg
+        if cg.start >= cg.num_nonterminals:
+            return False
+        # La producción aumentada S' -> S se representa con p = -1
+        inicial = self._clausura([(-1, 0, self.eof)])
+        estados = [inicial]
+        indice = {inicial: 0}
+        transiciones: List[Dict[int, int]] = []
+        i = 0
+        while i < len(estados):
+            por_simbolo: Dict[int, List[Tuple[int, int, int]]] = {}
+            for p, punto, la in estados[i]:
+                rhs = self.prod_rhs[p] if p >= 0 else (cg.start,)
+                if punto < len(rhs):
+                    por_simbolo.setdefault(rhs[punto], []).append((p, punto + 1, la))
+            trans: Dict[int, int] = {}
+            for simbolo, kernel in sorted(por_simbolo.items()):
+                destino = self._clausura(kernel)
+                if destino not in indice:
+                    indice[destino] = len(estados)
+                    estados.append(destino)
+                trans[simbolo] = indice[destino]
+            transiciones.append(trans)
+            i += 1
+
+        # Fusión de estados con el mismo núcleo (LR(1) -> LALR(1))
+        nucleo_de = [frozenset((p, punto) for p, punto, _ in estado) for estado in estados]
+        fusion: Dict[FrozenSet, int] = {}
+        nuevo = []
+        for nucleo in nucleo_de:
+            if nucleo not in fusion:
+                fusion[nucleo] = len(fusion)
+            nuevo.append(fusion[nucleo])
+        total = len(fusion)
+        accion: List[Dict[int, int]] = [{} for _ in range(total)]
+        ir_a: List[Dict[int, int]] = [{} for _ in range(total)]
+
+        num_nt = cg.num_nonterminals
+        for viejo, estado in enumerate(estados):
+            e = nuevo[viejo]
+            for simbolo, destino in transiciones[viejo].items():
+                tabla = ir_a[e] if simbolo < num_nt else accion[e]
+                codigo = nuevo[destino]
+                if tabla.get(simbolo, codigo) != codigo:
+                    return False
+                tabla[simbolo] = codigo
+            for p, punto, la in estado:
+                rhs = self.prod_rhs[p] if p >= 0 else (cg.start,)
+                if punto < len(rhs):
+                    continue
+                codigo = ACEPTAR if p < 0 else -(p + 2)
+                if accion[e].get(la, codigo) != codigo:
+                    return False
+                accion[e][la] = codigo
+        self.accion = accion
+        self.ir_a = ir_a
+        return True
+
+    # ------------------------------------------------------------------
+    # Reconocimiento
+
+    def _reconocer_lr(self, tokens: Iterable[int]) -> int:
+        """
+        Cantidad de reducciones del análisis LR (-1 si la cadena no pertenece
+        al lenguaje). Las cadenas de reducciones por producciones unitarias
+        (A -> B, como 'T -> F' tras 'F -> num') se resuelven de una vez: su
+        resultado solo depende del estado de abajo, el de arriba y el token,
+        y se memoiza (ver _cadena_unitaria).
+        """
+        accion = self._accion_densa
+        ir_a = self.ir_a
+        reducciones = self._reducciones
+        unitarias = self._unitarias
+        # Clave de (estado de abajo, estado de arriba, token) en un entero
+        estados = len(accion)
+        ancho = len(accion[0])
+        pila = [0]
+        estado = 0
+        cantidad = 0
+        for tok in tokens:
+            while True:
+                a = accion[estado][tok]
+                if a is None:
+                    return -1
+                if a >= 0:
+                    pila.append(a)
+                    estado = a
+                    break
+                if a == ACEPTAR:
+                    return cantidad
+                n, lhs = reducciones[-a - 2]
+                if n == 1:
+                    clave = (pila[-2] * estados + estado) * ancho + tok
+                    cadena = unitarias.get(clave)
+                    if cadena is None:
+                        cadena = unitarias[clave] = self._cadena_unitaria(pila[-2], estado, tok)
+                    estado = pila[-1] = cadena[0]
+                    cantidad += cadena[1]
+                    continue
+                cantidad += 1
+                if n:
+                    del pila[-n:]
+                estado = ir_a[pila[-1]][lhs]
+                pila.append(estado)
+        return -1
+
+    def _cadena_unitaria(self, debajo: int, estado: int, tok: int) -> Tuple[int, int]:
+        """(estado final, reducciones) de aplicar las reducciones de largo 1 seguidas sobre 'debajo'."""
+        accion = self._accion_densa
+        cantidad = 0
+        while True:
+            a = accion[estado][tok]
+            if a is None or a >= 0 or a == ACEPTAR:
+                return estado, cantidad
+            n, lhs = self._reducciones[-a - 2]
+            if n != 1:
+                return estado, cantidad
+            estado = self.ir_a[debajo][lhs]
+            cantidad += 1
+
+    def _reconocer_earley(self, tokens: List[int]) -> bool:
+        num_nt = self.cg.num_nonterminals
+        inicio = self.cg.start
+        if inicio >= num_nt:
+            return tokens[:-1] == [inicio]
+        n = len(tokens) - 1
+        conjuntos: List[Set[Tuple[int, int, int]]] = [set() for _ in range(n + 1)]
+        conjuntos[0] = {(p, 0, 0) for p in self.prods_por_nt[inicio]}
+        for i in range(n + 1):
+            conjunto = conjuntos[i]
+            agenda = list(conjunto)
+            while agenda:
+                p, punto, origen = agenda.pop()
+                rhs = self.prod_rhs[p]
+                if punto < len(rhs):
+                    s = rhs[punto]
+                    if s < num_nt:
+                        nuevos = [(q, 0, i) for q in self.prods_por_nt[s]]
+                        if s in self.anulables:
+                            nuevos.append((p, punto + 1, origen))
+                    elif i < n and tokens[i] == s:
+                        conjuntos[i + 1].add((p, punto + 1, origen))
+                        continue
+                    else:
+                        continue
+                else:
+                    lhs = self.prod_lhs[p]
+                    nuevos = [
+                        (q, d + 1, o)
+                        for q, d, o in list(conjuntos[origen])
+                        if d < len(self.prod_rhs[q]) and self.prod_rhs[q][d] == lhs
+                    ]
+                for item in nuevos:
+                    if item not in conjunto:
+                        conjunto.add(item)
+                        agenda.append(item)
+        return any(
+            origen == 0 and self.prod_lhs[p] == inicio and punto == len(self.prod_rhs[p])
+            for p, punto, origen in conjuntos[n]
+        )
+
+    def reconoce(self, cadena: str) -> bool:
+        """True si la cadena pertenece al lenguaje de la gramática."""
+        if self._traduccion is not None and cadena.isascii():
+            tabla, espacios, fin = self._traduccion
+            return self._reconocer_lr(cadena.encode("ascii").translate(tabla, espacios) + fin) >= 0
+        tokens = self.tokenizar(cadena)
+        if tokens is None:
+            return False
+        if self.es_lalr:
+            return self._reconocer_lr(tokens) >= 0
+        return self._reconocer_earley(tokens)
+
+    def reducciones(self, cadena: str) -> int | None:
+        """
+        Cantidad de reducciones del análisis LR de la cadena, que es la
+        cantidad de expansiones de su árbol de derivación. None si la cadena
+        no pertenece al lenguaje o la gramática no es LALR(1).
+        """
+        tokens = self.tokenizar(cadena)
+        if tokens is None or not self.es_lalr:
+            return None
+        cantidad = self._reconocer_lr(tokens)
+        return cantidad if cantidad >= 0 else None
+
+    # ------------------------------------------------------------------
+    # Reconocimiento incremental (para cadenas editadas en una región)
+
+    def prefijos_lr(self, tokens: List[int]) -> "PrefijosLR | None":
+        """Pilas LR de la cadena 'tokens' (terminando en EOF); None si la gramática no es LALR(1)."""
+        return PrefijosLR(self, tokens) if self.es_lalr else None
+
+    def reconoce_edicion(
+        self, tokens: List[int], prefijos: "PrefijosLR", desde: int, hasta: int, delta: int
+    ) -> bool:
+        """
+        True si 'tokens' (terminando en EOF) pertenece al lenguaje, sabiendo
+        que es una edición de la cadena de 'prefijos': tokens[:desde] es
+        igual al original y, desde la posición 'hasta', tokens[i] es el
+        token i - delta del original.
+
+        El análisis retoma en la pila del original antes de 'desde' y
+        termina en cuanto la pila vuelve a ser la del original en la misma
+        posición (el resto se analizaría igual, así que el resultado es el
+        del original), así que solo recorre la región editada y lo que el
+        error o la resincronización alcancen.
+        """
+        pila = prefijos.pila(desde)
+        if pila is None:
+            return self._reconocer_lr(tokens) >= 0
+        accion = self.accion
+        ir_a = self.ir_a
+        reducciones = self._reducciones
+        for i in range(desde, len(tokens)):
+            if i >= hasta and _mismas_pilas(pila, prefijos.pila(i - delta)):
+                return prefijos.aceptada()
+            tok = tokens[i]
+            while True:
+                a = accion[pila[0]].get(tok)
+                if a is None:
+                    return False
+                if a >= 0:
+                    pila = (a, pila)
+                    break
+                if a == ACEPTAR:
+                    return True
+                n, lhs = reducciones[-a - 2]
+                for _ in range(n):
+                    pila = pila[1]
+                pila = (ir_a[pila[0]][lhs], pila)
+        return False
+
+    def reconoce_lote(self, cadenas: Iterable[str]) -> List[bool]:
+        """Reconoce un lote de cadenas; las repetidas se analizan una sola vez."""
+        memo = self._memo
+        resultados: List[bool] = []
+        for cadena in cadenas:
+            valida = memo.get(cadena)
+            if valida is None:
+                if len(memo) >= MAX_MEMO:
+                    memo.clear()
+                valida = memo[cadena] = self.reconoce(cadena)
+            resultados.append(valida)
+        return resultados
+
+
+class PrefijosLR:
+    """
+    Pilas del análisis LR de una cadena antes de cada uno de sus tokens,
+    calculadas a medida que se piden. Las pilas son listas enlazadas
+    inmutables (estado, pila_anterior), así que las de posiciones vecinas
+    comparten sus fondos y guardarlas no cuesta copiarlas. La pila antes
+    del token i solo depende de tokens[:i].
+    """
+
+    __slots__ = ("reconocedor", "tokens", "pilas", "resultado")
+
+    def __init__(self, reconocedor: Reconocedor, tokens: List[int]) -> None:
+        self.reconocedor = reconocedor
+        self.tokens = tokens
+        self.pilas: List[Tuple] = [(0, None)]
+        # True o False cuando el análisis terminó
+        self.resultado: bool | None = None
+
+    def pila(self, i: int) -> Tuple | None:
+        """Pila antes del token i, o None si el análisis falló antes de llegar."""
+        pilas = self.pilas
+        if i < len(pilas):
+            return pilas[i]
+        if self.resultado is not None:
+            return None
+        reconocedor = self.reconocedor
+        accion = reconocedor.accion
+        ir_a = reconocedor.ir_a
+        reducciones = reconocedor._reducciones
+        pila = pilas[-1]
+        for tok in self.tokens[len(pilas) - 1 : i]:
+            while True:
+                a = accion[pila[0]].get(tok)
+                if a is None:
+                    self.resultado = False
+                    return None
+                if a >= 0:
+                    pila = (a, pila)
+                    break
+                if a == ACEPTAR:
+                    self.resultado = True
+                    return None
+                n, lhs = reducciones[-a - 2]
+                for _ in range(n):
+                    pila = pila[1]
+                pila = (ir_a[pila[0]][lhs], pila)
+            pilas.append(pila)
+        return pilas[i] if i < len(pilas) else None
+
+    def aceptada(self) -> bool:
+        """True si la cadena pertenece al lenguaje (termina el análisis si hace falta)."""
+        self.pila(len(self.tokens))
+        return bool(self.resultado)
+
+
+def _mismas_pilas(a: Tuple | None, b: Tuple | None) -> bool:
+    """Compara dos pilas enlazadas hasta llegar a un fondo compartido."""
+    while a is not b:
+        if a is None or b is None or a[0] != b[0]:
+            return False
+        a = a[1]
+        b = b[1]
+    return True
+
+
+def obtener_reconocedor(grammar: Grammar) -> Reconocedor:
+    """Retorna el reconocedor de la gramática (memoizado en grammar.cache)."""
+    reconocedor = grammar.cache.get("reconocedor")
+    if reconocedor is None:
+        reconocedor = Reconocedor(grammar)
+        grammar.cache["reconocedor"] = reconocedor
+    return reconocedor  # type: ignore[return-value]
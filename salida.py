@@ -0,0 +1,290 @@
+# salida.py
+
+from pathlib import Path
+from typing import Dict, IO, Iterable, Iterator, List, Mapping
+import bz2
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import tempfile
+
+from casos import a_json
+
+try:  # Python 3.14+
+    from compression import zstd  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - depende de la versión de Python
+    zstd = None
+
+# Extensión asociada a cada compresión soportada
+EXTENSIONES_COMPRESION = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz", "zstd": ".zst"}
+# Manifiesto de una salida en fragmentos (dentro de su directorio)
+MANIFIESTO = "manifiesto.json"
+# Sufijo de un fragmento que todavía se está escribiendo
+_SUFIJO_PARCIAL = ".parcial"
+
+
+def abrir_salida(nombre: str, compresion: str | None = None) -> IO[str]:
+    """
+    Abre un archivo de texto para escritura, con compresión opcional
+    ("gzip", "bz2", "xz" o "zstd"; esta última requiere Python 3.14+).
+    """
+    if compresion is None:
+        return open(nombre, "w", encoding="utf-8")
+    if compresion == "gzip":
+        # mtime=0: el mismo contenido da siempre el mismo archivo (y el mismo sha256)
+        return io.TextIOWrapper(gzip.GzipFile(nombre, "wb", mtime=0), encoding="utf-8")
+    if compresion == "bz2":
+        return bz2.open(nombre, "wt", encoding="utf-8")
+    if compresion == "xz":
+        return lzma.open(nombre, "wt", encoding="utf-8")
+    if compresion == "zstd":
+        if zstd is None:
+            raise ValueError("La compresión zstd requiere Python 3.14 o superior.")
+        return zstd.open(nombre, "wt", encoding="utf-8")
+    raise ValueError(f"Compresión no soportada: {compresion}")
+
+
+def abrir_entrada(nombre: str | Path, compresion: str | None = None) -> IO[str]:
+    """Abre para lectura un archivo de texto escrito con abrir_salida."""
+    if compresion is None:
+        return open(nombre, "r", encoding="utf-8")
+    if compresion == "gzip":
+        return gzip.open(nombre, "rt", encoding="utf-8")
+    if compresion == "bz2":
+        return bz2.open(nombre, "rt", encoding="utf-8")
+    if compresion == "xz":
+        return lzma.open(nombre, "rt", encoding="utf-8")
+    if compresion == "zstd":
+        if zstd is None:
+            raise ValueError("La compresión zstd requiere Python 3.14 o superior.")
+        return zstd.open(nombre, "rt", encoding="utf-8")
+    raise ValueError(f"Compresión no soportada: {compresion}")
+
+
+def compresion_por_nombre(nombre: str) -> str | None:
+    """Compresión que corresponde a la extensión del archivo ('r.jsonl.gz' -> 'gzip')."""
+    sufijo = Path(nombre).suffix
+    for compresion, extension in EXTENSIONES_COMPRESION.items():
+        if sufijo == extension:
+            return compresion
+    return None
+
+
+def ruta_reporte(nombre: str) -> str:
+    """
+    Ruta del archivo lateral con el reporte de una salida JSONL:
+    'resultados.jsonl.gz' -> 'resultados.reporte.json'.
+    """
+    ruta = Path(nombre)
+    if ruta.suffix in EXTENSIONES_COMPRESION.values():
+        ruta = ruta.with_suffix("")
+    if ruta.suffix == ".jsonl":
+        ruta = ruta.with_suffix("")
+    return str(ruta) + ".reporte.json"
+
+
+class EscritorJSONL:
+    """
+    Escribe los casos en formato JSON Lines (un caso por línea) a medida que
+    se generan, de modo que el uso de memoria no depende de la cantidad de casos.
+    El reporte general se guarda aparte, en el archivo dado por ruta_reporte.
+    """
+
+    def __init__(self, nombre: str, compresion: str | None = None) -> None:
+        self.nombre = nombre
+        self.compresion = compresion
+        self.casos_escritos = 0
+        # Bytes escritos sin comprimir (UTF-8)
+        self.bytes_escritos = 0
+        self._archivo = abrir_salida(nombre, compresion)
+
+    def escribir(self, caso: Mapping) -> None:
+        linea = json.dumps(caso, ensure_ascii=False, default=a_json)
+        self._archivo.write(linea)
+        self._archivo.write("\n")
+        self.casos_escritos += 1
+        self.bytes_escritos += (len(linea) if linea.isascii() else len(linea.encode("utf-8"))) + 1
+
+    def escribir_varios(self, casos: Iterable[Mapping]) -> None:
+        for caso in casos:
+            self.escribir(caso)
+
+    def cerrar(self, reporte: Dict | None = None) -> None:
+        """Cierra el archivo de casos y, si se entrega, guarda el reporte lateral."""
+        if not self._archivo.closed:
+            self._archivo.close()
+        if reporte is not None:
+            with open(ruta_reporte(self.nombre), "w", encoding="utf-8") as f:
+                json.dump(reporte, f, ensure_ascii=False, indent=4)
+
+    def __enter__(self) -> "EscritorJSONL":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cerrar()
+
+
+def _modo_archivos() -> int:
+    """Permisos de un archivo nuevo creado con open(): 0o666 sin los bits de la umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# mkstemp crea los temporales con modo 0o600; guardar_atomico les da este
+_MODO_ARCHIVOS = _modo_archivos()
+
+
+def guardar_atomico(ruta: str | Path, datos: bytes) -> None:
+    """
+    Escribe el archivo de una vez: un temporal en el mismo directorio que
+    luego se renombra. El archivo queda con los permisos de uno creado con
+    open().
+    """
+    ruta = Path(ruta)
+    fd, temporal = tempfile.mkstemp(dir=ruta.parent, prefix=ruta.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(datos)
+        os.chmod(temporal, _MODO_ARCHIVOS)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+def sha256_archivo(ruta: str | Path) -> str:
+    """sha256 (hexadecimal) del contenido de un archivo."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class EscritorFragmentos:
+    """
+    Escribe los casos en JSON Lines repartidos en fragmentos dentro de un
+    directorio ('casos-00000.jsonl', 'casos-00001.jsonl', ...), rotando
+    cuando el fragmento llega a max_casos casos o a max_bytes bytes (sin
+    comprimir).
+
+    Cada fragmento se escribe con el sufijo '.parcial' y se renombra al
+    cerrarse, así que un fragmento con su nombre final siempre está
+    completo. El manifiesto (MANIFIESTO) lista los fragmentos cerrados con
+    sus casos, bytes, casos por tipo y sha256. 'fragmentos' son las
+    entradas de fragmentos ya escritos, para continuar una corrida.
+    """
+
+    def __init__(
+        self,
+        directorio: str | Path,
+        max_casos: int | None = None,
+        max_bytes: int | None = None,
+        compresion: str | None = None,
+        prefijo: str = "casos",
+        fragmentos: List[Dict] | None = None,
+    ) -> None:
+        if not max_casos and not max_bytes:
+            raise ValueError("Para escribir en fragmentos hace falta max_casos o max_bytes.")
+        self.directorio = Path(directorio)
+        self.max_casos = max_casos
+        self.max_bytes = max_bytes
+        self.compresion = compresion
+        self.prefijo = prefijo
+        self.fragmentos: List[Dict] = list(fragmentos or [])
+        self._escritor: EscritorJSONL | None = None
+        self._por_tipo: Dict[str, int] = {}
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        # Restos de una corrida interrumpida a mitad de un fragmento
+        for parcial in self.directorio.glob(f"{prefijo}-*{_SUFIJO_PARCIAL}"):
+            parcial.unlink()
+
+    def nombre_fragmento(self, indice: int) -> str:
+        extension = EXTENSIONES_COMPRESION[self.compresion] if self.compresion else ""
+        return f"{self.prefijo}-{indice:05d}.jsonl{extension}"
+
+    def escribir(self, caso: Mapping) -> bool:
+        """Escribe un caso; retorna True si con él se cerró un fragmento."""
+        if self._escritor is None:
+            nombre = self.nombre_fragmento(len(self.fragmentos)) + _SUFIJO_PARCIAL
+            self._escritor = EscritorJSONL(str(self.directorio / nombre), self.compresion)
+            self._por_tipo = {}
+        escritor = self._escritor
+        escritor.escribir(caso)
+        tipo = caso["tipo"]
+        self._por_tipo[tipo] = self._por_tipo.get(tipo, 0) + 1
+        if (self.max_casos and escritor.casos_escritos >= self.max_casos) or (
+            self.max_bytes and escritor.bytes_escritos >= self.max_bytes
+        ):
+            self.cerrar_fragmento()
+            return True
+        return False
+
+    def cerrar_fragmento(self) -> Dict | None:
+        """Cierra el fragmento en curso (si lo hay) y retorna su entrada del manifiesto."""
+        escritor = self._escritor
+        if escritor is None:
+            return None
+        escritor.cerrar()
+        nombre = self.nombre_fragmento(len(self.fragmentos))
+        ruta = self.directorio / nombre
+        os.replace(escritor.nombre, ruta)
+        entrada = {
+            "nombre": nombre,
+            "casos": escritor.casos_escritos,
+            "bytes": escritor.bytes_escritos,
+            "por_tipo": dict(self._por_tipo),
+            "sha256": sha256_archivo(ruta),
+        }
+        self.fragmentos.append(entrada)
+        self._escritor = None
+        return entrada
+
+    def guardar_manifiesto(self, datos: Dict | None = None) -> None:
+        """Guarda (de forma atómica) el manifiesto con los fragmentos cerrados y 'datos'."""
+        manifiesto = {
+            "fragmentos": self.fragmentos,
+            "casos": sum(f["casos"] for f in self.fragmentos),
+            **(datos or {}),
+        }
+        texto = json.dumps(manifiesto, ensure_ascii=False, indent=4)
+        guardar_atomico(self.directorio / MANIFIESTO, texto.encode("utf-8"))
+
+
+def verificar_fragmentos(directorio: str | Path, fragmentos: List[Dict]) -> None:
+    """Comprueba que los fragmentos del manifiesto existan y tengan su sha256; si no, ValueError."""
+    for fragmento in fragmentos:
+        ruta = Path(directorio) / fragmento["nombre"]
+        if not ruta.exists():
+            raise ValueError(f"Falta el fragmento {ruta}.")
+        if sha256_archivo(ruta) != fragmento["sha256"]:
+            raise ValueError(f"El fragmento {ruta} no coincide con su sha256 del manifiesto.")
+
+
+def leer_casos(ruta: str | Path) -> Iterator[Dict]:
+    """
+    Lee, de a uno, los casos de una salida del generador: un JSON con
+    "casos", un JSONL (con o sin compresión) o un directorio de fragmentos
+    (en el orden de su manifiesto).
+    """
+    ruta = Path(ruta)
+    if ruta.is_dir():
+        with open(ruta / MANIFIESTO, "r", encoding="utf-8") as f:
+            fragmentos = json.load(f)["fragmentos"]
+        for fragmento in fragmentos:
+            yield from leer_casos(ruta / fragmento["nombre"])
+        return
+    compresion = compresion_por_nombre(str(ruta))
+    nombre = ruta.with_suffix("") if compresion else ruta
+    if nombre.suffix != ".jsonl":
+        with open(ruta, "r", encoding="utf-8") as f:
+            yield from json.load(f)["casos"]
+        return
+    with abrir_entrada(ruta, compresion) as f:
+        for linea in f:
+            if linea.strip():
+                yield json.loads(linea)
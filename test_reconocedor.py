@@ -0,0 +1,51 @@
+# test_reconocedor.py
+
+from pathlib import Path
+import itertools
+import random
+
+from cfg_parser import load_grammar
+from reconocedor import Reconocedor
+
+
+def _gramatica_grande(rellenos: int) -> str:
+    """Gramática con 'rellenos' terminales de más, para que los ids de token pasen de 255."""
+    extra = [f"t{i}" for i in range(rellenos)]
+    return f"""START: S
+NONTERMINALS: S B
+TERMINALS: b c d {" ".join(extra)}
+S -> c d | B c S | b | {" | ".join(extra)}
+B -> c | b | d b B
+"""
+
+
+def _coincide_con_earley(reconocedor: Reconocedor, cadenas) -> None:
+    for cadena in cadenas:
+        tokens = reconocedor.tokenizar(cadena)
+        esperado = tokens is not None and reconocedor._reconocer_earley(tokens)
+        assert reconocedor.reconoce(cadena) == esperado, cadena
+        assert (reconocedor.reducciones(cadena) is not None) == esperado, cadena
+
+
+def test_tablas_lr_coinciden_con_earley_con_mas_de_256_simbolos(tmp_path):
+    # La clave de las cadenas de reducciones unitarias no debe mezclar
+    # estados cuando los ids de token (o EOF) llegan a 256 o más
+    for rellenos in range(252, 258):
+        ruta = tmp_path / f"grande-{rellenos}.txt"
+        ruta.write_text(_gramatica_grande(rellenos), encoding="utf-8")
+        reconocedor = Reconocedor(load_grammar(str(ruta)))
+        assert reconocedor.es_lalr
+        cadenas = [
+            " ".join(t)
+            for largo in range(1, 7)
+            for t in itertools.product(["b", "c", "d", "t7"], repeat=largo)
+        ]
+        _coincide_con_earley(reconocedor, cadenas)
+
+
+def test_gramatica_de_ejemplo_coincide_con_earley():
+    reconocedor = Reconocedor(load_grammar(str(Path(__file__).with_name("gramatica.txt"))))
+    rng = random.Random(1)
+    cadenas = ["".join(rng.choice("0123456789+-*/%() ") for _ in range(rng.randint(0, 12))) for _ in range(5000)]
+    _coincide_con_earley(reconocedor, cadenas)
+    assert reconocedor.reconoce("1+2") and not reconocedor.reconoce("12")
@@ -0,0 +1,188 @@
+# vistos.py
+
+from abc import ABC, abstractmethod
+from array import array
+from hashlib import blake2b
+from typing import Dict
+import math
+
+
+def resumen_cadena(cadena: str) -> int:
+    """Resumen de 64 bits de la cadena (blake2b); nunca es 0, que marca una celda vacía."""
+    valor = int.from_bytes(blake2b(cadena.encode("utf-8"), digest_size=8).digest(), "little")
+    return valor or 1
+
+
+class Vistos(ABC):
+    """Parte común de los conjuntos de cadenas vistas: conteo de rechazos y reporte."""
+
+    tipo = ""
+
+    def __init__(self) -> None:
+        self.rechazados: Dict[str, int] = {}
+
+    def agregar(self, cadena: str) -> bool:
+        """Registra la cadena; retorna False si ya había sido vista."""
+        return self.agregar_resumen(resumen_cadena(cadena))
+
+    @abstractmethod
+    def agregar_resumen(self, resumen: int) -> bool:
+        """Registra el resumen; retorna False si ya había sido visto."""
+
+    @abstractmethod
+    def contiene_resumen(self, resumen: int) -> bool:
+        """True si el resumen ya fue visto (o, en un filtro, si puede haberlo sido)."""
+
+    @abstractmethod
+    def tamano_bytes(self) -> int:
+        """Memoria ocupada por la estructura, en bytes."""
+
+    def __contains__(self, cadena: str) -> bool:
+        return self.contiene_resumen(resumen_cadena(cadena))
+
+    def rechazar(self, tipo: str, cantidad: int = 1) -> None:
+        """Cuenta sorteos descartados por repetidos, por tipo de caso."""
+        self.rechazados[tipo] = self.rechazados.get(tipo, 0) + cantidad
+
+    def reporte(self) -> Dict:
+        """Resumen para el reporte general (sección 'duplicados')."""
+        unicos = len(self)  # type: ignore[arg-type]
+        total_rechazados = sum(self.rechazados.values())
+        sorteos = unicos + total_rechazados
+        return {
+            "conjunto": self.tipo,
+            "unicos": unicos,
+            "rechazados": total_rechazados,
+            "rechazados_por_tipo": dict(self.rechazados),
+            "tasa_rechazo": round(total_rechazados * 100.0 / sorteos, 2) if sorteos else 0.0,
+            "memoria_bytes": self.tamano_bytes(),
+        }
+
+
+class ConjuntoVistos(Vistos):
+    """
+    Conjunto exacto de cadenas vistas, guardadas como resúmenes de 64 bits
+    en una tabla hash de direccionamiento abierto (array 'Q', sondeo lineal,
+    factor de carga <= 1/2). Ocupa entre 16 y 32 bytes por cadena sin
+    importar su largo; la probabilidad de que dos cadenas distintas choquen
+    es del orden de n² / 2^65.
+    """
+
+    tipo = "exacto"
+
+    def __init__(self, capacidad: int = 1024) -> None:
+        super().__init__()
+        celdas = 1 << max(4, (2 * capacidad - 1).bit_length())
+        self._tabla = array("Q", bytes(8 * celdas))
+        self._mascara = celdas - 1
+        self._cantidad = 0
+
+    def agregar_resumen(self, resumen: int) -> bool:
+        tabla = self._tabla
+        mascara = self._mascara
+        i = resumen & mascara
+        while True:
+            valor = tabla[i]
+            if valor == 0:
+                break
+            if valor == resumen:
+                return False
+            i = (i + 1) & mascara
+        tabla[i] = resumen
+        self._cantidad += 1
+        if 2 * self._cantidad > len(tabla):
+            self._crecer()
+        return True
+
+    def contiene_resumen(self, resumen: int) -> bool:
+        tabla = self._tabla
+        mascara = self._mascara
+        i = resumen & mascara
+        while True:
+            valor = tabla[i]
+            if valor == 0:
+                return False
+            if valor == resumen:
+                return True
+            i = (i + 1) & mascara
+
+    def _crecer(self) -> None:
+        anterior = self._tabla
+        celdas = 2 * len(anterior)
+        self._tabla = tabla = array("Q", bytes(8 * celdas))
+        self._mascara = mascara = celdas - 1
+        for valor in anterior:
+            if valor:
+                i = valor & mascara
+                while tabla[i]:
+                    i = (i + 1) & mascara
+                tabla[i] = valor
+
+    def tamano_bytes(self) -> int:
+        return len(self._tabla) * self._tabla.itemsize
+
+    def __len__(self) -> int:
+        return self._cantidad
+
+
+class FiltroBloom(Vistos):
+    """
+    Conjunto probabilístico de cadenas vistas para corridas muy grandes.
+
+    Usa m bits y k posiciones por cadena (doble hashing sobre el resumen de
+    64 bits), dimensionados para 'capacidad' cadenas con una tasa de falsos
+    positivos 'tasa_error'. Nunca acepta una cadena repetida, pero puede
+    rechazar como repetida una cadena nueva con probabilidad ~tasa_error.
+    len() es la cantidad de cadenas aceptadas.
+    """
+
+    tipo = "bloom"
+
+    def __init__(self, capacidad: int, tasa_error: float = 0.001) -> None:
+        super().__init__()
+        if capacidad <= 0 or not 0.0 < tasa_error < 1.0:
+            raise ValueError("El filtro de Bloom requiere capacidad > 0 y 0 < tasa_error < 1.")
+        bits = math.ceil(-capacidad * math.log(tasa_error) / math.log(2) ** 2)
+        self._bits = bytearray((bits + 7) // 8)
+        self._m = len(self._bits) * 8
+        self._k = max(1, round(self._m / capacidad * math.log(2)))
+        self._cantidad = 0
+
+    def _posiciones(self, resumen: int):
+        h1 = resumen & 0xFFFFFFFF
+        h2 = (resumen >> 32) | 1
+        m = self._m
+        return [(h1 + i * h2) % m for i in range(self._k)]
+
+    def agregar_resumen(self, resumen: int) -> bool:
+        bits = self._bits
+        nueva = False
+        for p in self._posiciones(resumen):
+            byte = p >> 3
+            mascara = 1 << (p & 7)
+            if not bits[byte] & mascara:
+                bits[byte] |= mascara
+                nueva = True
+        if nueva:
+            self._cantidad += 1
+        return nueva
+
+    def contiene_resumen(self, resumen: int) -> bool:
+        bits = self._bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._posiciones(resumen))
+
+    def tamano_bytes(self) -> int:
+        return len(self._bits)
+
+    def __len__(self) -> int:
+        return self._cantidad
+
+
+def crear_vistos(capacidad: int = 1024, tasa_error: float | None = None) -> Vistos:
+    """
+    Conjunto de cadenas vistas: exacto por defecto, o un filtro de Bloom
+    para 'capacidad' cadenas si se indica tasa_error.
+    """
+    if tasa_error is None:
+        return ConjuntoVistos(capacidad)
+    return FiltroBloom(capacidad, tasa_error)